@@ -1,7 +1,7 @@
 import datetime
 from zoneinfo import ZoneInfo
 from google.adk.agents import LoopAgent, LlmAgent, BaseAgent
-from social.instavibe import get_person_posts,get_person_friends,get_person_id_by_name,get_person_attended_events
+from social.instavibe import get_person_posts,get_person_friends,get_person_id_by_name,get_person_attended_events,search_posts,get_similar_people,get_person_sentiment_summary,get_mutual_friends
 from google.adk.agents.invocation_context import InvocationContext
 from google.adk.events import Event, EventActions
 from typing import AsyncGenerator
@@ -31,9 +31,9 @@ profile_agent = LlmAgent(
         "Agent to answer questions about the this person social profile. Provide the person's profile using their name, make sure to fetch the id before getting other data."
     ),
     instruction=(
-        "You are a helpful agent to answer questions about the this person social profile. You'll be given a list of names, provide the person's profile using their name, make sure to fetch the id before getting other data. Get one person at a time, start with the first one on the list, and skip if already provided. return this person's result"
+        "You are a helpful agent to answer questions about the this person social profile. You'll be given a list of names, provide the person's profile using their name, make sure to fetch the id before getting other data. Get one person at a time, start with the first one on the list, and skip if already provided. Use get_similar_people to see who shares this person's interests instead of comparing everyone's posts yourself. return this person's result"
     ),
-    tools=[get_person_posts,get_person_friends,get_person_id_by_name,get_person_attended_events],
+    tools=[get_person_posts,get_person_friends,get_person_id_by_name,get_person_attended_events,search_posts,get_similar_people,get_person_sentiment_summary,get_mutual_friends],
 )
 
 summary_agent = LlmAgent(
@@ -3,11 +3,12 @@
 import os
 from dotenv import load_dotenv
 import traceback
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import json # For example usage printing
+import requests
 
 from google.cloud import spanner
-from google.cloud.spanner_v1 import param_types
+from google.cloud.spanner_v1 import param_types, DirectedReadOptions
 from google.api_core import exceptions
 
 load_dotenv()
@@ -15,10 +16,38 @@ load_dotenv()
 INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "instavibe-graph-instance")
 DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "graphdb")
 PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
+# InstaVibe web app API (e.g. https://instavibe-xxxx.run.app/api), used for the
+# in-process indexes that only live in the web app (search, ...)
+INSTAVIBE_BASE_URL = os.environ.get("INSTAVIBE_BASE_URL")
+
+# All agent queries are read-only: they may be served by the replicas listed in
+# SPANNER_DIRECTED_READS ("location[:READ_ONLY|READ_WRITE],...") and, if
+# SPANNER_READ_STALENESS is set (seconds), at a bounded-stale timestamp.
+SPANNER_DIRECTED_READS = os.environ.get("SPANNER_DIRECTED_READS", "")
+SPANNER_READ_STALENESS = os.environ.get("SPANNER_READ_STALENESS", "")
 
 if not PROJECT_ID:
     print("Warning: GOOGLE_CLOUD_PROJECT environment variable not set.")
 
+
+def _read_options():
+    """Returns (snapshot kwargs, execute_sql kwargs) for the configured read routing."""
+    snapshot_kwargs = {}
+    if SPANNER_READ_STALENESS.strip():
+        snapshot_kwargs["max_staleness"] = timedelta(seconds=float(SPANNER_READ_STALENESS))
+    selections = []
+    for item in SPANNER_DIRECTED_READS.split(","):
+        location, _, replica_type = item.strip().partition(":")
+        if not location and not replica_type:
+            continue
+        selection = {"location": location} if location else {}
+        if replica_type:
+            selection["type_"] = DirectedReadOptions.ReplicaSelection.Type[replica_type.upper()]
+        selections.append(selection)
+    if not selections:
+        return snapshot_kwargs, {}
+    return snapshot_kwargs, {"directed_read_options": DirectedReadOptions(include_replicas={"replica_selections": selections})}
+
 # --- Spanner Client Initialization ---
 db_instance = None
 spanner_client = None
@@ -59,11 +88,13 @@ def run_sql_query(sql, params=None, param_types=None, expected_fields=None):
     # print(f"SQL: {sql}")
 
     try:
-        with db_instance.snapshot() as snapshot:
+        snapshot_kwargs, execute_kwargs = _read_options()
+        with db_instance.snapshot(**snapshot_kwargs) as snapshot:
             results = snapshot.execute_sql(
                 sql,
                 params=params,
-                param_types=param_types
+                param_types=param_types,
+                **execute_kwargs
             )
 
             field_names = expected_fields
@@ -102,11 +133,13 @@ def run_graph_query( graph_sql, params=None, param_types=None, expected_fields=N
     # print(f"GQL: {graph_sql}") # Uncomment for verbose query logging
 
     try:
-        with db_instance.snapshot() as snapshot:
+        snapshot_kwargs, execute_kwargs = _read_options()
+        with db_instance.snapshot(**snapshot_kwargs) as snapshot:
             results = snapshot.execute_sql(
                 graph_sql,
                 params=params,
-                param_types=param_types
+                param_types=param_types,
+                **execute_kwargs
             )
 
             field_names = expected_fields
@@ -129,6 +162,29 @@ def run_graph_query( graph_sql, params=None, param_types=None, expected_fields=N
         return None
 
     return results_list
+
+
+def call_instavibe_api(path, params=None):
+    """
+    Calls a GET endpoint of the InstaVibe web app API.
+    Returns: the decoded JSON body, or None on error.
+    """
+    if not INSTAVIBE_BASE_URL:
+        print("Error: INSTAVIBE_BASE_URL environment variable not set.")
+        return None
+
+    url = f"{INSTAVIBE_BASE_URL.rstrip('/')}/{path.lstrip('/')}"
+    try:
+        response = requests.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Error calling InstaVibe API {url}: {e}")
+        return None
+    except json.JSONDecodeError:
+        print(f"Error decoding JSON response from {url}.")
+        return None
+
 def get_person_attended_events(person_id: str)-> list[dict]:
     """
     Fetches events attended by a specific person using Graph Query.
@@ -206,12 +262,12 @@ def get_person_posts( person_id: str)-> list[dict]:
     """
     if not db_instance: return None
 
-    # Graph Query: Find the specific Person node, follow 'Wrote' edge to Post nodes
+    # Graph Query: the person's Post nodes; they carry the author's name, so no Wrote hop is needed
     graph_sql = """
         Graph SocialGraph
-        MATCH (author:Person)-[w:Wrote]->(post:Post)
-        WHERE author.person_id = @person_id
-        RETURN post.post_id, post.author_id, post.text, post.sentiment, post.post_timestamp, author.name AS author_name
+        MATCH (post:Post)
+        WHERE post.author_id = @person_id
+        RETURN post.post_id, post.author_id, post.text, post.sentiment, post.post_timestamp, post.author_name
         ORDER BY post.post_timestamp DESC
     """
     # Parameters now include person_id and limit
@@ -229,6 +285,19 @@ def get_person_posts( person_id: str)-> list[dict]:
     if results is None:
         return None
 
+    # Posts older than the archive horizon live in PostArchive, outside the
+    # graph; they are all older than any post left in Post, so they go last
+    archive_sql = """
+        SELECT post_id, author_id, text, sentiment, post_timestamp, author_name
+        FROM PostArchive@{FORCE_INDEX=PostArchiveByAuthor}
+        WHERE author_id = @person_id
+        ORDER BY post_timestamp DESC
+    """
+    archived = run_sql_query(archive_sql, params=params, param_types=param_types_map, expected_fields=fields)
+    if archived is None:
+        return None
+    results.extend(archived)
+
     # Convert datetime objects to ISO format strings
     for post in results:
         if isinstance(post.get('post_timestamp'), datetime):
@@ -239,11 +308,18 @@ def get_person_posts( person_id: str)-> list[dict]:
 
 def get_person_friends( person_id: str)-> list[dict]:
     """
-    Fetches friends for a specific person using Graph Query.
+    Fetches friends for a specific person.
+    Uses the web app's in-memory social graph when INSTAVIBE_BASE_URL is set,
+    falling back to a Graph Query.
     Args:
         person_id (str): The ID of the person whose posts to fetch.
     Returns: list[dict] or None.
     """
+    if INSTAVIBE_BASE_URL:
+        body = call_instavibe_api(f"people/{person_id}/friends")
+        if body is not None:
+            return body.get("results", [])
+
     if not db_instance: return None
 
     graph_sql = """
@@ -258,4 +334,79 @@ def get_person_friends( person_id: str)-> list[dict]:
 
     results = run_graph_query( graph_sql, params=params, param_types=param_types_map, expected_fields=fields)
 
-    return results
\ No newline at end of file
+    return results
+
+
+def get_mutual_friends(person_id_a: str, person_id_b: str)-> list[dict]:
+    """
+    Fetches the friends two people have in common.
+    Args:
+        person_id_a (str): The ID of the first person.
+        person_id_b (str): The ID of the second person.
+    Returns: list[dict] of mutual friends (person_id, name) or None on error.
+    """
+    body = call_instavibe_api(f"people/{person_id_a}/mutual-friends/{person_id_b}")
+    if body is None: return None
+    return body.get("results", [])
+
+
+def search_posts(query: str) -> list[dict]:
+    """
+    Searches all posts for keywords, ranked by relevance.
+    Args:
+        query (str): Keywords to look for in post text (e.g. "hiking coffee").
+    Returns: list[dict] of matching posts (post_id, author_id, author_name,
+             text, sentiment, post_timestamp, score) or None on error.
+    """
+    body = call_instavibe_api("search", params={"q": query, "limit": 20})
+    if body is None: return None
+    return body.get("results", [])
+
+
+def get_similar_people(person_id: str)-> list[dict]:
+    """
+    Finds the people whose posts show the most similar interests to this person.
+    Args:
+        person_id (str): The ID of the person to compare everyone else against.
+    Returns: list[dict] of similar people (person_id, name, score between 0 and 1),
+             best match first, or None on error.
+    """
+    body = call_instavibe_api(f"people/{person_id}/similar", params={"k": 5})
+    if body is None: return None
+    return body.get("results", [])
+
+
+def get_person_sentiment_summary(person_id: str) -> dict:
+    """
+    Fetches how positive, neutral or negative a person's posts have been,
+    from precomputed daily counters (last 90 days).
+    Args:
+        person_id (str): The ID of the person.
+    Returns: dict with 'totals' ({positive, neutral, negative, total}) and
+             'days' (daily counts, newest first), or None on error.
+    """
+    if not db_instance: return None
+
+    sql = """
+        SELECT day, positive_count, neutral_count, negative_count
+        FROM PersonSentimentDaily
+        WHERE person_id = @person_id AND day >= @since_day
+        ORDER BY day DESC
+    """
+    params = {
+        "person_id": person_id,
+        "since_day": (datetime.now(timezone.utc) - timedelta(days=90)).date(),
+    }
+    param_types_map = {"person_id": param_types.STRING, "since_day": param_types.DATE}
+    fields = ["day", "positive", "neutral", "negative"]
+
+    results = run_sql_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
+    if results is None: return None
+
+    totals = {"positive": 0, "neutral": 0, "negative": 0}
+    for day in results:
+        day['day'] = day['day'].isoformat()
+        for sentiment in totals:
+            totals[sentiment] += day[sentiment]
+    totals["total"] = sum(totals.values())
+    return {"totals": totals, "days": results}
@@ -15,12 +15,12 @@ def get_all_people_for_ally_page():
     try:
         # Import here to avoid circular dependencies at module load time
         # and ensure app.py's db and run_query are initialized.
-        from app import db as main_app_db, run_query as main_app_run_query
+        from app import get_db as main_app_get_db, run_query as main_app_run_query
         # param_types might be needed if run_query is called with params
         # from google.cloud.spanner_v1 import param_types as main_app_param_types
 
-        if not main_app_db:
-            print("Error in ally_routes.get_all_people_for_ally_page: main_app_db is not available from app.py.")
+        if not main_app_get_db():
+            print("Error in ally_routes.get_all_people_for_ally_page: database is not available from app.py.")
             return [] # Return empty list if db connection failed
 
         sql = """
@@ -33,7 +33,7 @@ def get_all_people_for_ally_page():
         people = main_app_run_query(sql, expected_fields=fields)
         return people
     except ImportError:
-        print("ERROR in ally_routes.get_all_people_for_ally_page: Could not import db or run_query from app.py. Check app.py structure and execution.")
+        print("ERROR in ally_routes.get_all_people_for_ally_page: Could not import get_db or run_query from app.py. Check app.py structure and execution.")
         return [] # Fallback to empty list
     except Exception as e:
         print(f"Error fetching people in ally_routes.get_all_people_for_ally_page: {e}")
@@ -41,6 +41,29 @@ def get_all_people_for_ally_page():
         traceback.print_exc()
         return []
 
+def rank_people_by_shared_interests(people, user_name, top_n=3):
+    """
+    Moves the people whose posts are most similar to the user's to the top of
+    the list and flags the best matches with 'similar_interests'.
+    Falls back to the original order if similarity data is unavailable.
+    """
+    try:
+        from app import get_similar_people as main_app_get_similar_people
+
+        user = next((p for p in people if p.get('name') == user_name), None)
+        if not user:
+            return people
+        similar = main_app_get_similar_people(user['person_id'], k=len(people))
+        scores = {s['person_id']: s['score'] for s in similar}
+        ranked = sorted(people, key=lambda p: -scores.get(p['person_id'], 0.0))
+        top_ids = {s['person_id'] for s in similar[:top_n]}
+        for person in ranked:
+            person['similar_interests'] = person['person_id'] in top_ids
+        return ranked
+    except Exception as e:
+        print(f"Warning: Could not rank people by shared interests: {e}")
+        return people
+
 @ally_bp.route('/introvert-ally', methods=['GET'])
 def introvert_ally_page():
     """Renders the Introvert Ally page."""
@@ -50,6 +73,7 @@ def introvert_ally_page():
     if friends_list is None: # Should be an empty list on error from get_all_people_for_ally_page
         friends_list = []
         flash("Could not load the list of people from the database.", "warning")
+    friends_list = rank_people_by_shared_interests(friends_list, "Alice") # Hardcoded user, as in the submit handler
     return render_template('introvert_ally.html', friends=friends_list, title="Introvert Ally Planner")
 
 
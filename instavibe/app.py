@@ -1,20 +1,54 @@
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from flask import Flask, render_template, abort, flash, request, jsonify
+from flask import Flask, render_template, stream_template, abort, flash, request, jsonify, g, has_request_context, Response
+from flask.json.provider import DefaultJSONProvider
 from google.cloud import spanner
 from google.cloud.spanner_v1 import param_types
 from google.api_core import exceptions
 import humanize 
 import uuid
 import traceback
+import threading
+import time
+import json
 from dateutil import parser 
 from ally_routes import ally_bp 
+from search_index import PostSearchIndex
+from similarity import SimilarityEngine
+from trending import TrendingEngine
+from sentiment_rollups import increment_sentiment_rollups, summarize_rollup_rows
+from social_graph import SocialGraph
+from resilience import SpannerGuard, SpannerUnavailableError, freeze_params
+from singleflight import SingleFlight
+from swr_cache import StaleWhileRevalidateCache
+from feed_bus import FeedBus
+from invalidation import invalidation_bus_from_env
+from outbox import OutboxDispatcher, OUTBOX_TABLE, enqueue as enqueue_outbox
+from read_routing import read_route, READ_ROUTES
+from rows import row_factory, copy_rows, json_default
+from post_archive import ARCHIVE_TABLE
+from counters import increment_counter
+from time_shards import time_shard_filter
+from query_budget import init_query_budget, query_budget, track_query, note_memo_hit, budget_is_strict
+
+
+class RowJSONProvider(DefaultJSONProvider):
+    """Serializes query rows (see rows.py) in jsonify() and |tojson like dicts."""
+
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
 
 
 app = Flask(__name__)
+app.json = RowJSONProvider(app)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "a_default_secret_key_for_dev") 
 app.register_blueprint(ally_bp)
+init_query_budget(app)
 
 load_dotenv()
 # --- Spanner Configuration ---
@@ -31,34 +65,163 @@ if not PROJECT_ID:
     raise ValueError("GOOGLE_CLOUD_PROJECT environment variable not set.")
 
 # --- Spanner Client Initialization ---
+# The client is created lazily on first use instead of at import time, so a
+# cold start does not pay for an admin RPC and a transient failure is retried
+# on a later request instead of leaving the app without a database forever.
+SPANNER_INIT_RETRY_SECONDS = float(os.environ.get("SPANNER_INIT_RETRY_SECONDS", "5"))
+READY_PROBE_TTL_SECONDS = float(os.environ.get("READY_PROBE_TTL_SECONDS", "10"))
+
 db = None
-try:
-    spanner_client = spanner.Client(project=PROJECT_ID)
-    instance = spanner_client.instance(INSTANCE_ID)
-    database = instance.database(DATABASE_ID)
-    print(f"Attempting to connect to Spanner: {instance.name}/databases/{database.name}")
-
-    # Ensure database exists - crucial check
-    if not database.exists():
-         print(f"Error: Database '{database.name}' does not exist in instance '{instance.name}'.")
-         print("Please create the database and the required tables/schema.")
-         # You might want to exit or handle this more gracefully depending on deployment
-         # For now, we'll let it fail later if db is None
-    else:
-        print("Database connection check successful (database exists).")
-        db = database # Assign database object if it exists
+_db_lock = threading.Lock()
+_db_last_attempt = None
+_db_last_error = None
+
+def get_db():
+    """
+    Returns the Spanner database handle, creating the client on first use.
+
+    A failed attempt is retried at most every SPANNER_INIT_RETRY_SECONDS so a
+    Spanner outage does not turn every request into a slow connection attempt.
 
-except exceptions.NotFound:
-    print(f"Error: Spanner instance '{INSTANCE_ID}' not found in project '{PROJECT_ID}'.")
-    # Handle error appropriately - exit, default behavior, etc.
-except Exception as e:
-    print(f"An unexpected error occurred during Spanner initialization: {e}")
-    # Handle error
+    Returns:
+        Database or None: The database handle, or None if it is unavailable.
+    """
+    global db, _db_last_attempt, _db_last_error
+    if db is not None:
+        return db
+    with _db_lock:
+        if db is not None:
+            return db
+        now = time.monotonic()
+        if _db_last_attempt is not None and now - _db_last_attempt < SPANNER_INIT_RETRY_SECONDS:
+            return None
+        _db_last_attempt = now
+        try:
+            spanner_client = spanner.Client(project=PROJECT_ID)
+            instance = spanner_client.instance(INSTANCE_ID)
+            db = instance.database(DATABASE_ID)
+            _db_last_error = None
+            print(f"Spanner client initialized for {db.name}")
+        except Exception as e:
+            _db_last_error = f"{type(e).__name__}: {e}"
+            print(f"An unexpected error occurred during Spanner initialization: {e}")
+    return db
+
+# --- Readiness Probe ---
+_readiness_lock = threading.Lock()
+_readiness = {"checked_at": None, "ok": False, "latency_ms": None, "error": None}
 
-def run_query(sql, params=None, param_types=None, expected_fields=None): # Add expected_fields
+def probe_database():
+    """
+    Runs a trivial query to check Spanner is reachable, caching the result for
+    READY_PROBE_TTL_SECONDS. The probe also checks a session into the pool, so
+    the first user request after readiness does not pay for session creation.
+
+    Returns:
+        dict: {ok, latency_ms, error, age_seconds}
+    """
+    with _readiness_lock:
+        now = time.monotonic()
+        checked_at = _readiness["checked_at"]
+        if checked_at is None or now - checked_at >= READY_PROBE_TTL_SECONDS:
+            database = get_db()
+            if not database:
+                _readiness.update(ok=False, latency_ms=None, error=_db_last_error or "Spanner client not initialized")
+            else:
+                try:
+                    probe_start = time.monotonic()
+                    with database.snapshot() as snapshot:
+                        list(snapshot.execute_sql("SELECT 1"))
+                    _readiness.update(ok=True, latency_ms=round((time.monotonic() - probe_start) * 1000, 2), error=None)
+                except Exception as e:
+                    _readiness.update(ok=False, latency_ms=None, error=f"{type(e).__name__}: {e}")
+            _readiness["checked_at"] = now = time.monotonic()
+        result = {key: value for key, value in _readiness.items() if key != "checked_at"}
+        result["age_seconds"] = round(now - _readiness["checked_at"], 2)
+        return result
+
+def session_pool_status():
+    """Reports how many sessions are checked in and ready for reuse."""
+    pool = getattr(db, "_pool", None)
+    sessions = getattr(pool, "_sessions", None)
+    return {
+        "type": type(pool).__name__ if pool is not None else None,
+        "available_sessions": sessions.qsize() if hasattr(sessions, "qsize") else None,
+        "target_size": getattr(pool, "target_size", getattr(pool, "size", None)),
+    }
+
+# --- Spanner Bulkheads and Circuit Breakers ---
+# Each class of Spanner call gets its own concurrency limit and breaker, so a
+# slow profile query cannot take every thread needed by the feed or by writes.
+spanner_guards = {
+    "feed": SpannerGuard("feed", int(os.environ.get("SPANNER_BULKHEAD_FEED", "8"))),
+    "profile": SpannerGuard("profile", int(os.environ.get("SPANNER_BULKHEAD_PROFILE", "8"))),
+    "write": SpannerGuard("write", int(os.environ.get("SPANNER_BULKHEAD_WRITE", "4"))),
+}
+
+# Concurrent identical reads (e.g. many requests for one hot event) share a
+# single Spanner call instead of each running their own.
+query_flights = SingleFlight()
+
+# Live feed updates pushed to /feed/stream subscribers after each committed write
+feed_bus = FeedBus()
+
+# Tells the other replicas which in-process caches a write here made stale
+invalidation_bus = invalidation_bus_from_env()
+
+# --- In-Process Post Indexes ---
+search_index = PostSearchIndex()
+similarity_engine = SimilarityEngine()
+social_graph = SocialGraph()
+trending_engine = TrendingEngine()
+
+# --- Request-Scoped Query Memo ---
+# Identical reads within one request (composed helpers, templates calling back
+# into data functions) are answered from g instead of Spanner. Writes clear it,
+# and it dies with the request, so it never serves cross-request stale data.
+
+def _memo_get(key):
+    if not has_request_context():
+        return None
+    rows = g.get("query_memo", {}).get(key)
+    if rows is None:
+        return None
+    note_memo_hit()
+    return copy_rows(rows)
+
+def _memo_put(key, rows):
+    if has_request_context():
+        g.setdefault("query_memo", {})[key] = copy_rows(rows)
+
+def clear_request_memo():
+    """Drops memoized reads; call after writing to Spanner in a request."""
+    if has_request_context():
+        g.pop("query_memo", None)
+
+# --- Read Routing ---
+# Read-only queries follow the directed-read/staleness policy of their query
+# class (see read_routing.py). Once a request has written, its remaining reads
+# are strong and undirected so they see that write.
+
+def pin_reads_to_leader():
+    """Makes the rest of this request's reads read-your-writes; call after a write."""
+    if has_request_context():
+        g.read_your_writes = True
+
+def _route_for(query_class):
+    return read_route(query_class, read_your_writes=has_request_context() and g.get("read_your_writes", False))
+
+def run_query(sql, params=None, param_types=None, expected_fields=None, query_class="profile", cache=True): # Add expected_fields
     """
     Executes a SQL query against the Spanner database.
 
+    Repeated reads within one request are served from a request-scoped memo,
+    and identical reads running concurrently share one Spanner call.
+    The query runs under the bulkhead and circuit breaker of its query_class.
+    If Spanner is unavailable for that class, the last good result of the
+    same query is served instead, or SpannerUnavailableError (a
+    ConnectionError) is raised if there is none.
+
     Args:
         sql (str): The SQL query string.
         params (dict, optional): Dictionary of query parameters. Defaults to None.
@@ -69,24 +232,65 @@ def run_query(sql, params=None, param_types=None, expected_fields=None): # Add e
                                                 expected column names in the order
                                                 they appear in the SELECT statement.
                                                 Required if results.fields fails.
+        query_class (str, optional): "feed", "profile" or "write". Defaults to "profile".
+        cache (bool, optional): Keep the result in the request memo and as
+                                the last good result. Pass False for bulk
+                                loads and polls, which don't repeat within a
+                                request and whose callers keep their own copy.
+                                Defaults to True.
     """
-    if not db:
+    database = get_db()
+    if not database:
         print("Error: Database connection is not available.")
         raise ConnectionError("Spanner database connection not initialized.")
 
-    results_list = []
+    cache_key = (sql, freeze_params(params))
+    memoized = _memo_get(cache_key) if cache else None
+    if memoized is not None:
+        return memoized
+
     print(f"--- Executing SQL ---")
     print(f"SQL: {sql}")
     if params:
         print(f"Params: {params}")
     print("----------------------")
 
+    guard = spanner_guards[query_class]
+    route = _route_for(query_class)
+
+    def _load():
+        with guard.slot(), track_query(sql):
+            return _execute_query(database, sql, params, param_types, expected_fields, route)
+
+    try:
+        # Keyed by route too: a read-your-writes read must not share a replica read
+        results_list, shared = query_flights.do((query_class, route.name) + cache_key, _load)
+        if shared and results_list is not None:
+            results_list = copy_rows(results_list)
+    except SpannerUnavailableError as e:
+        stale = guard.stale(cache_key) if cache else None
+        if stale is None:
+            print(f"Spanner unavailable and no cached result to serve: {e}")
+            raise
+        print(f"Spanner unavailable, serving last good result ({len(stale)} rows): {e}")
+        return stale
+    if results_list is not None:
+        if cache:
+            guard.remember(cache_key, results_list)
+            _memo_put(cache_key, results_list)
+        return results_list
+    return []
+
+def _execute_query(database, sql, params, param_types, expected_fields, route):
+    """Runs one query; returns None for errors already reported to the user."""
+    results_list = []
     try:
-        with db.snapshot() as snapshot:
+        with database.snapshot(**route.snapshot_kwargs()) as snapshot:
             results = snapshot.execute_sql(
                 sql,
                 params=params,
-                param_types=param_types
+                param_types=param_types,
+                **route.execute_kwargs()
             )
 
             # --- MODIFICATION START ---
@@ -108,6 +312,7 @@ def run_query(sql, params=None, param_types=None, expected_fields=None): # Add e
 
             print(f"Using field names: {field_names}")
             # --- MODIFICATION END ---
+            make_row = row_factory(field_names) # Compact __slots__ rows, one class per query shape
 
             for row in results:
                 # Now zip the known field names with the row values (which are lists)
@@ -117,135 +322,319 @@ def run_query(sql, params=None, param_types=None, expected_fields=None): # Add e
                      print(f"Row: {row}")
                      # Skip this row or handle error appropriately
                      continue # Skip malformed row for now
-                results_list.append(dict(zip(field_names, row)))
+                results_list.append(make_row(row))
 
             print(f"Query successful, fetched {len(results_list)} rows.")
 
     except (exceptions.NotFound, exceptions.PermissionDenied, exceptions.InvalidArgument) as spanner_err:
         print(f"Spanner Error ({type(spanner_err).__name__}): {spanner_err}")
-        flash(f"Database error: {spanner_err}", "danger")
-        return []
+        if has_request_context(): # Background refreshes have no request to flash to
+            flash(f"Database error: {spanner_err}", "danger")
+        return None
     except ValueError as e: # Catch the ValueError we might raise above
          print(f"Query Processing Error: {e}")
-         flash("Internal error processing query results.", "danger")
-         return []
+         if has_request_context():
+             flash("Internal error processing query results.", "danger")
+         return None
     except Exception as e:
         print(f"An unexpected error occurred during query execution or processing: {e}")
         traceback.print_exc()
-        flash(f"An unexpected server error occurred while fetching data.", "danger")
+        if has_request_context():
+            flash(f"An unexpected server error occurred while fetching data.", "danger")
         raise e
 
     return results_list
 
+def read_strong(sql, params=None, param_types=None, expected_fields=None, query_class="feed"):
+    """
+    Runs a strong read for a background load or poll.
+
+    Unlike run_query there is no request memo, shared flight, stale fallback
+    or SQL logging: these callers run once or on a timer, keep their own
+    copy, and need to know exactly which commits the rows include. The read
+    still takes a slot of query_class's bulkhead and circuit breaker.
+
+    Returns:
+        tuple: (rows, read_timestamp), where read_timestamp (datetime) is
+               the snapshot's timestamp: the rows reflect every commit up to
+               and including it, and none after.
+    """
+    database = get_db()
+    if not database:
+        raise ConnectionError("Spanner database connection not initialized.")
+    make_row = row_factory(expected_fields)
+    with spanner_guards[query_class].slot(), track_query(sql):
+        # A single-use strong snapshot returns its read timestamp with the results
+        with database.snapshot() as snapshot:
+            results = snapshot.execute_sql(sql, params=params, param_types=param_types)
+            rows = [make_row(row) for row in results]
+            read_timestamp = results.metadata.transaction.read_timestamp
+    return rows, read_timestamp
+
 # --- HOW TO CALL IT ---
 
 def get_all_posts_with_author_db():
-    """Fetch all posts and join with author information from Spanner."""
+    """
+    Fetch all hot posts (see post_archive.py) with their author's name from
+    Spanner. Older posts are reached with get_posts_page_db.
+    """
     sql = """
-        SELECT
-            p.post_id, p.author_id, p.text, p.sentiment, p.post_timestamp,
-            author.name as author_name
+        SELECT p.post_id, p.author_id, p.text, p.sentiment, p.post_timestamp, p.author_name
         FROM Post AS p
-        JOIN Person AS author ON p.author_id = author.person_id
         ORDER BY p.post_timestamp DESC
     """
     # Define the fields exactly as they appear in the SELECT statement
     fields = ["post_id", "author_id", "text", "sentiment", "post_timestamp", "author_name"]
-    return run_query(sql, expected_fields=fields) # Pass the list here
+    # Only the home feed cache reads this; it keeps the result itself
+    return run_query(sql, expected_fields=fields, query_class="feed", cache=False) # Pass the list here
 
 def get_person_db(person_id):
     """Fetch a single person's details from Spanner."""
     sql = """
-        SELECT person_id, name, age
+        SELECT person_id, name, age, post_count, friend_count
         FROM Person
         WHERE person_id = @person_id
     """
     params = {"person_id": person_id}
     param_types_map = {"person_id": param_types.STRING} # Renamed variable
-    fields = ["person_id", "name", "age"]
+    fields = ["person_id", "name", "age", "post_count", "friend_count"]
     results = run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
     return results[0] if results else None
 
-def get_posts_by_person_db(person_id):
-    """Fetch posts written by a specific person from Spanner."""
+def get_posts_by_person_db(person_id, limit=None):
+    """
+    Fetch a specific person's newest posts from Spanner, continuing into the
+    post archive if they have fewer than `limit` recent posts.
+    """
+    posts, _ = get_posts_page_db(limit=limit or PROFILE_POSTS_LIMIT, author_id=person_id)
+    return posts
+
+# --- Post Pages Across the Hot and Archive Tiers ---
+# Pages are ordered by post_timestamp descending, then post_id ascending: the
+# order of the PostByTimestamp and PostByAuthor indexes, whose keys end with
+# the table key (post_id, ascending), so a page is one index range read. The
+# archive job moves the oldest posts first, in the reverse of that order, so
+# every archived post sorts after every hot post: a page is read from Post,
+# and only when Post runs out before the page is full does the same cursor
+# continue into PostArchive.
+POSTS_PAGE_MAX_LIMIT = 100
+PROFILE_POSTS_LIMIT = int(os.environ.get("PROFILE_POSTS_LIMIT", "50"))
+
+POST_PAGE_SQL = """
+    SELECT p.post_id, p.author_id, p.text, p.sentiment, p.post_timestamp, p.author_name
+    FROM {table} AS p
+    WHERE p.post_timestamp IS NOT NULL {conditions}
+    ORDER BY p.post_timestamp DESC, p.post_id
+    LIMIT @limit
+"""
+POST_PAGE_FIELDS = ["post_id", "author_id", "text", "sentiment", "post_timestamp", "author_name"]
+
+def encode_post_cursor(post):
+    """Opaque cursor pointing just after `post`: "<post_timestamp>|<post_id>"."""
+    return f"{post['post_timestamp'].isoformat()}|{post['post_id']}"
+
+def decode_post_cursor(cursor):
+    """Returns (post_timestamp, post_id); raises ValueError for a malformed cursor."""
+    timestamp, _, post_id = cursor.rpartition("|")
+    if not timestamp or not post_id:
+        raise ValueError(f"Malformed post cursor: {cursor!r}")
+    return parser.isoparse(timestamp), post_id
+
+def _post_page_tier(table, limit, after, author_id):
+    conditions = ""
+    params = {"limit": limit}
+    param_types_map = {"limit": param_types.INT64}
+    if author_id:
+        conditions += " AND p.author_id = @author_id"
+        params["author_id"] = author_id
+        param_types_map["author_id"] = param_types.STRING
+    if after:
+        # The leading conjunct bounds the index range; the rest skips the
+        # cursor's own timestamp up to and including its post
+        conditions += (
+            " AND p.post_timestamp <= @after_timestamp"
+            " AND (p.post_timestamp < @after_timestamp OR p.post_id > @after_post_id)"
+        )
+        params["after_timestamp"], params["after_post_id"] = after
+        param_types_map["after_timestamp"] = param_types.TIMESTAMP
+        param_types_map["after_post_id"] = param_types.STRING
+    sql = POST_PAGE_SQL.format(table=table, conditions=conditions)
+    return run_query(sql, params=params, param_types=param_types_map, expected_fields=POST_PAGE_FIELDS,
+                     query_class="profile" if author_id else "feed")
+
+def get_posts_page_db(cursor=None, limit=20, author_id=None):
+    """
+    Fetch one page of posts, newest first, optionally for one author.
+
+    Args:
+        cursor (str, optional): A previous page's next_cursor; omit for the first page.
+        limit (int): Page size.
+        author_id (str, optional): Only this person's posts.
+
+    Returns:
+        tuple: (posts, next_cursor), next_cursor being None after the last page.
+    """
+    after = decode_post_cursor(cursor) if cursor else None
+    posts = _post_page_tier("Post", limit, after, author_id)
+    if len(posts) < limit:
+        # Post is exhausted: continue from the same position in the archive
+        if posts:
+            after = (posts[-1]["post_timestamp"], posts[-1]["post_id"])
+        posts = posts + _post_page_tier(ARCHIVE_TABLE, limit - len(posts), after, author_id)
+    next_cursor = encode_post_cursor(posts[-1]) if len(posts) == limit else None
+    return posts, next_cursor
+
+def get_friendships_since_db(since=None):
+    """
+    Fetch Friendship edges to (re)build the in-memory social graph.
+
+    Args:
+        since (str, optional): ISO commit timestamp watermark. When given, only
+                               friendships committed after it are returned.
+    """
+    sql = "SELECT person_id_a, person_id_b, friendship_time FROM Friendship"
+    params = None
+    param_types_map = None
+    if since:
+        sql = f"""
+            SELECT person_id_a, person_id_b, friendship_time
+            FROM Friendship@{{FORCE_INDEX=FriendshipByShardTime}}
+            WHERE {time_shard_filter()} AND friendship_time > @since
+        """
+        params = {"since": parser.isoparse(since)}
+        param_types_map = {"since": param_types.TIMESTAMP}
+    fields = ["person_id_a", "person_id_b", "friendship_time"]
+    return run_query(sql, params=params, param_types=param_types_map, expected_fields=fields, cache=False)
+
+def get_social_graph():
+    """Returns the in-memory social graph, loading or refreshing it if needed."""
+    social_graph.ensure_current(get_friendships_since_db)
+    return social_graph
+
+def get_people_by_ids_db(person_ids):
+    """Fetch (person_id, name) for a list of person ids, ordered by name."""
+    if not person_ids:
+        return []
     sql = """
-        SELECT
-            p.post_id, p.author_id, p.text, p.sentiment, p.post_timestamp,
-            author.name as author_name
-        FROM Post AS p
-        JOIN Person AS author ON p.author_id = author.person_id
-        WHERE p.author_id = @person_id
-        ORDER BY p.post_timestamp DESC
+        SELECT person_id, name
+        FROM Person
+        WHERE person_id IN UNNEST(@person_ids)
+        ORDER BY name
     """
-    params = {"person_id": person_id}
-    param_types_map = {"person_id": param_types.STRING}
-    fields = ["post_id", "author_id", "text", "sentiment", "post_timestamp", "author_name"]
+    params = {"person_ids": list(person_ids)}
+    param_types_map = {"person_ids": param_types.Array(param_types.STRING)}
+    fields = ["person_id", "name"]
     return run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
 
 def get_friends_db(person_id):
-    """Fetch friends of a specific person from Spanner."""
+    """
+    Fetch friends of a specific person.
+    Friend ids come from the in-memory social graph; names are a primary key
+    lookup on Person.
+    """
+    return get_people_by_ids_db(get_social_graph().friends(person_id))
+
+
+def get_friend_suggestions_db(person_id, limit=5):
+    """Fetch precomputed "people you may know" suggestions for a person."""
     sql = """
-        SELECT DISTINCT
-            friend.person_id, friend.name
-        FROM Friendship AS f
-        JOIN Person AS friend ON
-            (f.person_id_a = @person_id AND f.person_id_b = friend.person_id) OR
-            (f.person_id_b = @person_id AND f.person_id_a = friend.person_id)
-        WHERE f.person_id_a = @person_id OR f.person_id_b = @person_id
-        ORDER BY friend.name
+        SELECT s.suggested_person_id, p.name, s.score, s.mutual_friends, s.shared_events
+        FROM FriendSuggestion AS s
+        JOIN Person AS p ON s.suggested_person_id = p.person_id
+        WHERE s.person_id = @person_id
+        ORDER BY s.rank
+        LIMIT @limit
     """
-    params = {"person_id": person_id}
-    param_types_map = {"person_id": param_types.STRING}
-    fields = ["person_id", "name"]
+    params = {"person_id": person_id, "limit": limit}
+    param_types_map = {"person_id": param_types.STRING, "limit": param_types.INT64}
+    fields = ["person_id", "name", "score", "mutual_friends", "shared_events"]
     return run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
 
 
-def get_all_events_with_attendees_db():
-    """Fetch all events and their attendees from Spanner."""
-    # Get all events first
-    event_sql = """
-        SELECT event_id, name, event_date
-        FROM Event
-        ORDER BY event_date DESC
-        LIMIT 50
+def get_all_events_with_attendees_db(limit=50, preview_size=5):
     """
-    event_fields = ["event_id", "name", "event_date"]
-    events = run_query(event_sql, expected_fields=event_fields)
-    if not events:
-        return []
+    Fetch the newest events, each with its attendee count and an
+    alphabetical preview of up to preview_size attendees.
 
-    events_with_attendees = {event['event_id']: {'details': event, 'attendees': []} for event in events}
-    event_ids = list(events_with_attendees.keys())
+    The count is Event.attendee_count, maintained by the transactions that
+    write Attendance, so no event's full attendee list is read.
 
-    # Fetch attendees
-    attendee_sql = """
+    Returns:
+        list[dict]: [{details, attendees, attendee_count}]
+    """
+    sql = """
         SELECT
-            a.event_id,
-            p.person_id, p.name
-        FROM Attendance AS a
-        JOIN Person AS p ON a.person_id = p.person_id
-        WHERE a.event_id IN UNNEST(@event_ids)
-        ORDER BY a.event_id, p.name
+            e.event_id, e.name, e.event_date, e.attendee_count,
+            ARRAY(
+                SELECT AS STRUCT p.person_id, p.name
+                FROM Attendance@{FORCE_INDEX=AttendanceByEvent} AS a
+                JOIN Person AS p ON a.person_id = p.person_id
+                WHERE a.event_id = e.event_id
+                ORDER BY p.name
+                LIMIT @preview_size
+            ) AS attendee_preview
+        FROM Event AS e
+        ORDER BY e.event_date DESC
+        LIMIT @limit
+    """
+    params = {"limit": limit, "preview_size": preview_size}
+    param_types_map = {"limit": param_types.INT64, "preview_size": param_types.INT64}
+    fields = ["event_id", "name", "event_date", "attendee_count", "attendee_preview"]
+    rows = run_query(sql, params=params, param_types=param_types_map, expected_fields=fields, query_class="feed")
+    return [_event_with_attendee_preview(row) for row in rows]
+
+def _event_with_attendee_preview(row):
+    return {
+        "details": {"event_id": row["event_id"], "name": row["name"], "event_date": row["event_date"]},
+        "attendees": [{"person_id": attendee[0], "name": attendee[1]} for attendee in row["attendee_preview"] or []],
+        "attendee_count": row["attendee_count"],
+    }
+
+def get_person_events_with_attendees_db(person_id, limit=20, preview_size=5):
     """
-    params = {"event_ids": event_ids}
-    param_types_map = {"event_ids": param_types.Array(param_types.STRING)}
-    attendee_fields = ["event_id", "person_id", "name"]
-    all_attendees = run_query(attendee_sql, params=params, param_types=param_types_map, expected_fields=attendee_fields)
+    Fetch the events a person attends, newest first, with each event's
+    attendee count and an alphabetical preview of up to preview_size attendees.
 
-    for attendee in all_attendees:
-        event_id = attendee['event_id']
-        if event_id in events_with_attendees:
-            # No change needed here, attendee is already a dict
-            events_with_attendees[event_id]['attendees'].append(attendee)
+    Starts from the Attendance primary key (person_id, event_id), so only this
+    person's rows are read.
 
-    return [events_with_attendees[event['event_id']] for event in events]
+    Returns:
+        list[dict]: [{details, attendees, attendee_count}], the same shape as
+                    get_all_events_with_attendees_db.
+    """
+    sql = """
+        SELECT
+            e.event_id, e.name, e.event_date, e.attendee_count,
+            ARRAY(
+                SELECT AS STRUCT p.person_id, p.name
+                FROM Attendance@{FORCE_INDEX=AttendanceByEvent} AS x
+                JOIN Person AS p ON x.person_id = p.person_id
+                WHERE x.event_id = e.event_id
+                ORDER BY p.name
+                LIMIT @preview_size
+            ) AS attendee_preview
+        FROM Attendance AS a
+        JOIN Event AS e ON a.event_id = e.event_id
+        WHERE a.person_id = @person_id
+        ORDER BY e.event_date DESC
+        LIMIT @limit
+    """
+    params = {"person_id": person_id, "limit": limit, "preview_size": preview_size}
+    param_types_map = {
+        "person_id": param_types.STRING,
+        "limit": param_types.INT64,
+        "preview_size": param_types.INT64,
+    }
+    fields = ["event_id", "name", "event_date", "attendee_count", "attendee_preview"]
+    rows = run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
+    return [_event_with_attendee_preview(row) for row in rows]
 
 def get_event_details_with_locations_attendees_db(event_id):
     """
     Fetch full details for a single event, including its description,
     locations, and attendees.
     """
-    if not db:
+    if not get_db():
         raise ConnectionError("Spanner database connection not initialized.")
 
     event_details = {}
@@ -299,6 +688,359 @@ def get_event_details_with_locations_attendees_db(event_id):
         if loc.get("longitude") is not None: loc["longitude"] = float(loc["longitude"])
     return event_details
 
+def get_recent_attendance_db(since, reference_time, half_life_seconds):
+    """
+    Fetch the trending engine's seed: one row per event with attendance since
+    `since`, its name, date and locations, and its forward-decayed weight,
+    the sum of 2 ** ((attendance_time - reference_time) / half-life).
+
+    The aggregation runs in Spanner over the AttendanceByShardTime range, so only
+    one row per recently attended event comes back.
+
+    Returns:
+        tuple: (rows, read_timestamp); the seed covers exactly the
+               attendance committed up to read_timestamp.
+    """
+    sql = f"""
+        SELECT
+            e.event_id, e.name, e.event_date,
+            ARRAY(
+                SELECT AS STRUCT l.location_id, l.name, l.latitude, l.longitude
+                FROM EventLocation AS el
+                JOIN Location AS l ON el.location_id = l.location_id
+                WHERE el.event_id = e.event_id
+            ) AS locations,
+            recent.weight
+        FROM (
+            SELECT event_id,
+                   SUM(POW(2, TIMESTAMP_DIFF(attendance_time, @reference_time, MILLISECOND) / @half_life_ms)) AS weight
+            FROM Attendance@{{FORCE_INDEX=AttendanceByShardTime}}
+            WHERE {time_shard_filter()} AND attendance_time >= @since
+            GROUP BY event_id
+        ) AS recent
+        JOIN Event AS e ON e.event_id = recent.event_id
+    """
+    params = {"since": since, "reference_time": reference_time, "half_life_ms": half_life_seconds * 1000.0}
+    param_types_map = {
+        "since": param_types.TIMESTAMP,
+        "reference_time": param_types.TIMESTAMP,
+        "half_life_ms": param_types.FLOAT64,
+    }
+    fields = ["event_id", "name", "event_date", "locations", "weight"]
+    rows, read_timestamp = read_strong(sql, params=params, param_types=param_types_map, expected_fields=fields)
+    return [
+        dict(row, locations=[
+            {"location_id": loc[0], "name": loc[1], "latitude": loc[2], "longitude": loc[3]}
+            for loc in row["locations"] or []
+        ])
+        for row in rows
+    ], read_timestamp
+
+def get_posts_since_db(since=None):
+    """
+    Fetch posts to (re)build the in-process search and similarity indexes.
+
+    Args:
+        since (str, optional): ISO commit timestamp watermark. When given, only
+                               posts committed after it are returned. Without
+                               it, archived posts are included too; archiving
+                               keeps create_time, so they never show up as new.
+    """
+    sql = """
+        SELECT
+            p.post_id, p.author_id, p.text, p.sentiment, p.post_timestamp,
+            p.author_name, p.create_time
+        FROM {posts} AS p
+    """
+    params = None
+    param_types_map = None
+    if not since:
+        columns = "post_id, author_id, author_name, text, sentiment, post_timestamp, create_time"
+        sql = sql.format(posts=f"(SELECT {columns} FROM Post UNION ALL SELECT {columns} FROM {ARCHIVE_TABLE})")
+    else:
+        sql = sql.format(posts="Post@{FORCE_INDEX=PostByShardCreateTime}")
+        sql += f" WHERE {time_shard_filter('p')} AND p.create_time > @since"
+        params = {"since": parser.isoparse(since)}
+        param_types_map = {"since": param_types.TIMESTAMP}
+    fields = ["post_id", "author_id", "text", "sentiment", "post_timestamp", "author_name", "create_time"]
+    return run_query(sql, params=params, param_types=param_types_map, expected_fields=fields, query_class="feed", cache=False)
+
+# --- Change Feed ---
+CHANGES_MAX_LIMIT = 500
+
+# Each entry: (response key, commit timestamp column, SQL, fields). The SQL
+# filters on @since and leaves {at} for an optional "= @at" condition. The
+# commit timestamp indexes lead with time_shard, so every shard is selected.
+CHANGE_QUERIES = [
+    ("posts", "p.create_time", f"""
+        SELECT
+            p.post_id, p.author_id, p.author_name, p.text, p.sentiment,
+            p.post_timestamp, p.create_time
+        FROM Post@{{FORCE_INDEX=PostByShardCreateTime}} AS p
+        WHERE {time_shard_filter('p')} AND p.create_time > @since {{at}}
+        ORDER BY p.create_time
+    """, ["post_id", "author_id", "author_name", "text", "sentiment", "post_timestamp", "create_time"]),
+    ("events", "e.create_time", f"""
+        SELECT e.event_id, e.name, e.description, e.event_date, e.create_time
+        FROM Event@{{FORCE_INDEX=EventByShardCreateTime}} AS e
+        WHERE {time_shard_filter('e')} AND e.create_time > @since {{at}}
+        ORDER BY e.create_time
+    """, ["event_id", "name", "description", "event_date", "create_time"]),
+    ("attendances", "a.attendance_time", f"""
+        SELECT a.event_id, a.person_id, p.name AS person_name, a.attendance_time
+        FROM Attendance@{{FORCE_INDEX=AttendanceByShardTime}} AS a
+        JOIN Person AS p ON a.person_id = p.person_id
+        WHERE {time_shard_filter('a')} AND a.attendance_time > @since {{at}}
+        ORDER BY a.attendance_time
+    """, ["event_id", "person_id", "person_name", "attendance_time"]),
+]
+
+def _change_rows(snapshot, route, sql, column, fields, since, limit=None, at=None):
+    params = {"since": since}
+    types_map = {"since": param_types.TIMESTAMP}
+    condition = ""
+    if at is not None:
+        condition = f"AND {column} = @at"
+        params["at"] = at
+        types_map["at"] = param_types.TIMESTAMP
+    statement = sql.replace("{at}", condition)
+    if limit is not None:
+        statement += f" LIMIT {int(limit)}"
+    results = snapshot.execute_sql(statement, params=params, param_types=types_map, **route.execute_kwargs())
+    return [dict(zip(fields, row)) for row in results]
+
+def get_changes_since_db(since, limit=100):
+    """
+    Fetch posts, events and attendances committed after a watermark.
+
+    All three commit-timestamp range scans run in one strong snapshot, so
+    anything committed later has a larger timestamp than any row returned.
+    When a table has more than `limit` new rows the response is cut at a
+    commit boundary and every table is trimmed to the same `next_since`, so
+    the response holds exactly the changes in (since, next_since].
+
+    Args:
+        since (datetime): Commit timestamp watermark (exclusive).
+        limit (int): Maximum rows per table, before trimming.
+
+    Returns:
+        dict: {posts, events, attendances, next_since (datetime), has_more (bool)}
+    """
+    database = get_db()
+    if not database:
+        raise ConnectionError("Spanner database connection not initialized.")
+
+    tables = {}
+    safe_until = [] # Per truncated table: the newest commit timestamp it returned completely
+    route = _route_for("feed")
+    with spanner_guards["feed"].slot(), track_query("CHANGES since"):
+        # A stale read timestamp is safe here: next_since never passes it
+        with database.snapshot(**route.snapshot_kwargs(multi_use=True)) as snapshot:
+            for key, column, sql, fields in CHANGE_QUERIES:
+                field = column.split(".")[-1]
+                rows = _change_rows(snapshot, route, sql, column, fields, since, limit=limit + 1)
+                if len(rows) > limit:
+                    boundary = rows[limit][field]
+                    rows = [row for row in rows if row[field] < boundary]
+                    if not rows:
+                        # One commit wrote more than `limit` rows: return that commit whole
+                        rows = _change_rows(snapshot, route, sql, column, fields, since, at=boundary)
+                    safe_until.append(rows[-1][field])
+                tables[key] = (field, rows)
+
+    newest = [rows[-1][column] for column, rows in tables.values() if rows]
+    next_since = min(safe_until) if safe_until else max(newest, default=since)
+    result = {key: [row for row in rows if row[column] <= next_since] for key, (column, rows) in tables.items()}
+    result["next_since"] = next_since
+    result["has_more"] = bool(safe_until)
+    return result
+
+def get_post_ids_db():
+    """Fetch the id of every post, hot and archived, for search index reconciliation."""
+    sql = f"SELECT post_id FROM Post UNION ALL SELECT post_id FROM {ARCHIVE_TABLE}"
+    # Strong: a post indexed before this read must be in it unless deleted
+    rows, _ = read_strong(sql, expected_fields=["post_id"])
+    return [row["post_id"] for row in rows]
+
+def search_posts(query, limit=20, offset=0):
+    """Ranks posts against a keyword query using the in-memory search index."""
+    search_index.ensure_current(get_posts_since_db, get_post_ids_db)
+    return search_index.search(query, limit=limit, offset=offset)
+
+def get_similar_people(person_id, k=5):
+    """Finds people whose posts share the most interests with this person's posts."""
+    similarity_engine.ensure_current(get_posts_since_db)
+    return similarity_engine.similar_people(person_id, k=k)
+
+def get_similar_posts(post_id, k=5):
+    """Finds the posts most similar to the given post."""
+    similarity_engine.ensure_current(get_posts_since_db)
+    return similarity_engine.similar_posts(post_id=post_id, k=k)
+
+def get_trending_events(k=10):
+    """Returns the k events with the most recent (decayed) attendance, hottest first."""
+    trending_engine.ensure_loaded(get_recent_attendance_db)
+    return trending_engine.top_events(k)
+
+def get_trending_locations(k=10):
+    """Returns the k locations with the most recent (decayed) attendance, hottest first."""
+    trending_engine.ensure_loaded(get_recent_attendance_db)
+    return trending_engine.top_locations(k)
+
+def index_new_post(post):
+    """
+    Adds a freshly written post to the in-process indexes.
+    A failure in one index is logged and must not keep the post out of the other.
+    """
+    try:
+        search_index.add_post(post)
+        search_index.maybe_snapshot()
+    except Exception as e:
+        print(f"Warning: Could not add post {post.get('post_id')} to the search index: {e}")
+    try:
+        similarity_engine.add_post(post)
+    except Exception as e:
+        print(f"Warning: Could not add post {post.get('post_id')} to the similarity engine: {e}")
+
+
+# --- Home Page Cache ---
+HOME_CACHE_SOFT_TTL_SECONDS = float(os.environ.get("HOME_CACHE_SOFT_TTL_SECONDS", "5"))
+HOME_CACHE_HARD_TTL_SECONDS = float(os.environ.get("HOME_CACHE_HARD_TTL_SECONDS", "60"))
+TRENDING_PANEL_SIZE = 5
+
+def _load_home_feed():
+    return {
+        "posts": get_all_posts_with_author_db(),
+        "events": get_all_events_with_attendees_db(),
+        "trending": get_trending_events(TRENDING_PANEL_SIZE),
+    }
+
+# The home page serves this payload without waiting on Spanner unless it is
+# older than the hard TTL; writes mark it stale so the next view refreshes it.
+home_feed_cache = StaleWhileRevalidateCache(
+    "home_feed", _load_home_feed, HOME_CACHE_SOFT_TTL_SECONDS, HOME_CACHE_HARD_TTL_SECONDS
+)
+invalidation_bus.subscribe("home_feed", lambda key: home_feed_cache.mark_stale())
+
+
+# --- Outbox Subscribers ---
+# Every replica's dispatcher sees every committed post and event, so each one
+# updates its own in-process views. Cache keys are announced once, on the
+# invalidation bus, by the replica that made the write.
+
+def get_outbox_messages_after_db(after, limit):
+    """
+    Fetch up to `limit` outbox messages past `after`, a (create_time,
+    outbox_id) position, in commit order.
+    """
+    # The leading conjunct bounds each shard's index range; the rest skips
+    # the messages at after_time up to and including after_id
+    sql = f"""
+        SELECT outbox_id, topic, payload, origin, create_time
+        FROM {OUTBOX_TABLE}@{{FORCE_INDEX=OutboxByShardCreateTime}}
+        WHERE {time_shard_filter()} AND create_time >= @after_time
+          AND (create_time > @after_time OR outbox_id > @after_id)
+        ORDER BY create_time, outbox_id
+        LIMIT @limit
+    """
+    params = {"after_time": after[0], "after_id": after[1], "limit": limit}
+    param_types_map = {
+        "after_time": param_types.TIMESTAMP,
+        "after_id": param_types.STRING,
+        "limit": param_types.INT64,
+    }
+    fields = ["outbox_id", "topic", "payload", "origin", "create_time"]
+    rows, _ = read_strong(sql, params=params, param_types=param_types_map, expected_fields=fields)
+    return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+
+def get_outbox_start_offset_db():
+    """
+    Fetch the position of the newest outbox message, where this replica's
+    dispatcher starts: everything committed after it sorts past it.
+    """
+    sql = f"""
+        SELECT create_time, outbox_id
+        FROM {OUTBOX_TABLE}@{{FORCE_INDEX=OutboxByShardCreateTime}}
+        WHERE {time_shard_filter()}
+        ORDER BY create_time DESC, outbox_id DESC
+        LIMIT 1
+    """
+    rows, read_timestamp = read_strong(sql, expected_fields=["create_time", "outbox_id"])
+    if rows:
+        return (rows[0]["create_time"], rows[0]["outbox_id"])
+    # Empty outbox: anything committed later has a later timestamp than this read
+    return (read_timestamp, "")
+
+def _index_outbox_posts(messages):
+    for message in messages:
+        post = dict(message["payload"])
+        post["post_timestamp"] = parser.isoparse(post["post_timestamp"]) if post.get("post_timestamp") else None
+        index_new_post(post)
+
+def _record_outbox_attendance(messages):
+    for message in messages:
+        event = message["payload"]
+        trending_engine.record_attendance(event, attendees=len(event.get("attendee_ids") or []), at=message["create_time"])
+
+def _publish_outbox_to_live_feed(messages):
+    for message in messages:
+        feed_bus.publish(message["topic"], message["payload"])
+
+def _invalidate_outbox_caches(messages):
+    if any(message["origin"] == invalidation_bus.replica_id for message in messages):
+        invalidation_bus.invalidate("home_feed")
+
+outbox_dispatcher = OutboxDispatcher(get_outbox_messages_after_db, get_outbox_start_offset_db)
+outbox_dispatcher.subscribe("search", _index_outbox_posts, topics=["post"])
+outbox_dispatcher.subscribe("trending", _record_outbox_attendance, topics=["event"])
+outbox_dispatcher.subscribe("live_feed", _publish_outbox_to_live_feed)
+outbox_dispatcher.subscribe("caches", _invalidate_outbox_caches)
+
+@app.before_request
+def start_replica_workers():
+    # Started by the first request, so the debug reloader's watcher process
+    # never binds the bus or polls the outbox
+    if not invalidation_bus.started:
+        invalidation_bus.start()
+    if not outbox_dispatcher.started:
+        outbox_dispatcher.start()
+
+
+def get_person_sentiment_rollup_db(person_id, days=30):
+    """
+    Fetch a person's daily sentiment counters for the last `days` days
+    (all days if `days` is 0), with totals over that window.
+    """
+    sql = """
+        SELECT day, positive_count, neutral_count, negative_count
+        FROM PersonSentimentDaily
+        WHERE person_id = @person_id AND day >= @since_day
+        ORDER BY day DESC
+    """
+    since_day = (datetime.now(timezone.utc) - timedelta(days=days)).date() if days else datetime(1970, 1, 1).date()
+    params = {"person_id": person_id, "since_day": since_day}
+    param_types_map = {"person_id": param_types.STRING, "since_day": param_types.DATE}
+    fields = ["day", "positive", "neutral", "negative"]
+    return summarize_rollup_rows(run_query(sql, params=params, param_types=param_types_map, expected_fields=fields))
+
+def get_global_sentiment_rollup_db(days=30):
+    """
+    Fetch the platform-wide daily sentiment counters (summed over the counter
+    shards) for the last `days` days, with totals over that window.
+    """
+    sql = """
+        SELECT day, SUM(positive_count), SUM(neutral_count), SUM(negative_count)
+        FROM SentimentDaily
+        WHERE day >= @since_day
+        GROUP BY day
+        ORDER BY day DESC
+    """
+    since_day = (datetime.now(timezone.utc) - timedelta(days=days)).date() if days else datetime(1970, 1, 1).date()
+    params = {"since_day": since_day}
+    param_types_map = {"since_day": param_types.DATE}
+    fields = ["day", "positive", "neutral", "negative"]
+    return summarize_rollup_rows(run_query(sql, params=params, param_types=param_types_map, expected_fields=fields, query_class="feed"))
+
 
 # --- Custom Jinja Filter ---
 @app.template_filter('humanize_datetime')
@@ -349,9 +1091,90 @@ def _jinja2_filter_humanize_datetime(value, default="just now"):
         return dt_object.strftime("%Y-%m-%d %H:%M")
 
 
+# --- Person Name Cache ---
+# Hot name -> person_id map for the write APIs. A cached id is only a hint:
+# it is re-checked with a point read inside the write transaction.
+PERSON_NAME_CACHE_TTL_SECONDS = float(os.environ.get("PERSON_NAME_CACHE_TTL_SECONDS", "300"))
+PERSON_NAME_CACHE_MAX = int(os.environ.get("PERSON_NAME_CACHE_MAX", "10000"))
+_person_name_cache = {} # name -> (person_id, expires_at)
+_person_name_cache_lock = threading.Lock()
+
+class PersonNotFoundError(LookupError):
+    """No Person row has the given name."""
+    def __init__(self, name):
+        super().__init__(f"Person '{name}' not found")
+        self.name = name
+
+def _cached_person_id(name):
+    with _person_name_cache_lock:
+        entry = _person_name_cache.get(name)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        _person_name_cache.pop(name, None)
+        return None
+
+def _cache_person_id(name, person_id):
+    with _person_name_cache_lock:
+        if len(_person_name_cache) >= PERSON_NAME_CACHE_MAX:
+            _person_name_cache.clear()
+        _person_name_cache[name] = (person_id, time.monotonic() + PERSON_NAME_CACHE_TTL_SECONDS)
+
+def _forget_person_name(name):
+    with _person_name_cache_lock:
+        _person_name_cache.pop(name, None)
+
+def resolve_person_ids_in_transaction(transaction, names):
+    """
+    Resolves person names to ids inside a read-write transaction.
+
+    Cached ids are confirmed with one point read by primary key; the rest are
+    looked up with a single IN UNNEST query. Either way the rows are read in
+    the transaction, so the writes that follow see a consistent author.
+
+    Returns:
+        dict: name -> person_id for every name.
+
+    Raises:
+        PersonNotFoundError: If a name matches no person.
+    """
+    unique_names = list(dict.fromkeys(names))
+    resolved = {}
+
+    cached = {name: _cached_person_id(name) for name in unique_names}
+    cached = {name: person_id for name, person_id in cached.items() if person_id}
+    if cached:
+        rows = transaction.read(
+            table="Person",
+            columns=["person_id", "name"],
+            keyset=spanner.KeySet(keys=[[person_id] for person_id in set(cached.values())]),
+        )
+        current_names = {person_id: name for person_id, name in rows}
+        for name, person_id in cached.items():
+            if current_names.get(person_id) == name:
+                resolved[name] = person_id
+            else:
+                _forget_person_name(name)
+
+    missing = [name for name in unique_names if name not in resolved]
+    if missing:
+        rows = transaction.execute_sql(
+            "SELECT person_id, name FROM Person WHERE name IN UNNEST(@names)",
+            params={"names": missing},
+            param_types={"names": param_types.Array(param_types.STRING)},
+        )
+        for person_id, name in rows:
+            if name not in resolved:
+                resolved[name] = person_id
+                _cache_person_id(name, person_id)
+
+    for name in unique_names:
+        if name not in resolved:
+            raise PersonNotFoundError(name)
+    return resolved
+
 def get_person_by_name_db(name):
     """Fetch a person's ID by their name from Spanner."""
-    if not db:
+    if not get_db():
         print("Error: Database connection is not available.")
         raise ConnectionError("Spanner database connection not initialized.")
 
@@ -368,38 +1191,75 @@ def get_person_by_name_db(name):
         raise e # Re-raise to be caught by the API endpoint handler
 
 # --- Helper function to insert a post ---
-def add_post_db(post_id, author_id, text, sentiment=None):
-    """Inserts a new post into the Spanner database."""
-    if not db:
+def add_post_db(post_id, author_id, text, sentiment=None, author_name=None):
+    """
+    Inserts a new post into the Spanner database, with an outbox message
+    that updates the in-process indexes, caches and live feed afterwards.
+
+    If author_id is None the author is resolved from author_name inside the
+    same read-write transaction, so the lookup and the insert are one commit.
+    Otherwise the author's name is read in that transaction. Either way the
+    name is stored on the post (Post.author_name) so feeds need no join.
+
+    Returns:
+        str or bool: The author's person_id on success, False otherwise.
+
+    Raises:
+        PersonNotFoundError: If author_name matches no person.
+    """
+    if not get_db():
         print("Error: Database connection is not available for insert.")
         raise ConnectionError("Spanner database connection not initialized.")
 
+    post_timestamp = datetime.now(timezone.utc) # Use current UTC time for post_timestamp
+
     def _insert_post(transaction):
+        if author_id:
+            resolved_author_id = author_id
+            rows = list(transaction.read(table="Person", columns=["name"], keyset=spanner.KeySet(keys=[[author_id]])))
+            resolved_author_name = rows[0][0] if rows else None
+        else:
+            resolved_author_id = resolve_person_ids_in_transaction(transaction, [author_name])[author_name]
+            resolved_author_name = author_name
         transaction.insert(
             table="Post",
             columns=[
-                "post_id", "author_id", "text", "sentiment",
+                "post_id", "author_id", "author_name", "text", "sentiment",
                 "post_timestamp", "create_time"
             ],
             values=[(
-                post_id, author_id, text, sentiment,
-                datetime.now(timezone.utc), # Use current UTC time for post_timestamp
+                post_id, resolved_author_id, resolved_author_name, text, sentiment,
+                post_timestamp,
                 spanner.COMMIT_TIMESTAMP   # Use commit time for create_time
             )]
         )
         print(f"Transaction attempting to insert post_id: {post_id}")
+        # Count the post in the sentiment rollups within the same commit
+        increment_sentiment_rollups(transaction, post_id, resolved_author_id, sentiment, post_timestamp)
+        increment_counter(transaction, "Person", "person_id", resolved_author_id, "post_count")
+        enqueue_outbox(transaction, "post", {
+            "post_id": post_id, "author_id": resolved_author_id, "author_name": resolved_author_name,
+            "text": text, "sentiment": sentiment, "post_timestamp": post_timestamp,
+        }, origin=invalidation_bus.replica_id)
+        return resolved_author_id, resolved_author_name
 
     try:
-        db.run_in_transaction(_insert_post)
+        with spanner_guards["write"].slot(expected_errors=PersonNotFoundError), track_query("TRANSACTION insert Post"):
+            author_id, author_name = get_db().run_in_transaction(_insert_post)
+            clear_request_memo() # Reads after this write must see it
+            pin_reads_to_leader()
+        outbox_dispatcher.wake()
         print(f"Successfully inserted post_id: {post_id}")
-        return True
+    except (SpannerUnavailableError, PersonNotFoundError):
+        raise # Fail fast; the API maps ConnectionError to 503 and PersonNotFoundError to 404
     except Exception as e:
         print(f"Error inserting post (id: {post_id}): {e}")
         # Log the full traceback for detailed debugging if needed
         # traceback.print_exc()
         return False # Indicate failure
+    return author_id
 
-def add_full_event_with_details_db(event_id, event_name, description, event_date, locations_data, attendee_ids):
+def add_full_event_with_details_db(event_id, event_name, description, event_date, locations_data, attendee_ids=None, attendee_names=None):
     """
     Inserts a new event with its title, description, multiple locations,
     and its first attendee into Spanner within a transaction.
@@ -411,32 +1271,50 @@ def add_full_event_with_details_db(event_id, event_name, description, event_date
         event_date (datetime): Date/time of the event (timezone-aware recommended).
         locations_data (list[dict]): A list of location dictionaries. Each dict should contain:
                                      'name', 'description', 'latitude', 'longitude', 'address'.
-        attendee_ids (list[str]): A list of person_ids for the attendees.
+        attendee_ids (list[str], optional): A list of person_ids for the attendees.
+        attendee_names (list[str], optional): Attendee names, resolved to person_ids
+                                              inside the transaction when attendee_ids
+                                              is not given.
 
     Returns:
-        bool: True if the transaction was successful, False otherwise.
+        list[str] or bool: The attendee person_ids if the transaction was
+                           successful, False otherwise.
+
+    Raises:
+        PersonNotFoundError: If an attendee name matches no person.
     """
-    if not db:
+    if not get_db():
         print("Error: Database connection is not available for full event insert.")
         raise ConnectionError("Spanner database connection not initialized.")
 
     def _insert_event_and_attendee(transaction):
+        if attendee_ids is not None:
+            resolved_attendee_ids = list(attendee_ids)
+        else:
+            resolved = resolve_person_ids_in_transaction(transaction, attendee_names or [])
+            resolved_attendee_ids = list(dict.fromkeys(resolved[name] for name in attendee_names or []))
+
         # Insert into Event table (Simplified Schema)
         transaction.insert(
             table="Event",
             columns=[
-                "event_id", "name", "description", "event_date", "create_time"
+                "event_id", "name", "description", "event_date", "attendee_count", "create_time"
             ],
             values=[(
-                event_id, event_name, description, event_date,
+                event_id, event_name, description, event_date, len(resolved_attendee_ids),
                 spanner.COMMIT_TIMESTAMP
             )]
         )
         print(f"Transaction attempting to insert event_id: {event_id}")
 
         # Insert Locations and EventLocation links
+        new_locations = []
         for loc_data in locations_data:
             location_id = str(uuid.uuid4())
+            new_locations.append({
+                "location_id": location_id, "name": loc_data.get("name"),
+                "latitude": float(loc_data.get("latitude", 0.0)), "longitude": float(loc_data.get("longitude", 0.0)),
+            })
             transaction.insert(
                 table="Location",
                 columns=["location_id", "name", "description", "latitude", "longitude", "address", "create_time"],
@@ -455,87 +1333,140 @@ def add_full_event_with_details_db(event_id, event_name, description, event_date
             print(f"Transaction attempting to link event {event_id} with location {location_id}")
 
         # Insert each attendee into Attendance table
-        if attendee_ids:
-            for attendee_id_to_add in attendee_ids:
+        if resolved_attendee_ids:
+            for attendee_id_to_add in resolved_attendee_ids:
                 transaction.insert(
                     table="Attendance",
                     columns=["event_id", "person_id", "attendance_time"],
                     values=[(event_id, attendee_id_to_add, spanner.COMMIT_TIMESTAMP)]
                 )
                 print(f"Transaction attempting to insert attendee {attendee_id_to_add} for event {event_id} into Attendance")
+        enqueue_outbox(transaction, "event", {
+            "event_id": event_id, "name": event_name, "event_date": event_date,
+            "attendee_ids": resolved_attendee_ids, "locations": new_locations,
+        }, origin=invalidation_bus.replica_id)
+        return resolved_attendee_ids
 
     try:
-        db.run_in_transaction(_insert_event_and_attendee)
+        with spanner_guards["write"].slot(expected_errors=PersonNotFoundError), track_query("TRANSACTION insert Event"):
+            attendee_ids = get_db().run_in_transaction(_insert_event_and_attendee)
+            clear_request_memo() # Reads after this write must see it
+            pin_reads_to_leader()
+        outbox_dispatcher.wake()
         print(f"Successfully inserted event {event_id} with details and attendees {attendee_ids}")
-        return True
+        return attendee_ids
+    except (SpannerUnavailableError, PersonNotFoundError):
+        raise # Fail fast; the API maps ConnectionError to 503 and PersonNotFoundError to 404
     except Exception as e:
         print(f"Error inserting full event (event_id: {event_id}, attendee_ids: {attendee_ids}): {e}")
         traceback.print_exc() # Log detailed error
         return False # Indicate failure
 
+@app.template_global()
+def deferred(value):
+    """
+    Resolves a template value that a streamed view passed as a callable.
+
+    The page shell is sent before these run, so a failure can no longer be
+    flashed; it is logged and None is returned for the template to show an
+    inline error instead.
+    """
+    if not callable(value):
+        return value
+    try:
+        return value()
+    except Exception as e:
+        print(f"Error loading deferred template data: {e}")
+        traceback.print_exc()
+        return None
+
+def _render_page(template_name, **context):
+    """
+    Streams a page whose context may hold deferred values.
+    Under a strict query budget (tests, QUERY_BUDGET_STRICT) the page is
+    rendered in one piece instead, so an over-budget route still fails.
+    """
+    if budget_is_strict():
+        return render_template(template_name, **context)
+    return stream_template(template_name, **context)
+
 # --- Routes ---
 @app.route('/')
+@query_budget(3)
 def home():
-    """Home page: Shows all posts and the events panel."""
-    all_posts = []
-    all_events_attendance = [] # Initialize
-
-    if not db:
+    """
+    Home page: Shows all posts and the events panel.
+    The page shell is streamed first; posts and events are rendered as soon
+    as the home feed is loaded.
+    """
+    if not get_db():
         flash("Database connection not available. Cannot load page data.", "danger")
-    else:
-        try:
-            # Fetch both posts and events
-            all_posts = get_all_posts_with_author_db()
-            all_events_attendance = get_all_events_with_attendees_db() # Fetch events
-        except Exception as e:
-             flash(f"Failed to load page data: {e}", "danger")
-             # Ensure variables are defined even on error
-             all_posts = []
-             all_events_attendance = []
 
-    return render_template(
+    home_feed = {}
+    def _load_home_feed_once():
+        # Posts and events come from one cached payload (possibly slightly
+        # stale, refreshed in the background)
+        if not home_feed:
+            home_feed.update(home_feed_cache.get())
+        return home_feed
+
+    return _render_page(
         'index.html',
-        posts=all_posts,
-        all_events_attendance=all_events_attendance, # Pass events to template
+        posts=lambda: _load_home_feed_once()["posts"],
+        all_events_attendance=lambda: _load_home_feed_once()["events"], # Pass events to template
+        trending=lambda: _load_home_feed_once()["trending"],
         google_maps_api_key=GOOGLE_MAPS_API_KEY, # For potential future use on home page
         google_maps_map_id=GOOGLE_MAPS_MAP_KEY # Pass it to the template
     )
 
 
+@app.route('/feed/stream')
+def feed_stream():
+    """
+    Server-Sent Events stream of new posts and events as they are committed.
+    The home page subscribes once instead of reloading to see new content.
+    """
+    subscriber = feed_bus.subscribe()
+    response = Response(feed_bus.stream(subscriber), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Don't let proxies buffer the stream
+    return response
+
+
 @app.route('/person/<string:person_id>')
+@query_budget(7) # Posts may continue into the archive
 def person_profile(person_id):
-    """Person profile page, fetching data from Spanner."""
-    if not db:
+    """
+    Person profile page, fetching data from Spanner.
+    The person is looked up first (for the title and a proper 404); the page
+    then streams while each panel's query runs as that panel is rendered.
+    """
+    if not get_db():
         flash("Database connection not available. Cannot load profile.", "danger")
         abort(503) # Service Unavailable
 
     try:
         person = get_person_db(person_id)
-        if not person:
-            abort(404) # Person not found
-
-        person_posts = get_posts_by_person_db(person_id)
-        friends = get_friends_db(person_id)
-        all_events_attendance = get_all_events_with_attendees_db()
-
     except Exception as e:
-         flash(f"Failed to load profile data: {e}", "danger")
-         # Redirect to home or show an error page might be better than aborting
-         return render_template('person.html', person=person, person_posts=[], friends=[], all_events_attendance=[], error=True)
+        print(f"Error fetching person {person_id}: {e}")
+        abort(503)
+    if not person:
+        abort(404) # Person not found
 
-
-    return render_template(
+    return _render_page(
         'person.html',
         person=person,
-        person_posts=person_posts,
-        friends=friends,
-        all_events_attendance=all_events_attendance
+        person_posts=lambda: get_posts_by_person_db(person_id),
+        friends=lambda: get_friends_db(person_id),
+        suggestions=lambda: get_friend_suggestions_db(person_id),
+        all_events_attendance=lambda: get_person_events_with_attendees_db(person_id)
     )
 
 @app.route('/event/<string:event_id>')
+@query_budget(3)
 def event_detail_page(event_id):
     """Event detail page showing description, locations on a map, and attendees."""
-    if not db:
+    if not get_db():
         flash("Database connection not available. Cannot load event details.", "danger")
         abort(503) # Service Unavailable
 
@@ -558,13 +1489,389 @@ def event_detail_page(event_id):
     return render_template('event_detail.html', event=event_data, google_maps_api_key=GOOGLE_MAPS_API_KEY)
 
 
+@app.route('/search')
+def search_page():
+    """Search page: ranks posts matching the 'q' query parameter."""
+    query = request.args.get('q', '').strip()
+    results = []
+    total = 0
+
+    if query:
+        if not get_db():
+            flash("Database connection not available. Cannot search posts.", "danger")
+        else:
+            try:
+                results, total = search_posts(query, limit=50)
+            except Exception as e:
+                flash(f"Failed to search posts: {e}", "danger")
+                traceback.print_exc()
+
+    return render_template('search.html', query=query, results=results, total=total)
+
+
+@app.route('/api/search', methods=['GET'])
+def search_api():
+    """
+    API endpoint for keyword search over posts.
+    Query parameters: q (required), limit (default 20, max 100), offset (default 0).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing 'q' query parameter"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "'limit' and 'offset' must be integers"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+
+    try:
+        results, total = search_posts(query, limit=limit, offset=offset)
+        return jsonify({"query": query, "total": total, "offset": offset, "results": results})
+    except ConnectionError as e:
+        print(f"ConnectionError during search: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing search request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/people/<string:person_id>/similar', methods=['GET'])
+def similar_people_api(person_id):
+    """
+    API endpoint listing people with similar interests, based on their posts.
+    Query parameters: k (default 5, max 50).
+    """
+    try:
+        k = min(max(int(request.args.get('k', 5)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "'k' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+
+    try:
+        return jsonify({"person_id": person_id, "results": get_similar_people(person_id, k=k)})
+    except ConnectionError as e:
+        print(f"ConnectionError during similar people lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing similar people request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/posts/<string:post_id>/similar', methods=['GET'])
+def similar_posts_api(post_id):
+    """
+    API endpoint listing posts similar to the given post.
+    Query parameters: k (default 5, max 50).
+    """
+    try:
+        k = min(max(int(request.args.get('k', 5)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "'k' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+
+    try:
+        return jsonify({"post_id": post_id, "results": get_similar_posts(post_id, k=k)})
+    except ConnectionError as e:
+        print(f"ConnectionError during similar posts lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing similar posts request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/people/<string:person_id>/sentiment', methods=['GET'])
+def person_sentiment_api(person_id):
+    """
+    API endpoint returning a person's sentiment rollup.
+    Query parameters: days (default 30, 0 for all time).
+    """
+    try:
+        days = max(int(request.args.get('days', 30)), 0)
+    except ValueError:
+        return jsonify({"error": "'days' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+
+    try:
+        rollup = get_person_sentiment_rollup_db(person_id, days=days)
+        return jsonify({"person_id": person_id, "window_days": days, **rollup})
+    except ConnectionError as e:
+        print(f"ConnectionError during sentiment rollup lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing sentiment rollup request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/sentiment', methods=['GET'])
+def global_sentiment_api():
+    """
+    API endpoint returning the platform-wide sentiment rollup.
+    Query parameters: days (default 30, 0 for all time).
+    """
+    try:
+        days = max(int(request.args.get('days', 30)), 0)
+    except ValueError:
+        return jsonify({"error": "'days' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+
+    try:
+        return jsonify({"window_days": days, **get_global_sentiment_rollup_db(days=days)})
+    except ConnectionError as e:
+        print(f"ConnectionError during sentiment rollup lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing sentiment rollup request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/trending', methods=['GET'])
+def trending_api():
+    """
+    API endpoint for what is hot right now: events or locations ranked by
+    recent attendance, decayed with a TRENDING_HALF_LIFE_HOURS half-life.
+    Query parameters: kind ("events" or "locations", default "events"),
+    k (default 10, max 50).
+    """
+    kind = request.args.get('kind', 'events')
+    if kind not in ("events", "locations"):
+        return jsonify({"error": "'kind' must be 'events' or 'locations'"}), 400
+    try:
+        k = min(max(int(request.args.get('k', 10)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "'k' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+
+    try:
+        results = get_trending_events(k) if kind == "events" else get_trending_locations(k)
+        return jsonify({"kind": kind, "results": results})
+    except ConnectionError as e:
+        print(f"ConnectionError during trending lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing trending request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/changes', methods=['GET'])
+@query_budget(1)
+def changes_api():
+    """
+    API endpoint returning what was committed after a watermark.
+    Query parameters: since (commit timestamp from a previous 'next_since';
+    omit to start from the beginning), limit (default 100, max 500).
+    Poll again with since=next_since; has_more means the next poll is
+    already non-empty.
+    """
+    since_str = request.args.get('since', '').strip()
+    try:
+        since = parser.isoparse(since_str) if since_str else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    except ValueError:
+        return jsonify({"error": "'since' must be an ISO 8601 timestamp"}), 400
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), CHANGES_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+    try:
+        changes = get_changes_since_db(since, limit=limit)
+    except ConnectionError as e:
+        print(f"ConnectionError during changes lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing changes request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+    def _iso(row):
+        return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+    return jsonify({
+        "since": since.isoformat(),
+        "next_since": changes["next_since"].isoformat(),
+        "has_more": changes["has_more"],
+        "posts": [_iso(row) for row in changes["posts"]],
+        "events": [_iso(row) for row in changes["events"]],
+        "attendances": [_iso(row) for row in changes["attendances"]],
+    })
+
+
+@app.route('/api/people/<string:person_id>/friends', methods=['GET'])
+def friends_api(person_id):
+    """API endpoint listing a person's friends."""
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+    try:
+        return jsonify({"person_id": person_id, "results": get_friends_db(person_id)})
+    except ConnectionError as e:
+        print(f"ConnectionError during friends lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing friends request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/people/<string:person_id>/mutual-friends/<string:other_id>', methods=['GET'])
+def mutual_friends_api(person_id, other_id):
+    """API endpoint listing the friends two people have in common."""
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+    try:
+        mutual_ids = get_social_graph().mutual_friends(person_id, other_id)
+        return jsonify({"person_id": person_id, "other_id": other_id, "results": get_people_by_ids_db(mutual_ids)})
+    except ConnectionError as e:
+        print(f"ConnectionError during mutual friends lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing mutual friends request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/people/<string:person_id>/network', methods=['GET'])
+def network_api(person_id):
+    """
+    API endpoint listing everyone within k friendship hops of a person.
+    Query parameters: k (default 2, max 4).
+    """
+    try:
+        k = min(max(int(request.args.get('k', 2)), 1), 4)
+    except ValueError:
+        return jsonify({"error": "'k' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+    try:
+        distances = get_social_graph().neighborhood(person_id, k=k)
+        people = get_people_by_ids_db(list(distances))
+        for person in people:
+            person['hops'] = distances[person['person_id']]
+        people.sort(key=lambda person: person['hops'])
+        return jsonify({"person_id": person_id, "k": k, "results": people})
+    except ConnectionError as e:
+        print(f"ConnectionError during network lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing network request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/people/<string:person_id>/path/<string:other_id>', methods=['GET'])
+def friendship_path_api(person_id, other_id):
+    """API endpoint returning the shortest chain of friends between two people."""
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+    try:
+        path = get_social_graph().shortest_path(person_id, other_id)
+        if path is None:
+            return jsonify({"error": "No friendship path found between these people"}), 404
+        names = {person['person_id']: person['name'] for person in get_people_by_ids_db(path)}
+        return jsonify({
+            "person_id": person_id, "other_id": other_id, "hops": len(path) - 1,
+            "path": [{"person_id": pid, "name": names.get(pid)} for pid in path],
+        })
+    except ConnectionError as e:
+        print(f"ConnectionError during friendship path lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing friendship path request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/people/<string:person_id>/suggestions', methods=['GET'])
+def friend_suggestions_api(person_id):
+    """
+    API endpoint returning "people you may know" for a person.
+    Query parameters: limit (default 5, max 10).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 5)), 1), 10)
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+    try:
+        return jsonify({"person_id": person_id, "results": get_friend_suggestions_db(person_id, limit=limit)})
+    except ConnectionError as e:
+        print(f"ConnectionError during friend suggestions lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing friend suggestions request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/api/posts', methods=['GET'])
+@query_budget(2)
+def list_posts_api():
+    """
+    API endpoint paging through posts, newest first, including archived ones.
+    Query parameters: cursor (a previous 'next_cursor'; omit for the first
+    page), limit (default 20, max 100), author_id (optional).
+    """
+    cursor = request.args.get('cursor', '').strip() or None
+    author_id = request.args.get('author_id', '').strip() or None
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), POSTS_PAGE_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    if cursor:
+        try:
+            decode_post_cursor(cursor)
+        except ValueError:
+            return jsonify({"error": "Invalid 'cursor'"}), 400
+
+    if not get_db():
+        return jsonify({"error": "Database connection not available"}), 503
+    try:
+        posts, next_cursor = get_posts_page_db(cursor=cursor, limit=limit, author_id=author_id)
+    except ConnectionError as e:
+        print(f"ConnectionError during posts page lookup: {e}")
+        return jsonify({"error": "Database connection error during operation"}), 503
+    except Exception as e:
+        print(f"Unexpected error processing posts page request: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+    for post in posts:
+        post["post_timestamp"] = post["post_timestamp"].isoformat()
+    return jsonify({"results": posts, "next_cursor": next_cursor})
+
+
 @app.route('/api/posts', methods=['POST'])
+@query_budget(1)
 def add_post_api():
     """
     API endpoint to add a new post.
     Expects JSON body: {"author_name": "...", "text": "...", "sentiment": "..." (optional)}
     """
-    if not db:
+    if not get_db():
         return jsonify({"error": "Database connection not available"}), 503 # Service Unavailable
 
     data = request.get_json()
@@ -586,24 +1893,20 @@ def add_post_api():
          return jsonify({"error": "'sentiment' must be a string if provided"}), 400
 
     try:
-        # 1. Find the author_id using the provided name
-        author_id = get_person_by_name_db(author_name)
-        if not author_id:
-            return jsonify({"error": f"Author '{author_name}' not found"}), 404 # Not Found
-
-        # 2. Generate a unique ID for the new post
+        # 1. Generate a unique ID for the new post
         new_post_id = str(uuid.uuid4())
 
-        # 3. Insert the post into the database
-        success = add_post_db(
+        # 2. Resolve the author and insert the post in one transaction
+        author_id = add_post_db(
             post_id=new_post_id,
-            author_id=author_id,
+            author_id=None,
             text=text,
-            sentiment=sentiment
+            sentiment=sentiment,
+            author_name=author_name
         )
 
-        if success:
-            # 4. Return a success response
+        if author_id:
+            # 3. Return a success response
             post_data = {
                 "message": "Post added successfully",
                 "post_id": new_post_id,
@@ -619,12 +1922,14 @@ def add_post_api():
             # Insertion failed for some reason (logged in add_post_db)
             return jsonify({"error": "Failed to save post to the database"}), 500 # Internal Server Error
 
+    except PersonNotFoundError:
+        return jsonify({"error": f"Author '{author_name}' not found"}), 404 # Not Found
     except ConnectionError as e:
          # Handle case where db connection failed specifically in this request path
          print(f"ConnectionError during post add: {e}")
          return jsonify({"error": "Database connection error during operation"}), 503
     except Exception as e:
-        # Catch any other unexpected errors (e.g., from get_person_by_name_db)
+        # Catch any other unexpected errors (e.g., from add_post_db)
         print(f"Unexpected error processing add post request: {e}")
         traceback.print_exc() # Log detailed error for server admin
         return jsonify({"error": "An internal server error occurred"}), 500
@@ -632,6 +1937,7 @@ def add_post_api():
 
 
 @app.route('/api/events', methods=['POST'])
+@query_budget(1)
 def add_event_api():
     """
     API endpoint to add a new event and its first attendee (simplified schema).
@@ -645,7 +1951,7 @@ def add_event_api():
         "attendee_names": ["...", "..."] // List of attendee names
     }
     """
-    if not db:
+    if not get_db():
         return jsonify({"error": "Database connection not available"}), 503
 
     data = request.get_json()
@@ -719,34 +2025,25 @@ def add_event_api():
         return jsonify({"error": f"Invalid timestamp format for 'event_date'. Use ISO 8601 (e.g., YYYY-MM-DDTHH:MM:SSZ or YYYY-MM-DDTHH:MM:SS+HH:MM). Details: {e}"}), 400
 
     try:
-        # 1. Find person_ids for all attendee names
-        attendee_ids_to_add = []
-        processed_attendees_info = []
-        for attendee_name_str in attendee_names:
-            attendee_id = get_person_by_name_db(attendee_name_str)
-            if not attendee_id:
-                return jsonify({"error": f"Attendee '{attendee_name_str}' not found"}), 404 # Not Found
-            attendee_ids_to_add.append(attendee_id)
-            processed_attendees_info.append({"id": attendee_id, "name": attendee_name_str})
-
-        if not attendee_ids_to_add: # Should be caught by earlier validation, but good check
-            return jsonify({"error": "No valid attendees found or provided."}), 400
-
-        # 2. Generate a unique ID for the new event
+        # 1. Generate a unique ID for the new event
         new_event_id = str(uuid.uuid4())
 
-        # 3. Insert the event and all attendees atomically
-        success = add_full_event_with_details_db(
+        # 2. Resolve attendee names and insert the event and all attendees in one transaction
+        attendee_ids_added = add_full_event_with_details_db(
             event_id=new_event_id,
             event_name=event_name,
             description=description,
             event_date=event_date,
             locations_data=locations_data,
-            attendee_ids=attendee_ids_to_add,
+            attendee_names=attendee_names,
         )
 
-        if success:
-            # 4. Return a success response
+        if attendee_ids_added:
+            processed_attendees_info = [
+                {"id": attendee_id, "name": name}
+                for attendee_id, name in zip(attendee_ids_added, dict.fromkeys(attendee_names))
+            ]
+            # 3. Return a success response
             event_data = {
                 "message": "Event and attendees added successfully",
                 "event_id": new_event_id,
@@ -761,6 +2058,8 @@ def add_event_api():
             # Insertion failed (error logged in helper function)
             return jsonify({"error": "Failed to save event and attendee to the database"}), 500 # Internal Server Error
 
+    except PersonNotFoundError as e:
+        return jsonify({"error": f"Attendee '{e.name}' not found"}), 404 # Not Found
     except ConnectionError as e:
          print(f"ConnectionError during event add: {e}")
          return jsonify({"error": "Database connection error during operation"}), 503
@@ -782,6 +2081,41 @@ def internal_server_error(e):
      print(f"Internal Server Error: {e}")
      return render_template('500.html'), 500 # You'll need to create 500.html
 
+# --- Health Probes ---
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness probe: the process is up and serving. Never touches Spanner."""
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness probe: Spanner answers a probe query (cached for
+    READY_PROBE_TTL_SECONDS). Also reports session pool warmth and which
+    in-process indexes have been loaded.
+    """
+    probe = probe_database()
+    body = {
+        "status": "ready" if probe["ok"] else "unavailable",
+        "database": probe,
+        "pool": session_pool_status(),
+        "breakers": {name: guard.status() for name, guard in spanner_guards.items()},
+        "home_feed_cache": home_feed_cache.status(),
+        "invalidation_bus": invalidation_bus.status(),
+        "outbox": outbox_dispatcher.status(),
+        "read_routes": {name: route.status() for name, route in READ_ROUTES.items()},
+        "indexes": {
+            "search": search_index.loaded,
+            "similarity": similarity_engine.loaded,
+            "social_graph": social_graph.loaded,
+            "trending": trending_engine.loaded,
+        },
+    }
+    return jsonify(body), 200 if probe["ok"] else 503
+
+
 @app.errorhandler(503)
 def service_unavailable(e):
      # Log the error e
@@ -793,12 +2127,8 @@ def service_unavailable(e):
 
 
 if __name__ == '__main__':
-    # Check if db connection was successful before running
-    if not db:
-        print("\n--- Cannot start Flask app: Spanner database connection failed during initialization. ---")
-        print("--- Please check GCP project, instance ID, database ID, permissions, and network connectivity. ---")
-    else:
-        print("\n--- Starting Flask Development Server ---")
-        # Use debug=True only in development! It reloads code and provides better error pages.
-        # Use host='0.0.0.0' to make it accessible on your network (e.g., from a VM)
-        app.run(debug=True, host=APP_HOST, port=APP_PORT) # Changed port to avoid conflicts
\ No newline at end of file
+    # Spanner is connected lazily; /readyz reports whether it is reachable.
+    print("\n--- Starting Flask Development Server ---")
+    # Use debug=True only in development! It reloads code and provides better error pages.
+    # Use host='0.0.0.0' to make it accessible on your network (e.g., from a VM)
+    app.run(debug=True, host=APP_HOST, port=APP_PORT) # Changed port to avoid conflicts
@@ -0,0 +1,73 @@
+import traceback
+
+from google.cloud import spanner
+from google.cloud.spanner_v1 import param_types
+
+from post_archive import ARCHIVE_TABLE
+
+
+# --- Denormalized Author Names ---
+# Post.author_name (and PostArchive.author_name) copy Person.name so feed
+# queries need no join. New posts get it in their insert transaction; this
+# job backfills old rows and repairs rows after a person is renamed.
+POST_TABLES = ["Post", ARCHIVE_TABLE]
+
+_REPAIR_ALL_SQL = """
+    UPDATE {table} AS p
+    SET p.author_name = (SELECT name FROM Person WHERE person_id = p.author_id)
+    WHERE COALESCE(p.author_name, '') != COALESCE((SELECT name FROM Person WHERE person_id = p.author_id), '')
+"""
+
+_REPAIR_PERSON_SQL = """
+    UPDATE {table} AS p
+    SET p.author_name = @name
+    WHERE p.author_id = @person_id AND COALESCE(p.author_name, '') != COALESCE(@name, '')
+"""
+
+
+def repair_author_names(db_instance, person_id=None):
+    """
+    Makes author_name match Person.name on every post.
+
+    Without person_id, each table is fixed with one partitioned DML
+    statement, which Spanner splits and runs without a long-lived lock.
+    With person_id (e.g. right after renaming that person), only their
+    posts are updated, in one read-write transaction that also reads the
+    current name.
+
+    Returns:
+        bool: True on success, False otherwise.
+    """
+    if not db_instance:
+        print("Skipping author name repair - database connection not available.")
+        return False
+
+    print(f"\n--- Repairing denormalized author names ({person_id or 'all people'}) ---")
+    try:
+        if person_id is None:
+            for table in POST_TABLES:
+                updated = db_instance.execute_partitioned_dml(_REPAIR_ALL_SQL.format(table=table))
+                print(f"{table}: updated at least {updated} rows.")
+            return True
+
+        def _repair_person(transaction):
+            rows = list(transaction.read(table="Person", columns=["name"], keyset=spanner.KeySet(keys=[[person_id]])))
+            if not rows:
+                print(f"Person {person_id} not found; nothing to repair.")
+                return 0
+            return sum(
+                transaction.execute_update(
+                    _REPAIR_PERSON_SQL.format(table=table),
+                    params={"person_id": person_id, "name": rows[0][0]},
+                    param_types={"person_id": param_types.STRING, "name": param_types.STRING},
+                )
+                for table in POST_TABLES
+            )
+
+        updated = db_instance.run_in_transaction(_repair_person)
+        print(f"Updated {updated} posts by {person_id}.")
+        return True
+    except Exception as e:
+        print(f"ERROR during author name repair: {type(e).__name__} - {e}")
+        traceback.print_exc()
+        return False
@@ -0,0 +1,178 @@
+"""
+Profiles the feed, profile and event page queries and compares two runs.
+
+Run it before and after migrate_schema_v2.py:
+
+    python compare_query_plans.py --save plans_v1.json
+    python migrate_schema_v2.py
+    python compare_query_plans.py --baseline plans_v1.json
+
+Each query runs once in PROFILE mode against sample ids taken from the
+database. For each one the report shows rows scanned, elapsed and CPU time
+from Spanner's query stats, and which tables and indexes the plan scans;
+a query that scans an index and then its base table is doing a back-join.
+"""
+import sys
+import json
+import argparse
+
+from google.cloud.spanner_v1 import param_types, ExecuteSqlRequest
+
+from jobs import connect
+
+
+# name -> (SQL, {param: sample key}, {param: type}); mirrors the queries in app.py
+QUERIES = {
+    "home_feed_posts": ("""
+        SELECT p.post_id, p.author_id, p.text, p.sentiment, p.post_timestamp, p.author_name
+        FROM Post AS p
+        ORDER BY p.post_timestamp DESC
+    """, {}, {}),
+    "home_feed_events": ("""
+        SELECT event_id, name, event_date
+        FROM Event
+        ORDER BY event_date DESC
+        LIMIT 50
+    """, {}, {}),
+    "profile_posts": ("""
+        SELECT p.post_id, p.author_id, p.text, p.sentiment, p.post_timestamp, p.author_name
+        FROM Post AS p
+        WHERE p.post_timestamp IS NOT NULL AND p.author_id = @author_id
+        ORDER BY p.post_timestamp DESC, p.post_id DESC
+        LIMIT 50
+    """, {"author_id": "person_id"}, {"author_id": param_types.STRING}),
+    "profile_events": ("""
+        SELECT e.event_id, e.name, e.event_date
+        FROM Attendance AS a
+        JOIN Event AS e ON a.event_id = e.event_id
+        WHERE a.person_id = @person_id
+        ORDER BY e.event_date DESC
+        LIMIT 20
+    """, {"person_id": "person_id"}, {"person_id": param_types.STRING}),
+    "profile_suggestions": ("""
+        SELECT s.suggested_person_id, p.name, s.score
+        FROM FriendSuggestion AS s
+        JOIN Person AS p ON s.suggested_person_id = p.person_id
+        WHERE s.person_id = @person_id
+        ORDER BY s.rank
+        LIMIT 5
+    """, {"person_id": "person_id"}, {"person_id": param_types.STRING}),
+    "event_locations": ("""
+        SELECT l.location_id, l.name, l.latitude, l.longitude
+        FROM EventLocation AS el
+        JOIN Location AS l ON el.location_id = l.location_id
+        WHERE el.event_id = @event_id
+    """, {"event_id": "event_id"}, {"event_id": param_types.STRING}),
+    "event_attendees": ("""
+        SELECT p.person_id, p.name
+        FROM Attendance AS a
+        JOIN Person AS p ON a.person_id = p.person_id
+        WHERE a.event_id = @event_id
+        ORDER BY p.name
+    """, {"event_id": "event_id"}, {"event_id": param_types.STRING}),
+}
+
+# v1 had no Post.author_name; its feed queries joined Person for the name
+V1_AUTHOR_NAME = (
+    "p.author_name\n        FROM Post AS p",
+    "author.name AS author_name\n        FROM Post AS p\n        JOIN Person AS author ON p.author_id = author.person_id",
+)
+
+STAT_KEYS = ["rows_scanned", "rows_returned", "elapsed_time", "cpu_time"]
+
+
+def _sample_ids(snapshot):
+    """Picks the busiest author and event so the plans touch real data."""
+    person = list(snapshot.execute_sql(
+        "SELECT author_id FROM Post GROUP BY author_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ))
+    event = list(snapshot.execute_sql(
+        "SELECT event_id FROM Attendance GROUP BY event_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ))
+    return {
+        "person_id": person[0][0] if person else "",
+        "event_id": event[0][0] if event else "",
+    }
+
+
+def _has_author_name(snapshot):
+    return bool(list(snapshot.execute_sql(
+        "SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS "
+        "WHERE TABLE_SCHEMA = '' AND TABLE_NAME = 'Post' AND COLUMN_NAME = 'author_name'"
+    )))
+
+
+def _summarize_plan(query_plan):
+    """Lists the plan's scans as 'TableScan:Post', 'IndexScan:PostByAuthor', ..."""
+    scans = []
+    for node in query_plan.plan_nodes:
+        metadata = dict(node.metadata or {})
+        if node.display_name == "Scan" and "scan_target" in metadata:
+            scans.append(f"{metadata.get('scan_type', 'Scan')}:{metadata['scan_target']}")
+    return sorted(scans)
+
+
+def profile_queries(database):
+    """Runs every query in PROFILE mode; returns {name: {stats..., scans}}."""
+    report = {}
+    with database.snapshot(multi_use=True) as snapshot:
+        samples = _sample_ids(snapshot)
+        print(f"Sample ids: {samples}")
+        v1 = not _has_author_name(snapshot)
+        for name, (sql, sample_params, types_map) in QUERIES.items():
+            if v1:
+                sql = sql.replace(*V1_AUTHOR_NAME)
+            params = {param: samples[key] for param, key in sample_params.items()}
+            results = snapshot.execute_sql(
+                sql, params=params or None, param_types=types_map or None,
+                query_mode=ExecuteSqlRequest.QueryMode.PROFILE,
+            )
+            list(results) # Stats arrive with the last result set
+            stats = dict(results.stats.query_stats or {})
+            report[name] = {key: stats.get(key) for key in STAT_KEYS}
+            report[name]["scans"] = _summarize_plan(results.stats.query_plan)
+    return report
+
+
+def print_report(report, baseline=None):
+    for name, current in report.items():
+        print(f"\n{name}")
+        before = (baseline or {}).get(name)
+        for key in STAT_KEYS:
+            if before is not None:
+                print(f"  {key:14} {before.get(key)!s:>16} -> {current.get(key)}")
+            else:
+                print(f"  {key:14} {current.get(key)}")
+        if before is not None and before.get("scans") != current["scans"]:
+            print(f"  scans (before) {', '.join(before.get('scans') or [])}")
+            print(f"  scans (after)  {', '.join(current['scans'])}")
+        else:
+            print(f"  scans          {', '.join(current['scans'])}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Profile and compare InstaVibe query plans")
+    arg_parser.add_argument("--save", help="Write this run's report to a JSON file")
+    arg_parser.add_argument("--baseline", help="Compare against a report saved earlier with --save")
+    args = arg_parser.parse_args(argv)
+
+    database = connect()
+    if not database:
+        print("\nCritical Error: Spanner database connection not established. Aborting.")
+        return 1
+
+    report = profile_queries(database)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import traceback
+
+from google.cloud.spanner_v1 import param_types
+
+
+# --- Maintained Counters ---
+# Event.attendee_count, Person.post_count and Person.friend_count let pages
+# show totals without counting Attendance, Post or Friendship rows. The
+# transactions that write those tables keep them current; this job recomputes
+# them from the source tables and fixes any that drifted (rows written before
+# the counters existed, manual edits, deleted rows).
+_RECONCILE_SQL = {
+    "Event.attendee_count": """
+        UPDATE Event AS e
+        SET e.attendee_count = (SELECT COUNT(*) FROM Attendance@{FORCE_INDEX=AttendanceByEvent} AS a WHERE a.event_id = e.event_id)
+        WHERE e.attendee_count != (SELECT COUNT(*) FROM Attendance@{FORCE_INDEX=AttendanceByEvent} AS a WHERE a.event_id = e.event_id)
+    """,
+    # Archived posts still count: a person's total doesn't change when their posts age out
+    "Person.post_count": """
+        UPDATE Person AS p
+        SET p.post_count = (SELECT COUNT(*) FROM Post WHERE author_id = p.person_id)
+                         + (SELECT COUNT(*) FROM PostArchive WHERE author_id = p.person_id)
+        WHERE p.post_count != (SELECT COUNT(*) FROM Post WHERE author_id = p.person_id)
+                            + (SELECT COUNT(*) FROM PostArchive WHERE author_id = p.person_id)
+    """,
+    # Friendship rows are undirected edges stored once, under either person
+    "Person.friend_count": """
+        UPDATE Person AS p
+        SET p.friend_count = (
+            SELECT COUNT(DISTINCT friend_id) FROM (
+                SELECT person_id_b AS friend_id FROM Friendship WHERE person_id_a = p.person_id
+                UNION ALL
+                SELECT person_id_a FROM Friendship@{FORCE_INDEX=FriendshipByPersonB} WHERE person_id_b = p.person_id
+            )
+        )
+        WHERE p.friend_count != (
+            SELECT COUNT(DISTINCT friend_id) FROM (
+                SELECT person_id_b AS friend_id FROM Friendship WHERE person_id_a = p.person_id
+                UNION ALL
+                SELECT person_id_a FROM Friendship@{FORCE_INDEX=FriendshipByPersonB} WHERE person_id_b = p.person_id
+            )
+        )
+    """,
+}
+
+
+def increment_counter(transaction, table, key_column, key, column, delta=1):
+    """
+    Adds `delta` to one row's counter column.
+    Must be called inside the read-write transaction that writes the rows
+    being counted, so the counter commits (or aborts) with them.
+    """
+    transaction.execute_update(
+        f"UPDATE {table} SET {column} = {column} + @delta WHERE {key_column} = @key",
+        params={"key": key, "delta": delta},
+        param_types={"key": param_types.STRING, "delta": param_types.INT64},
+    )
+
+
+def reconcile_counters(db_instance):
+    """
+    Recomputes every maintained counter and fixes the ones that are off.
+
+    Each counter is one partitioned DML statement, which Spanner splits and
+    runs without a long-lived lock; rows that are already right are not
+    written. Safe to run while the app is serving writes.
+
+    Returns:
+        bool: True on success, False otherwise.
+    """
+    if not db_instance:
+        print("Skipping counter reconciliation - database connection not available.")
+        return False
+
+    print("\n--- Reconciling maintained counters ---")
+    try:
+        for counter, sql in _RECONCILE_SQL.items():
+            fixed = db_instance.execute_partitioned_dml(sql)
+            print(f"{counter}: fixed at least {fixed} rows.")
+        return True
+    except Exception as e:
+        print(f"ERROR during counter reconciliation: {type(e).__name__} - {e}")
+        traceback.print_exc()
+        return False
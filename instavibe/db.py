@@ -2,13 +2,16 @@
 
 import os
 import traceback
-from datetime import datetime,
+from datetime import datetime
 import json # For example usage printing
 
 from google.cloud import spanner
 from google.cloud.spanner_v1 import param_types
 from google.api_core import exceptions
 
+from read_routing import read_route
+from rows import row_factory, json_default
+
 # --- Spanner Configuration ---
 INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "instavibe-graph-instance")
 DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "graphdb")
@@ -18,30 +21,32 @@ if not PROJECT_ID:
     print("Warning: GOOGLE_CLOUD_PROJECT environment variable not set.")
 
 # --- Spanner Client Initialization ---
+# Created lazily on first use; a failed attempt is retried on the next call.
 db = None
 spanner_client = None
-try:
-    if PROJECT_ID:
-        spanner_client = spanner.Client(project=PROJECT_ID)
-        instance = spanner_client.instance(INSTANCE_ID)
-        database = instance.database(DATABASE_ID)
-        print(f"Attempting to connect to Spanner: {instance.name}/databases/{database.name}")
 
-        if not database.exists():
-             print(f"Error: Database '{database.name}' does not exist in instance '{instance.name}'.")
-             db = None
-        else:
-            print("Spanner database connection check successful.")
-            db = database
-    else:
-        print("Skipping Spanner client initialization due to missing GOOGLE_CLOUD_PROJECT.")
+def get_db():
+    """
+    Returns the Spanner database handle, creating the client on first use.
 
-except exceptions.NotFound:
-    print(f"Error: Spanner instance '{INSTANCE_ID}' not found in project '{PROJECT_ID}'.")
-    db = None
-except Exception as e:
-    print(f"An unexpected error occurred during Spanner initialization: {e}")
-    db = None
+    Returns:
+        Database or None: The database handle, or None if it is unavailable.
+    """
+    global db, spanner_client
+    if db is not None:
+        return db
+    if not PROJECT_ID:
+        print("Skipping Spanner client initialization due to missing GOOGLE_CLOUD_PROJECT.")
+        return None
+    try:
+        spanner_client = spanner.Client(project=PROJECT_ID)
+        instance = spanner_client.instance(INSTANCE_ID)
+        db = instance.database(DATABASE_ID)
+        print(f"Spanner client initialized for {db.name}")
+    except Exception as e:
+        print(f"An unexpected error occurred during Spanner initialization: {e}")
+        db = None
+    return db
 
 # --- Utility Function (Graph Query Specific) ---
 
@@ -68,12 +73,14 @@ def run_graph_query(db_instance, graph_sql, params=None, param_types=None, expec
     # print(f"GQL: {graph_sql}") # Uncomment for verbose query logging
 
     try:
-        with db_instance.snapshot() as snapshot:
+        route = read_route("profile")
+        with db_instance.snapshot(**route.snapshot_kwargs()) as snapshot:
             # execute_sql handles both SQL and Graph Queries
             results = snapshot.execute_sql(
                 graph_sql,
                 params=params,
-                param_types=param_types
+                param_types=param_types,
+                **route.execute_kwargs()
             )
 
             field_names = expected_fields
@@ -81,11 +88,12 @@ def run_graph_query(db_instance, graph_sql, params=None, param_types=None, expec
                  print("Error: expected_fields must be provided to run_graph_query.")
                  return None
 
+            make_row = row_factory(field_names)
             for row in results:
                 if len(field_names) != len(row):
                      print(f"Warning: Mismatch between field names ({len(field_names)}) and row values ({len(row)}). Skipping row: {row}")
                      continue
-                results_list.append(dict(zip(field_names, row)))
+                results_list.append(make_row(row))
 
             # print(f"Graph Query successful, fetched {len(results_list)} rows.") # Uncomment for verbose success logging
 
@@ -158,11 +166,11 @@ def get_all_posts_json(db_instance, limit=100):
     """
     if not db_instance: return None
 
-    # Graph Query: Find Person nodes that 'Wrote' a Post node
+    # Graph Query: Post nodes carry their author's name, so no Wrote hop is needed
     graph_sql = """
         Graph SocialGraph
-        MATCH (author:Person)-[w:Wrote]->(post:Post)
-        RETURN post.post_id, post.author_id, post.text, post.sentiment, post.post_timestamp, author.name AS author_name
+        MATCH (post:Post)
+        RETURN post.post_id, post.author_id, post.text, post.sentiment, post.post_timestamp, post.author_name
         ORDER BY post.post_timestamp DESC
         LIMIT @limit
     """
@@ -175,6 +183,23 @@ def get_all_posts_json(db_instance, limit=100):
     if results is None:
         return None
 
+    # Posts past the archive horizon are in PostArchive, outside the graph;
+    # every one is older than the posts left in Post, so they fill the tail
+    if len(results) < limit:
+        archive_sql = """
+            SELECT post_id, author_id, text, sentiment, post_timestamp, author_name
+            FROM PostArchive@{FORCE_INDEX=PostArchiveByTimestamp}
+            ORDER BY post_timestamp DESC
+            LIMIT @limit
+        """
+        archived = run_graph_query(
+            db_instance, archive_sql, params={"limit": limit - len(results)},
+            param_types=param_types_map, expected_fields=fields,
+        )
+        if archived is None:
+            return None
+        results.extend(archived)
+
     # Convert datetime objects to ISO format strings
     for post in results:
         if isinstance(post.get('post_timestamp'), datetime):
@@ -217,6 +242,7 @@ def get_person_friends_json(db_instance, person_id):
 
 # --- Example Usage (if run directly) ---
 if __name__ == "__main__":
+    db = get_db()
     if db:
         print("\n--- Testing Graph Data Fetching Functions ---")
 
@@ -226,21 +252,21 @@ if __name__ == "__main__":
         print(f"\n1. Fetching events attended by Person ID: {test_person_id}")
         attended_events = get_person_attended_events_json(db, test_person_id)
         if attended_events is not None:
-            print(json.dumps(attended_events, indent=2))
+            print(json.dumps(attended_events, indent=2, default=json_default))
         else:
             print("Failed to fetch attended events.")
 
         print("\n2. Fetching all posts (limit 10)")
         all_posts = get_all_posts_json(db, limit=10)
         if all_posts is not None:
-            print(json.dumps(all_posts, indent=2))
+            print(json.dumps(all_posts, indent=2, default=json_default))
         else:
             print("Failed to fetch all posts.")
 
         print(f"\n3. Fetching friends for Person ID: {test_person_id}")
         friends = get_person_friends_json(db, test_person_id)
         if friends is not None:
-            print(json.dumps(friends, indent=2))
+            print(json.dumps(friends, indent=2, default=json_default))
         else:
             print("Failed to fetch friends.")
 
@@ -0,0 +1,73 @@
+import itertools
+import json
+import os
+import queue
+import threading
+
+
+# --- Feed Bus Configuration ---
+FEED_SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("FEED_SUBSCRIBER_QUEUE_SIZE", "100"))
+FEED_HEARTBEAT_SECONDS = float(os.environ.get("FEED_HEARTBEAT_SECONDS", "15"))
+
+
+class FeedBus:
+    """
+    In-process publish/subscribe for live feed updates.
+
+    Each subscriber gets a bounded queue. A subscriber that falls more than
+    FEED_SUBSCRIBER_QUEUE_SIZE messages behind is dropped rather than
+    slowing down publishers; its browser reconnects and catches up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=FEED_SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event_type, data):
+        """Sends one message to every subscriber. Never blocks."""
+        message = (next(self._ids), event_type, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                print("Dropping a live feed subscriber that fell too far behind.")
+                self.unsubscribe(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, subscriber):
+        """
+        Yields Server-Sent Events for one subscriber until it is dropped or
+        the client disconnects. Sends a comment line as a heartbeat so idle
+        connections are not closed by proxies.
+        """
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                with self._lock:
+                    if subscriber not in self._subscribers:
+                        return
+                try:
+                    message = subscriber.get(timeout=FEED_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                message_id, event_type, data = message
+                yield f"id: {message_id}\nevent: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
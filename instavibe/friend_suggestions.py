@@ -0,0 +1,251 @@
+import os
+import traceback
+
+from google.cloud import spanner
+from google.cloud.spanner_v1 import param_types
+
+from social_graph import SocialGraph
+from time_shards import time_shard_filter
+
+
+# --- Friend Suggestion Configuration ---
+JOB_NAME = "friend_suggestions"
+SUGGESTIONS_PER_PERSON = int(os.environ.get("FRIEND_SUGGESTIONS_PER_PERSON", "10"))
+MUTUAL_FRIEND_WEIGHT = 1.0
+SHARED_EVENT_WEIGHT = 0.5
+PEOPLE_PER_TRANSACTION = 200
+IDS_PER_QUERY = 1000 # Size of the IN UNNEST(@ids) lists of an incremental run
+
+SUGGESTION_COLUMNS = [
+    "person_id", "rank", "suggested_person_id", "score",
+    "mutual_friends", "shared_events", "compute_time",
+]
+
+
+def score_candidates(graph, attended, person_id, limit=SUGGESTIONS_PER_PERSON):
+    """
+    Ranks friend-of-friend candidates for one person.
+
+    Args:
+        graph (SocialGraph): The friendship graph.
+        attended (dict[str, set[str]]): person_id -> event_ids they attended.
+        person_id (str): The person to suggest friends for.
+
+    Returns:
+        list[tuple]: (suggested_person_id, score, mutual_friends, shared_events),
+                     best first.
+    """
+    friends = set(graph.friends(person_id))
+    my_events = attended.get(person_id, set())
+    mutual_counts = {}
+    for friend_id in friends:
+        for candidate in graph.friends(friend_id):
+            if candidate != person_id and candidate not in friends:
+                mutual_counts[candidate] = mutual_counts.get(candidate, 0) + 1
+
+    scored = []
+    for candidate, mutual in mutual_counts.items():
+        shared = len(my_events & attended.get(candidate, set()))
+        score = MUTUAL_FRIEND_WEIGHT * mutual + SHARED_EVENT_WEIGHT * shared
+        scored.append((candidate, score, mutual, shared))
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
+
+
+# --- Incremental Reads ---
+# An incremental run reads the Friendship/Attendance rows committed after
+# the watermark, then only the edges and attendance of the people around
+# them, instead of both whole tables.
+
+_NEW_FRIENDSHIPS_SQL = f"""
+    SELECT person_id_a, person_id_b, friendship_time
+    FROM Friendship@{{FORCE_INDEX=FriendshipByShardTime}}
+    WHERE {time_shard_filter()} AND friendship_time > @watermark
+"""
+
+_NEW_ATTENDANCE_SQL = f"""
+    SELECT person_id, attendance_time
+    FROM Attendance@{{FORCE_INDEX=AttendanceByShardTime}}
+    WHERE {time_shard_filter()} AND attendance_time > @watermark
+"""
+
+# Both directions of an undirected edge: by primary key and by FriendshipByPersonB
+_FRIENDSHIPS_OF_SQL = """
+    SELECT person_id_a, person_id_b FROM Friendship
+    WHERE person_id_a IN UNNEST(@ids)
+    UNION ALL
+    SELECT person_id_a, person_id_b FROM Friendship@{FORCE_INDEX=FriendshipByPersonB}
+    WHERE person_id_b IN UNNEST(@ids)
+"""
+
+# Attendance is interleaved in Person: one key range per person
+_ATTENDANCE_OF_SQL = """
+    SELECT person_id, event_id FROM Attendance
+    WHERE person_id IN UNNEST(@ids)
+"""
+
+
+class _Neighbourhoods:
+    """Friendship edges read on demand, per person, from one snapshot."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.adjacency = {}   # person_id -> set of friends, for people read
+        self.queries = 0
+
+    def _query_ids(self, sql, ids):
+        ids = sorted(ids)
+        for start in range(0, len(ids), IDS_PER_QUERY):
+            self.queries += 1
+            yield from self.snapshot.execute_sql(
+                sql,
+                params={"ids": ids[start:start + IDS_PER_QUERY]},
+                param_types={"ids": param_types.Array(param_types.STRING)},
+            )
+
+    def read(self, person_ids):
+        """Reads the friends of people not read yet; returns the friends of all of them."""
+        missing = {pid for pid in person_ids if pid not in self.adjacency}
+        for pid in missing:
+            self.adjacency[pid] = set()
+        for a, b in self._query_ids(_FRIENDSHIPS_OF_SQL, missing):
+            for pid, other in ((a, b), (b, a)):
+                if pid in self.adjacency:
+                    self.adjacency[pid].add(other)
+        return set().union(*(self.adjacency[pid] for pid in person_ids)) if person_ids else set()
+
+    def attendance(self, person_ids):
+        attended = {}
+        for person_id, event_id in self._query_ids(_ATTENDANCE_OF_SQL, person_ids):
+            attended.setdefault(person_id, set()).add(event_id)
+        return attended
+
+    def graph(self):
+        graph = SocialGraph()
+        graph.load_rows(
+            {"person_id_a": a, "person_id_b": b}
+            for a, friends in self.adjacency.items() for b in friends if a < b or b not in self.adjacency
+        )
+        return graph
+
+
+def _read_incremental(snapshot, watermark):
+    """
+    Reads what an incremental run needs.
+
+    Returns:
+        tuple: (graph, attended, affected, new_watermark, queries), where the
+               graph holds the edges of the affected people and of their
+               friends, i.e. everything score_candidates looks at for them.
+    """
+    params = {"watermark": watermark}
+    types = {"watermark": param_types.TIMESTAMP}
+    new_friendships = list(snapshot.execute_sql(_NEW_FRIENDSHIPS_SQL, params=params, param_types=types))
+    new_attendance = list(snapshot.execute_sql(_NEW_ATTENDANCE_SQL, params=params, param_types=types))
+    new_watermark = max([row[2] for row in new_friendships] + [row[1] for row in new_attendance], default=watermark)
+
+    # A new friendship a-b changes the candidates of a, b and all of their
+    # friends. A new attendance by p changes p's scores and the scores of
+    # everyone who has p as a candidate, i.e. p's 2-hop neighbourhood.
+    neighbourhoods = _Neighbourhoods(snapshot)
+    befriended = {pid for a, b, _ in new_friendships for pid in (a, b)}
+    attending = {row[0] for row in new_attendance}
+    affected = befriended | attending
+    affected |= neighbourhoods.read(befriended)
+    attending_friends = neighbourhoods.read(attending)
+    affected |= attending_friends | neighbourhoods.read(attending_friends)
+
+    # score_candidates walks friends, then friends of friends
+    friends = neighbourhoods.read(affected)
+    candidates = neighbourhoods.read(friends)
+    attended = neighbourhoods.attendance(affected | candidates)
+    return neighbourhoods.graph(), attended, affected, new_watermark, neighbourhoods.queries
+
+
+def _read_watermark(db_instance):
+    with db_instance.snapshot() as snapshot:
+        rows = list(snapshot.read(
+            table="JobState", columns=["watermark"], keyset=spanner.KeySet(keys=[[JOB_NAME]])
+        ))
+    return rows[0][0] if rows else None
+
+
+def refresh_friend_suggestions(db_instance, full=False):
+    """
+    Recomputes the FriendSuggestion table.
+
+    Only people whose neighbourhood changed since the last run (by the
+    Friendship/Attendance commit timestamps recorded in JobState) are
+    recomputed, unless `full` is set or the job has never run. Such a run
+    reads the rows past the watermark, then the edges of the affected
+    people and their friends and the attendance of everyone within two hops
+    of them; only a full run reads Friendship and Attendance whole.
+
+    Returns:
+        bool: True on success, False otherwise.
+    """
+    if not db_instance:
+        print("Skipping friend suggestions - database connection not available.")
+        return False
+
+    print("\n--- Refreshing friend suggestions ---")
+    try:
+        watermark = None if full else _read_watermark(db_instance)
+
+        # One consistent snapshot for the graph and attendance
+        with db_instance.snapshot(multi_use=True) as snapshot:
+            if watermark is None:
+                friendships = list(snapshot.execute_sql(
+                    "SELECT person_id_a, person_id_b, friendship_time FROM Friendship"
+                ))
+                attendance = list(snapshot.execute_sql(
+                    "SELECT person_id, event_id, attendance_time FROM Attendance"
+                ))
+                affected = {row[0] for row in snapshot.execute_sql("SELECT person_id FROM Person")}
+            else:
+                graph, attended, affected, new_watermark, queries = _read_incremental(snapshot, watermark)
+
+        if watermark is None:
+            graph = SocialGraph()
+            graph.load_rows({"person_id_a": a, "person_id_b": b, "friendship_time": ts} for a, b, ts in friendships)
+            attended = {}
+            for person_id, event_id, _ in attendance:
+                attended.setdefault(person_id, set()).add(event_id)
+            new_watermark = max([row[2] for row in friendships] + [row[2] for row in attendance], default=None)
+            print(f"Recomputing suggestions for all {len(affected)} people.")
+        else:
+            print(f"Recomputing suggestions for {len(affected)} people (watermark {watermark}; "
+                  f"graph of {len(graph.ids)} people read in {queries} queries).")
+
+        affected = sorted(affected)
+        for start in range(0, len(affected), PEOPLE_PER_TRANSACTION):
+            chunk = affected[start:start + PEOPLE_PER_TRANSACTION]
+            rows = []
+            for person_id in chunk:
+                for rank, (candidate, score, mutual, shared) in enumerate(score_candidates(graph, attended, person_id)):
+                    rows.append((person_id, rank, candidate, score, mutual, shared, spanner.COMMIT_TIMESTAMP))
+
+            def _write_chunk(transaction, chunk=chunk, rows=rows):
+                ranges = [spanner.KeyRange(start_closed=[pid], end_closed=[pid]) for pid in chunk]
+                transaction.delete("FriendSuggestion", spanner.KeySet(ranges=ranges))
+                if rows:
+                    transaction.insert(table="FriendSuggestion", columns=SUGGESTION_COLUMNS, values=rows)
+
+            db_instance.run_in_transaction(_write_chunk)
+
+        # Advance the watermark only after every chunk has been written
+        if new_watermark is not None:
+            def _save_watermark(transaction):
+                transaction.insert_or_update(
+                    table="JobState",
+                    columns=["job_name", "watermark", "update_time"],
+                    values=[(JOB_NAME, new_watermark, spanner.COMMIT_TIMESTAMP)],
+                )
+            db_instance.run_in_transaction(_save_watermark)
+
+        print(f"Friend suggestions refreshed for {len(affected)} people.")
+        return True
+    except Exception as e:
+        print(f"ERROR during friend suggestion refresh: {type(e).__name__} - {e}")
+        traceback.print_exc()
+        return False
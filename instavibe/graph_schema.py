@@ -0,0 +1,44 @@
+# --- SocialGraph Property Graph ---
+# Shared by setup.py (create) and migrate_schema_v2.py (replace). Node and
+# edge tables expose all their columns as properties; a column added to a
+# table later only becomes a property once the graph is replaced.
+GRAPH_NAME = "SocialGraph"
+
+SOCIAL_GRAPH_DEFINITION = """
+          NODE TABLES (
+            Person KEY (person_id),
+            Event KEY (event_id),
+            Post KEY (post_id),
+            Location KEY (location_id) -- New Node Table
+          )
+          EDGE TABLES (
+            Friendship 
+              SOURCE KEY (person_id_a) REFERENCES Person (person_id)
+              DESTINATION KEY (person_id_b) REFERENCES Person (person_id),
+
+            
+            Attendance AS Attended 
+              SOURCE KEY (person_id) REFERENCES Person (person_id)
+              DESTINATION KEY (event_id) REFERENCES Event (event_id),
+
+            
+            Mention AS Mentioned
+              SOURCE KEY (post_id) REFERENCES Post (post_id)
+              DESTINATION KEY (mentioned_person_id) REFERENCES Person (person_id),
+
+            
+            Post AS Wrote 
+              SOURCE KEY (author_id) REFERENCES Person (person_id)
+              DESTINATION KEY (post_id) REFERENCES Post (post_id),
+
+            EventLocation AS HasLocation -- New Edge Table
+              SOURCE KEY (event_id) REFERENCES Event (event_id)
+              DESTINATION KEY (location_id) REFERENCES Location (location_id)
+          )
+"""
+
+
+def social_graph_ddl(replace=False):
+    """Returns the CREATE [OR REPLACE] PROPERTY GRAPH statement."""
+    verb = "CREATE OR REPLACE PROPERTY GRAPH" if replace else "CREATE PROPERTY GRAPH IF NOT EXISTS"
+    return f"{verb} {GRAPH_NAME}{SOCIAL_GRAPH_DEFINITION}"
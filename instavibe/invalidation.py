@@ -0,0 +1,356 @@
+import os
+import json
+import uuid
+import socket
+import threading
+import traceback
+
+
+# --- Invalidation Bus Configuration ---
+# INVALIDATION_BUS picks the transport: "local" (one process, the default),
+# "udp" (datagrams to a fixed peer list) or "redis" (any Redis-compatible
+# server, e.g. Memorystore). Every replica of the web app must use the same one.
+INVALIDATION_BUS = os.environ.get("INVALIDATION_BUS", "local")
+INVALIDATION_UDP_BIND = os.environ.get("INVALIDATION_UDP_BIND", "0.0.0.0:7946")
+INVALIDATION_UDP_PEERS = os.environ.get("INVALIDATION_UDP_PEERS", "") # "host:port,host:port"
+INVALIDATION_REDIS_URL = os.environ.get("INVALIDATION_REDIS_URL", "redis://localhost:6379/0")
+INVALIDATION_REDIS_PREFIX = os.environ.get("INVALIDATION_REDIS_PREFIX", "instavibe:invalidation")
+# How often the full version map is re-sent (UDP) or re-read (Redis), which
+# bounds how long a lost message can leave a replica stale.
+INVALIDATION_RESYNC_SECONDS = float(os.environ.get("INVALIDATION_RESYNC_SECONDS", "5"))
+
+_MAX_DATAGRAM = 65507
+_REDIS_ORIGIN = "redis" # The Redis hash is the one origin of the Redis backend's versions
+
+
+def _parse_address(address):
+    host, _, port = address.strip().rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+def _parse_versions(raw):
+    """Decodes a received version map: {key: {origin: counter}}."""
+    return {key: {origin: int(counter) for origin, counter in clock.items()} for key, clock in raw.items()}
+
+
+class InvalidationBus:
+    """
+    Broadcasts invalidated cache keys to every replica of the web app.
+
+    Each key has a version: a counter per origin, {origin: counter}.
+    invalidate() bumps this replica's counter for the key and tells the
+    other replicas; a replica merges what it hears element-wise (max per
+    origin) and runs a key's handlers when any counter went up. Origins
+    never compare their counters with each other, so neither clock skew
+    nor a lost message can make a newer invalidation look old. The
+    transports periodically resend or re-read the full version map, so a
+    lost message only delays an invalidation instead of losing it.
+
+    This base class is the in-process transport: handlers run on this
+    replica only, which is all a single replica needs.
+    """
+
+    backend = "local"
+
+    def __init__(self):
+        self.replica_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self.started = False
+        self._handlers = {}       # key -> [(callback, remote_only)]
+        self.versions = {}        # key -> {origin: newest counter seen}
+        self.sent = 0
+        self.received = 0
+
+    def subscribe(self, key, callback, remote_only=False):
+        """
+        Runs callback(key) whenever `key` is invalidated.
+
+        Args:
+            remote_only (bool): Only for invalidations from other replicas,
+                e.g. when the writing replica already updated its copy.
+        """
+        with self._lock:
+            self._handlers.setdefault(key, []).append((callback, remote_only))
+
+    def _run_handlers(self, key, remote):
+        with self._lock:
+            handlers = list(self._handlers.get(key, []))
+        for callback, remote_only in handlers:
+            if remote_only and not remote:
+                continue
+            try:
+                callback(key)
+            except Exception as e:
+                print(f"Warning: Invalidation handler for '{key}' failed: {e}")
+                traceback.print_exc()
+
+    def _next_versions(self, keys):
+        """
+        Bumps this replica's counter for keys; returns the full version map
+        to send.
+
+        A restarted replica has a new replica_id, so its counters start from
+        1 under an origin its peers have never seen.
+        """
+        with self._lock:
+            for key in keys:
+                clock = self.versions.setdefault(key, {})
+                clock[self.replica_id] = clock.get(self.replica_id, 0) + 1
+            return self._copy_versions()
+
+    def _copy_versions(self):
+        return {key: dict(clock) for key, clock in self.versions.items()}
+
+    def invalidate(self, *keys):
+        """Invalidates keys on this replica now and on the others as soon as they hear of it."""
+        for key in keys:
+            self._run_handlers(key, remote=False)
+        try:
+            self._send(self._next_versions(keys))
+            self.sent += 1
+        except Exception as e:
+            # Called after a committed write, which must not fail because of this
+            print(f"Warning: Could not broadcast invalidation of {list(keys)}: {e}")
+
+    def _send(self, versions):
+        pass
+
+    def _receive(self, versions):
+        """Applies a version map from another replica."""
+        newer = []
+        with self._lock:
+            self.received += 1
+            for key, clock in versions.items():
+                seen = self.versions.setdefault(key, {})
+                advanced = False
+                for origin, counter in clock.items():
+                    if counter > seen.get(origin, 0):
+                        seen[origin] = counter
+                        advanced = True
+                if advanced:
+                    newer.append(key)
+        for key in newer:
+            self._run_handlers(key, remote=True)
+
+    def start(self):
+        """
+        Starts the transport's background listeners. Safe to call more than
+        once; if the transport cannot start, this replica keeps working on
+        its own and the error is logged.
+        """
+        with self._start_lock:
+            if self.started:
+                return self
+            self.started = True
+            try:
+                self._start()
+            except Exception as e:
+                print(f"ERROR: Invalidation bus '{self.backend}' could not start; caches on other replicas will not hear of writes here: {e}")
+                traceback.print_exc()
+        return self
+
+    def _start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def status(self):
+        with self._lock:
+            return {
+                "backend": self.backend, "replica_id": self.replica_id, "started": self.started,
+                "versions": self._copy_versions(), "sent": self.sent, "received": self.received,
+            }
+
+
+class LocalInvalidationHub:
+    """Connects LocalHubInvalidationBus instances in one process, standing in for a network in tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buses = []
+
+    def join(self, bus):
+        with self._lock:
+            self.buses.append(bus)
+
+    def deliver(self, sender, versions):
+        with self._lock:
+            buses = [bus for bus in self.buses if bus is not sender]
+        for bus in buses:
+            bus._receive(versions)
+
+
+class LocalHubInvalidationBus(InvalidationBus):
+    """An in-process bus that delivers synchronously to every other bus on the same hub."""
+
+    backend = "local-hub"
+
+    def __init__(self, hub):
+        super().__init__()
+        self.hub = hub
+        hub.join(self)
+
+    def _send(self, versions):
+        self.hub.deliver(self, versions)
+
+
+class UdpInvalidationBus(InvalidationBus):
+    """
+    Sends each version map as a JSON datagram to a fixed list of peers.
+
+    Every INVALIDATION_RESYNC_SECONDS the full map is sent again, which
+    repairs dropped datagrams and brings restarted replicas up to date.
+    """
+
+    backend = "udp"
+
+    def __init__(self, bind=INVALIDATION_UDP_BIND, peers=INVALIDATION_UDP_PEERS,
+                 resync_seconds=INVALIDATION_RESYNC_SECONDS):
+        super().__init__()
+        self.bind = _parse_address(bind)
+        self.peers = [_parse_address(peer) for peer in peers.split(",") if peer.strip()] if isinstance(peers, str) else list(peers)
+        self.resync_seconds = resync_seconds
+        self._socket = None
+        self._stopped = threading.Event()
+
+    def _send(self, versions):
+        if self._socket is None:
+            return
+        payload = json.dumps({"origin": self.replica_id, "versions": versions}).encode("utf-8")
+        if len(payload) > _MAX_DATAGRAM:
+            raise ValueError(f"Version map is too large for one datagram ({len(payload)} bytes)")
+        for peer in self.peers:
+            try:
+                self._socket.sendto(payload, peer)
+            except OSError as e:
+                print(f"Warning: Could not send invalidation to {peer[0]}:{peer[1]}: {e}")
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            try:
+                payload, _ = self._socket.recvfrom(_MAX_DATAGRAM)
+            except OSError:
+                if self._stopped.is_set():
+                    return
+                continue
+            try:
+                message = json.loads(payload)
+                if message.get("origin") != self.replica_id:
+                    self._receive(_parse_versions(message["versions"]))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Warning: Ignoring malformed invalidation datagram: {e}")
+
+    def _resync(self):
+        while not self._stopped.wait(self.resync_seconds):
+            with self._lock:
+                versions = self._copy_versions()
+            if versions:
+                self._send(versions)
+
+    def _start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(self.bind)
+        self.bind = self._socket.getsockname() # Resolves port 0
+        threading.Thread(target=self._listen, name="invalidation-udp", daemon=True).start()
+        threading.Thread(target=self._resync, name="invalidation-resync", daemon=True).start()
+        print(f"Invalidation bus listening on udp://{self.bind[0]}:{self.bind[1]} with {len(self.peers)} peers.")
+
+    def close(self):
+        self._stopped.set()
+        if self._socket is not None:
+            self._socket.close()
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """
+    Keeps key versions in a Redis hash and announces changes on a channel.
+
+    HINCRBY makes Redis the single source of versions, so every key has
+    one counter, under the origin "redis". Pub/sub delivery is
+    at-most-once, so every INVALIDATION_RESYNC_SECONDS the hash is read back
+    and any version a replica missed is applied then. Works with any server
+    that speaks the Redis protocol (Redis, Valkey, Memorystore).
+    """
+
+    backend = "redis"
+
+    def __init__(self, url=INVALIDATION_REDIS_URL, prefix=INVALIDATION_REDIS_PREFIX,
+                 resync_seconds=INVALIDATION_RESYNC_SECONDS, client=None):
+        super().__init__()
+        if client is None:
+            import redis # Only needed when this backend is selected
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.versions_key = f"{prefix}:versions"
+        self.channel = f"{prefix}:events"
+        self.resync_seconds = resync_seconds
+        self._pubsub = None
+        self._stopped = threading.Event()
+
+    def _next_versions(self, keys):
+        pipeline = self.client.pipeline()
+        for key in keys:
+            pipeline.hincrby(self.versions_key, key, 1)
+        new_versions = {key: {_REDIS_ORIGIN: int(version)} for key, version in zip(keys, pipeline.execute())}
+        with self._lock:
+            for key, clock in new_versions.items():
+                seen = self.versions.setdefault(key, {})
+                seen[_REDIS_ORIGIN] = max(seen.get(_REDIS_ORIGIN, 0), clock[_REDIS_ORIGIN])
+        return new_versions
+
+    def _send(self, versions):
+        self.client.publish(self.channel, json.dumps({"origin": self.replica_id, "versions": versions}))
+
+    def _read_versions(self):
+        return {
+            (key.decode("utf-8") if isinstance(key, bytes) else key): {_REDIS_ORIGIN: int(version)}
+            for key, version in self.client.hgetall(self.versions_key).items()
+        }
+
+    def _listen(self):
+        for message in self._pubsub.listen():
+            if self._stopped.is_set():
+                return
+            if message.get("type") != "message":
+                continue
+            try:
+                body = json.loads(message["data"])
+                if body.get("origin") != self.replica_id:
+                    self._receive(_parse_versions(body["versions"]))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Warning: Ignoring malformed invalidation message: {e}")
+
+    def _resync(self):
+        while not self._stopped.wait(self.resync_seconds):
+            try:
+                self._receive(self._read_versions())
+            except Exception as e:
+                print(f"Warning: Could not read invalidation versions from Redis: {e}")
+
+    def _start(self):
+        # Start from the current versions so old invalidations don't all fire at startup
+        with self._lock:
+            self.versions.update(self._read_versions())
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+        threading.Thread(target=self._listen, name="invalidation-redis", daemon=True).start()
+        threading.Thread(target=self._resync, name="invalidation-resync", daemon=True).start()
+        print(f"Invalidation bus subscribed to Redis channel '{self.channel}'.")
+
+    def close(self):
+        self._stopped.set()
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+
+def invalidation_bus_from_env():
+    """Builds the bus selected by INVALIDATION_BUS (not yet started)."""
+    if INVALIDATION_BUS == "udp":
+        return UdpInvalidationBus()
+    if INVALIDATION_BUS == "redis":
+        return RedisInvalidationBus()
+    if INVALIDATION_BUS != "local":
+        print(f"Warning: Unknown INVALIDATION_BUS '{INVALIDATION_BUS}'; invalidations stay in this process.")
+    return InvalidationBus()
@@ -0,0 +1,75 @@
+"""
+Batch jobs that maintain derived data in Spanner.
+
+Usage:
+    python jobs.py rebuild-sentiment-rollups
+    python jobs.py refresh-friend-suggestions [--full]
+    python jobs.py archive-posts [--horizon-days N]
+    python jobs.py repair-author-names [--person-id ID]
+    python jobs.py reconcile-counters
+"""
+import os
+import sys
+import time
+import argparse
+
+from google.cloud import spanner
+from google.api_core import exceptions
+
+from sentiment_rollups import rebuild_sentiment_rollups
+from friend_suggestions import refresh_friend_suggestions
+from post_archive import archive_old_posts, POST_ARCHIVE_HORIZON_DAYS
+from author_names import repair_author_names
+from counters import reconcile_counters
+
+# --- Configuration ---
+INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "instavibe-graph-instance")
+DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "graphdb")
+PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
+
+
+def connect():
+    """Opens the Spanner database, or returns None if it is unavailable."""
+    try:
+        spanner_client = spanner.Client(project=PROJECT_ID)
+        database = spanner_client.instance(INSTANCE_ID).database(DATABASE_ID)
+        print(f"Targeting Spanner: {database.name}")
+        return database
+    except exceptions.NotFound:
+        print(f"Error: Spanner instance '{INSTANCE_ID}' not found or missing permissions.")
+    except Exception as e:
+        print(f"Error initializing Spanner client: {e}")
+    return None
+
+
+JOBS = {
+    "rebuild-sentiment-rollups": lambda database, args: rebuild_sentiment_rollups(database),
+    "refresh-friend-suggestions": lambda database, args: refresh_friend_suggestions(database, full=args.full),
+    "archive-posts": lambda database, args: archive_old_posts(database, horizon_days=args.horizon_days),
+    "repair-author-names": lambda database, args: repair_author_names(database, person_id=args.person_id),
+    "reconcile-counters": lambda database, args: reconcile_counters(database),
+}
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="InstaVibe batch jobs")
+    arg_parser.add_argument("job", choices=sorted(JOBS))
+    arg_parser.add_argument("--full", action="store_true", help="Recompute everything instead of only what changed")
+    arg_parser.add_argument("--horizon-days", type=int, default=POST_ARCHIVE_HORIZON_DAYS,
+                            help="archive-posts: move posts older than this many days")
+    arg_parser.add_argument("--person-id", help="repair-author-names: only this person's posts (e.g. after a rename)")
+    args = arg_parser.parse_args(argv)
+
+    database = connect()
+    if not database:
+        print("\nCritical Error: Spanner database connection not established. Aborting.")
+        return 1
+
+    start_time = time.time()
+    ok = JOBS[args.job](database, args)
+    print(f"\nJob '{args.job}' {'finished' if ok else 'FAILED'} in {time.time() - start_time:.2f} seconds.")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
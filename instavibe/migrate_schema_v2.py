@@ -0,0 +1,318 @@
+"""
+Upgrades an existing InstaVibe database from schema v1 to v2 online.
+
+v2 interleaves per-person and per-event child tables with their parent row,
+stores the author's name on each post, keeps attendee, post and friend
+counters on Event and Person, adds STORING columns to the
+indexes the feed, profile and event pages read, so those queries no longer
+join back to the base table or to Person, and leads the commit timestamp
+indexes with a shard column so inserts don't all hit one split. setup.py creates v2 directly;
+this script brings a v1 database to the same shape.
+
+Every step is a schema change Spanner applies while the database keeps
+serving reads and writes:
+  1. ALTER TABLE ... ADD COLUMN (author_name, the counters and the
+     generated time_shard columns), then CREATE OR REPLACE the property
+     graph so nodes expose them. Fill in author_name and the counters
+     afterwards with `python jobs.py repair-author-names` and
+     `python jobs.py reconcile-counters`; time_shard is backfilled by Spanner.
+  2. ALTER INDEX ... ADD STORED COLUMN, backfilled in the background.
+  3. CREATE INDEX for the commit timestamp indexes led by time_shard,
+     under new names (PostByShardCreateTime, ...) beside the unsharded
+     indexes the running app still pins. One index at a time: the script
+     waits until it is backfilled (INFORMATION_SCHEMA.INDEXES INDEX_STATE =
+     'READ_WRITE'), printing its state, before starting the next; an index
+     still backfilling when a rerun starts is waited for, not recreated.
+  4. ALTER TABLE ... SET INTERLEAVE IN <parent>: co-locates the child rows
+     without checking that every parent exists.
+  5. ALTER TABLE ... SET INTERLEAVE IN PARENT <parent> ON DELETE CASCADE:
+     validates parent existence and enforces it from then on. A child row
+     without a parent fails this step; the script reports it and stops.
+  6. DROP INDEX for the unsharded indexes, only with
+     --drop-replaced-indexes. The app pins its indexes with FORCE_INDEX
+     hints, and a query naming a missing or still backfilling index fails,
+     so first deploy the app version that hints the new names, then rerun
+     with the flag.
+
+Only the steps the database still needs are run, so the script can be
+rerun after a failure.
+
+Usage:
+    python migrate_schema_v2.py [--dry-run] [--drop-replaced-indexes]
+
+Compare query plans around the migration with compare_query_plans.py.
+"""
+import sys
+import time
+import argparse
+
+from google.api_core import exceptions
+
+from jobs import connect
+from graph_schema import social_graph_ddl
+from time_shards import TIME_SHARD_COLUMN, TIME_SHARDED_INDEXES, time_shard_column_type, time_sharded_index_ddl
+
+
+# Child table -> parent table
+# Friendship stays top-level: its key (person_id_a, person_id_b) does not start
+# with Person's key column, person_id, which interleaving requires.
+INTERLEAVES = {
+    "Attendance": "Person",
+    "PersonSentimentDaily": "Person",
+    "FriendSuggestion": "Person",
+    "EventLocation": "Event",
+}
+
+# Table -> columns to add
+NEW_COLUMNS = {
+    "Person": [("post_count", "INT64 NOT NULL DEFAULT (0)"), ("friend_count", "INT64 NOT NULL DEFAULT (0)")],
+    "Event": [("attendee_count", "INT64 NOT NULL DEFAULT (0)"), (TIME_SHARD_COLUMN, time_shard_column_type("Event"))],
+    "Post": [("author_name", "STRING(MAX)"), (TIME_SHARD_COLUMN, time_shard_column_type("Post"))],
+    "PostArchive": [("author_name", "STRING(MAX)")],
+    "Attendance": [(TIME_SHARD_COLUMN, time_shard_column_type("Attendance"))],
+    "Friendship": [(TIME_SHARD_COLUMN, time_shard_column_type("Friendship"))],
+    "Outbox": [(TIME_SHARD_COLUMN, time_shard_column_type("Outbox"))],
+}
+
+# Index -> columns it must store
+COVERING_INDEXES = {
+    "EventByDate": ["name", "attendee_count"],
+    "PostByTimestamp": ["author_id", "author_name", "text", "sentiment"],
+    "PostByAuthor": ["author_name", "text", "sentiment"],
+    "PostArchiveByTimestamp": ["author_id", "author_name", "text", "sentiment"],
+    "PostArchiveByAuthor": ["author_name", "text", "sentiment"],
+}
+
+# Time-sharded index -> the unsharded index it replaces
+REPLACED_INDEXES = {
+    "PostByShardCreateTime": "PostByCreateTime",
+    "EventByShardCreateTime": "EventByCreateTime",
+    "AttendanceByShardTime": "AttendanceByTime",
+    "FriendshipByShardTime": "FriendshipByTime",
+    "OutboxByShardCreateTime": "OutboxByCreateTime",
+}
+
+DDL_TIMEOUT_SECONDS = 3600 # Backfills on large tables take a while
+INDEX_POLL_SECONDS = 10
+
+
+def _current_schema(database):
+    """
+    Returns ({table: (parent, interleave_type)}, {index: set(stored columns)},
+    {table: set(columns)}, {index: INDEX_STATE}).
+    """
+    with database.snapshot(multi_use=True) as snapshot:
+        tables = {
+            name: (parent, interleave_type)
+            for name, parent, interleave_type in snapshot.execute_sql(
+                "SELECT TABLE_NAME, PARENT_TABLE_NAME, INTERLEAVE_TYPE "
+                "FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = '' AND TABLE_TYPE = 'BASE TABLE'"
+            )
+        }
+        stored = {}
+        for index_name, column_name in snapshot.execute_sql(
+            "SELECT INDEX_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.INDEX_COLUMNS "
+            "WHERE TABLE_SCHEMA = '' AND ORDINAL_POSITION IS NULL"
+        ):
+            stored.setdefault(index_name, set()).add(column_name)
+        states = _index_states(snapshot)
+        columns = {}
+        for table_name, column_name in snapshot.execute_sql(
+            "SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = ''"
+        ):
+            columns.setdefault(table_name, set()).add(column_name)
+    return tables, {name: stored.get(name, set()) for name in states}, columns, states
+
+
+def _index_states(snapshot):
+    """Returns {index: INDEX_STATE}: 'WRITE_ONLY' while backfilling, then 'READ_WRITE'."""
+    return {
+        name: state for name, state in snapshot.execute_sql(
+            "SELECT INDEX_NAME, INDEX_STATE FROM INFORMATION_SCHEMA.INDEXES "
+            "WHERE TABLE_SCHEMA = '' AND INDEX_TYPE = 'INDEX'"
+        )
+    }
+
+
+def wait_for_indexes(database, index_names, operation=None, timeout=DDL_TIMEOUT_SECONDS):
+    """
+    Waits until every index is backfilled and usable (READ_WRITE),
+    printing each index's state as it changes.
+
+    Args:
+        operation: The update_ddl operation building the indexes, if any;
+            its error is raised as soon as it fails.
+
+    Returns:
+        bool: True once all are READ_WRITE, False on timeout.
+    """
+    deadline = time.time() + timeout
+    printed = {}
+    while True:
+        if operation is not None and operation.done():
+            operation.result() # Raises if the DDL failed
+        with database.snapshot() as snapshot:
+            states = _index_states(snapshot)
+        for name in index_names:
+            state = states.get(name, "MISSING")
+            if printed.get(name) != state:
+                print(f"  {name}: {state}")
+                printed[name] = state
+        if all(states.get(name) == "READ_WRITE" for name in index_names):
+            return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(INDEX_POLL_SECONDS)
+
+
+def plan_migration(tables, indexes, columns, index_states, drop_replaced=False):
+    """
+    Lists the DDL steps still needed, in order.
+
+    Args:
+        drop_replaced (bool): Also drop the unsharded indexes whose
+            time-sharded replacement is already READ_WRITE. Only once the
+            running app hints the replacements.
+
+    Returns:
+        list[tuple[str, list[str], list[str]]]: (description, statements,
+            indexes to wait for) per step.
+    """
+    steps = []
+
+    column_ddl = []
+    for table, new_columns in NEW_COLUMNS.items():
+        if table not in columns:
+            print(f"Warning: Table {table} does not exist; create it first (DDL in setup.py).")
+            continue
+        for column, column_type in new_columns:
+            if column not in columns[table]:
+                column_ddl.append(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                columns[table].add(column)
+    if column_ddl:
+        # The graph's ALL COLUMNS properties are fixed when it is created
+        column_ddl.append(social_graph_ddl(replace=True))
+        steps.append(("Add denormalized columns", column_ddl, []))
+
+    index_ddl = []
+    for index_name, stored_columns in COVERING_INDEXES.items():
+        if index_name not in indexes:
+            print(f"Warning: Index {index_name} does not exist; create it first (DDL in setup.py).")
+            continue
+        for column in stored_columns:
+            if column not in indexes[index_name]:
+                index_ddl.append(f"ALTER INDEX {index_name} ADD STORED COLUMN {column}")
+    if index_ddl:
+        steps.append(("Add covering columns to indexes", index_ddl, []))
+
+    # An index's key can't be altered, and the app pins these indexes by
+    # name: build the sharded ones under new names, drop the old ones later.
+    # One index per step, so each is reported usable before the next starts.
+    for index_name, definition in TIME_SHARDED_INDEXES.items():
+        table = definition.split("(", 1)[0]
+        if table not in columns or index_states.get(index_name) == "READ_WRITE":
+            continue
+        shard_ddl = [] if index_name in indexes else [time_sharded_index_ddl(index_name)]
+        steps.append((f"Add time-sharded index {index_name}", shard_ddl, [index_name]))
+
+    colocate_ddl = []
+    enforce_ddl = []
+    for child, parent in INTERLEAVES.items():
+        if child not in tables:
+            print(f"Warning: Table {child} does not exist; create it first (DDL in setup.py).")
+            continue
+        current_parent, interleave_type = tables[child]
+        if current_parent is None:
+            colocate_ddl.append(f"ALTER TABLE {child} SET INTERLEAVE IN {parent}")
+        elif current_parent != parent:
+            print(f"Warning: {child} is interleaved in {current_parent}, not {parent}; leaving it alone.")
+            continue
+        if interleave_type != "IN PARENT":
+            enforce_ddl.append(f"ALTER TABLE {child} SET INTERLEAVE IN PARENT {parent} ON DELETE CASCADE")
+    if colocate_ddl:
+        steps.append(("Interleave child tables with their parents", colocate_ddl, []))
+    if enforce_ddl:
+        steps.append(("Enforce parent rows for interleaved tables", enforce_ddl, []))
+
+    replaced = [old_name for old_name in REPLACED_INDEXES.values() if old_name in indexes]
+    if replaced and not drop_replaced:
+        print(f"Note: {', '.join(replaced)} stay until the app hints their time-sharded replacements; "
+              f"then rerun with --drop-replaced-indexes.")
+    elif replaced:
+        drop_ddl = []
+        for new_name, old_name in REPLACED_INDEXES.items():
+            if old_name not in indexes:
+                continue
+            # The app can only have switched to a replacement that was usable
+            if index_states.get(new_name) != "READ_WRITE":
+                print(f"Warning: {new_name} is not READ_WRITE yet; keeping {old_name}.")
+                continue
+            drop_ddl.append(f"DROP INDEX {old_name}")
+        if drop_ddl:
+            steps.append(("Drop the replaced unsharded indexes", drop_ddl, []))
+    return steps
+
+
+def migrate(database, dry_run=False, drop_replaced=False):
+    """
+    Brings the database to schema v2.
+
+    Returns:
+        bool: True if the database is (or, for a dry run, would be) at v2.
+    """
+    tables, indexes, columns, index_states = _current_schema(database)
+    steps = plan_migration(tables, indexes, columns, index_states, drop_replaced=drop_replaced)
+    if not steps:
+        print("Schema is already at v2. Nothing to do.")
+        return True
+
+    for description, statements, wait_for in steps:
+        print(f"\n--- {description} ---")
+        for statement in statements:
+            print(f"  {statement}")
+        if dry_run:
+            continue
+        start_time = time.time()
+        try:
+            if wait_for:
+                # Poll the index state rather than block on the operation,
+                # so progress is visible and a rerun resumes the wait
+                operation = database.update_ddl(statements) if statements else None
+                print("Waiting for index backfills:")
+                if not wait_for_indexes(database, wait_for, operation=operation):
+                    print(f"ERROR: Indexes not READ_WRITE after {DDL_TIMEOUT_SECONDS} seconds; rerun to keep waiting.")
+                    return False
+            elif statements:
+                database.update_ddl(statements).result(DDL_TIMEOUT_SECONDS)
+        except exceptions.FailedPrecondition as e:
+            # E.g. a child row whose parent row is missing
+            print(f"ERROR: '{description}' was rejected: {e}")
+            print("Fix the reported rows and rerun; completed steps are skipped.")
+            return False
+        except Exception as e:
+            print(f"ERROR during '{description}': {type(e).__name__} - {e}")
+            return False
+        print(f"Done in {time.time() - start_time:.1f} seconds.")
+    if any(description == "Add denormalized columns" for description, _, _ in steps):
+        print("\nNow fill in the new columns: python jobs.py repair-author-names && python jobs.py reconcile-counters")
+    return True
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Migrate the InstaVibe schema from v1 to v2")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Print the DDL without running it")
+    arg_parser.add_argument(
+        "--drop-replaced-indexes", action="store_true",
+        help="Drop the unsharded commit timestamp indexes; only after deploying the app that hints their replacements",
+    )
+    args = arg_parser.parse_args(argv)
+
+    database = connect()
+    if not database:
+        print("\nCritical Error: Spanner database connection not established. Aborting.")
+        return 1
+    return 0 if migrate(database, dry_run=args.dry_run, drop_replaced=args.drop_replaced_indexes) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
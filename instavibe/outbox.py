@@ -0,0 +1,197 @@
+import os
+import json
+import uuid
+import threading
+import traceback
+from datetime import datetime
+
+from google.cloud import spanner
+
+from rows import json_default
+
+
+# --- Outbox Configuration ---
+# Writes add an Outbox row in their own transaction; each replica's
+# dispatcher reads new rows by commit timestamp and hands them to the
+# in-process subscribers (search index, trending, live feed, caches).
+OUTBOX_TABLE = "Outbox"
+OUTBOX_POLL_SECONDS = float(os.environ.get("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "200"))
+# A subscriber that fails on the same batch this many times skips it, so one
+# broken handler cannot hold every other subscriber back
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "5"))
+
+
+def _payload_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return json_default(obj)
+
+
+def enqueue(transaction, topic, payload, origin=None):
+    """
+    Adds a message to the outbox. Must be called inside the read-write
+    transaction that makes the change, so the message commits with it.
+
+    Args:
+        topic (str): e.g. "post" or "event"; subscribers filter on it.
+        payload (dict): JSON-serializable (datetimes become ISO strings).
+        origin (str, optional): The writing replica, for subscribers that
+            only act on their own replica's writes.
+    """
+    transaction.insert(
+        table=OUTBOX_TABLE,
+        columns=["outbox_id", "topic", "payload", "origin", "create_time"],
+        values=[(str(uuid.uuid4()), topic, json.dumps(payload, default=_payload_default), origin, spanner.COMMIT_TIMESTAMP)],
+    )
+
+
+def _position(message):
+    return (message["create_time"], message["outbox_id"])
+
+
+class _Subscriber:
+    def __init__(self, name, handler, topics, offset):
+        self.name = name
+        self.handler = handler
+        self.topics = frozenset(topics) if topics else None
+        self.offset = offset          # (create_time, outbox_id) of the last message handled
+        self.delivered = 0
+        self.failures = 0             # consecutive failures on the current batch
+
+
+class OutboxDispatcher:
+    """
+    Delivers committed outbox messages to in-process subscribers, in commit
+    order, in batches.
+
+    Every subscriber has its own offset, the (create_time, outbox_id) of the
+    last message it handled. A batch is read once from the lowest offset and
+    each subscriber gets the messages past its own; a subscriber whose
+    handler raises keeps its offset and gets the same messages again on the
+    next pass (at-least-once), while the others move on.
+
+    Offsets live in memory and start at the newest message in the outbox
+    when the dispatch thread first reaches Spanner (fetch_start_offset),
+    not at the local clock: the subscribers feed in-process views that load
+    their own starting state from Spanner, so a new replica only needs what
+    is committed after it comes up. Reading by commit timestamp from a
+    consistent snapshot is safe: anything committed later gets a larger
+    timestamp.
+    """
+
+    def __init__(self, fetch_messages_after, fetch_start_offset, poll_seconds=OUTBOX_POLL_SECONDS,
+                 batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.fetch_messages_after = fetch_messages_after
+        self.fetch_start_offset = fetch_start_offset
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._subscribers = []
+        self.start_offset = None      # (create_time, outbox_id); set by the dispatch thread
+        self.started = False
+
+    def subscribe(self, name, handler, topics=None):
+        """
+        Registers handler(messages) for messages on `topics` (all if None).
+
+        Each message is {outbox_id, topic, payload (dict), origin, create_time}.
+        """
+        with self._lock:
+            self._subscribers.append(_Subscriber(name, handler, topics, self.start_offset))
+
+    def _begin(self):
+        """Sets the start offset, and the offset of every subscriber still waiting for it."""
+        offset = self.fetch_start_offset()
+        with self._lock:
+            self.start_offset = offset
+            for subscriber in self._subscribers:
+                if subscriber.offset is None:
+                    subscriber.offset = offset
+        print(f"Outbox dispatcher reading from {offset[0].isoformat()}.")
+
+    def wake(self):
+        """Asks for a pass now instead of at the next poll, e.g. right after a write."""
+        self._wake.set()
+
+    def _deliver(self, subscriber, batch):
+        messages = [
+            message for message in batch
+            if _position(message) > subscriber.offset
+            and (subscriber.topics is None or message["topic"] in subscriber.topics)
+        ]
+        try:
+            if messages:
+                subscriber.handler(messages)
+        except Exception as e:
+            subscriber.failures += 1
+            if subscriber.failures < self.max_attempts:
+                print(f"Warning: Outbox subscriber '{subscriber.name}' failed (attempt {subscriber.failures}), will retry: {e}")
+                return False
+            print(f"ERROR: Outbox subscriber '{subscriber.name}' failed {subscriber.failures} times; skipping {len(messages)} messages: {e}")
+            traceback.print_exc()
+        else:
+            subscriber.delivered += len(messages)
+        subscriber.failures = 0
+        subscriber.offset = max(subscriber.offset, _position(batch[-1]))
+        return True
+
+    def dispatch_once(self):
+        """
+        Reads one batch from the lowest subscriber offset and delivers it.
+
+        Returns:
+            int: How many messages every subscriber got past (a full batch
+                 means more may be waiting); 0 if a subscriber will retry.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers or self.start_offset is None:
+            return 0
+        batch = self.fetch_messages_after(min(s.offset for s in subscribers), self.batch_size)
+        if not batch:
+            return 0
+        delivered = [self._deliver(subscriber, batch) for subscriber in subscribers]
+        return len(batch) if all(delivered) else 0
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.start_offset is None:
+                    self._begin()
+                while self.dispatch_once() >= self.batch_size and not self._stopped.is_set():
+                    pass
+            except Exception as e:
+                print(f"Warning: Outbox dispatch failed, retrying in {self.poll_seconds}s: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def start(self):
+        """Starts the background dispatch thread. Safe to call more than once."""
+        with self._lock:
+            if self.started:
+                return self
+            self.started = True
+        threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True).start()
+        print(f"Outbox dispatcher started with {len(self._subscribers)} subscribers.")
+        return self
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "subscribers": {
+                    s.name: {
+                        "offset": s.offset[0].isoformat() if s.offset else None,
+                        "delivered": s.delivered, "failures": s.failures,
+                    }
+                    for s in self._subscribers
+                },
+            }
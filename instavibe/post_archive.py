@@ -0,0 +1,105 @@
+import os
+import traceback
+from datetime import datetime, timedelta, timezone
+
+from google.cloud import spanner
+from google.cloud.spanner_v1 import param_types
+
+
+# --- Post Archive Configuration ---
+# Posts older than the horizon move from Post (hot) to PostArchive (cold).
+# Post and its indexes then only hold recent posts; readers page into the
+# archive once they run past the newest archived post.
+ARCHIVE_TABLE = "PostArchive"
+MENTION_ARCHIVE_TABLE = "MentionArchive"
+POST_ARCHIVE_HORIZON_DAYS = int(os.environ.get("POST_ARCHIVE_HORIZON_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("POST_ARCHIVE_BATCH_SIZE", "500"))
+
+POST_COLUMNS = ["post_id", "author_id", "author_name", "text", "sentiment", "post_timestamp", "create_time"]
+MENTION_COLUMNS = ["post_id", "mentioned_person_id", "mention_time"]
+
+# Oldest first, so the archive never holds a post newer than one left in Post.
+# Within a timestamp this is the reverse of the feed's page order (post_id
+# ascending), so a batch that splits a timestamp keeps the same invariant.
+_BATCH_SQL = """
+    SELECT post_id, author_id, author_name, text, sentiment, post_timestamp, create_time
+    FROM Post@{FORCE_INDEX=PostByTimestamp}
+    WHERE post_timestamp < @cutoff
+    ORDER BY post_timestamp, post_id DESC
+    LIMIT @batch_size
+"""
+
+# Mention is keyed by post_id first, so this is one key range per post
+_BATCH_MENTIONS_SQL = """
+    SELECT post_id, mentioned_person_id, mention_time
+    FROM Mention
+    WHERE post_id IN UNNEST(@post_ids)
+"""
+
+
+def archive_old_posts(db_instance, horizon_days=POST_ARCHIVE_HORIZON_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Moves posts older than `horizon_days` from Post into PostArchive.
+
+    Each batch is copied and deleted in one read-write transaction, so a
+    post is always in exactly one of the two tables and the job can be
+    stopped and rerun at any point. The posts' Mention rows move to
+    MentionArchive in the same transaction. create_time is kept, so commit-timestamp
+    watermarks (search index, /api/changes) never see an archived post again.
+
+    Returns:
+        bool: True on success, False otherwise.
+    """
+    if not db_instance:
+        print("Skipping post archival - database connection not available.")
+        return False
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=horizon_days)
+    print(f"\n--- Archiving posts older than {cutoff.isoformat()} ({horizon_days} days) ---")
+
+    def _move_batch(transaction):
+        rows = list(transaction.execute_sql(
+            _BATCH_SQL,
+            params={"cutoff": cutoff, "batch_size": batch_size},
+            param_types={"cutoff": param_types.TIMESTAMP, "batch_size": param_types.INT64},
+        ))
+        if not rows:
+            return 0
+        post_ids = [row[0] for row in rows]
+        mentions = list(transaction.execute_sql(
+            _BATCH_MENTIONS_SQL,
+            params={"post_ids": post_ids},
+            param_types={"post_ids": param_types.Array(param_types.STRING)},
+        ))
+        transaction.insert_or_update(
+            table=ARCHIVE_TABLE,
+            columns=POST_COLUMNS + ["archive_time"],
+            values=[list(row) + [spanner.COMMIT_TIMESTAMP] for row in rows],
+        )
+        if mentions:
+            # Parent rows first: MentionArchive is interleaved in PostArchive
+            transaction.insert_or_update(
+                table=MENTION_ARCHIVE_TABLE,
+                columns=MENTION_COLUMNS,
+                values=[list(row) for row in mentions],
+            )
+            transaction.delete("Mention", spanner.KeySet(ranges=[
+                spanner.KeyRange(start_closed=[post_id], end_closed=[post_id]) for post_id in post_ids
+            ]))
+        transaction.delete("Post", spanner.KeySet(keys=[[post_id] for post_id in post_ids]))
+        return len(rows)
+
+    moved = 0
+    try:
+        while True:
+            count = db_instance.run_in_transaction(_move_batch)
+            if not count:
+                break
+            moved += count
+            print(f"Archived {moved} posts so far...")
+        print(f"Post archival finished: {moved} posts moved to {ARCHIVE_TABLE}.")
+        return True
+    except Exception as e:
+        print(f"ERROR during post archival after {moved} posts: {type(e).__name__} - {e}")
+        traceback.print_exc()
+        return False
@@ -0,0 +1,135 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request, current_app
+
+
+# --- Query Budget Configuration ---
+# A statement executed this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("QUERY_N_PLUS_ONE_THRESHOLD", "3"))
+# Raise instead of logging when a route exceeds its budget (always on when app.testing)
+QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", "").lower() in ("1", "true", "yes")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A route ran more Spanner statements than its declared budget."""
+
+
+def query_budget(max_queries):
+    """
+    Declares how many Spanner statements a route may run per request.
+
+    Usage:
+        @app.route('/')
+        @query_budget(3)
+        def home(): ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.query_budget = max_queries
+            return view(*args, **kwargs)
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+def budget_is_strict():
+    """
+    True when an over-budget route should raise instead of logging.
+    Streamed routes should render in one piece then, so their queries
+    run before the budget is checked.
+    """
+    return current_app.testing or QUERY_BUDGET_STRICT
+
+
+def _statement_key(statement):
+    return " ".join(statement.split())
+
+
+def _new_stats():
+    return {"count": 0, "seconds": 0.0, "statements": {}}
+
+
+@contextmanager
+def track_query(statement):
+    """
+    Times one Spanner statement and records it against the current request.
+    A no-op outside a request (e.g. background index refreshes).
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            stats = g.setdefault("query_stats", _new_stats())
+            stats["count"] += 1
+            stats["seconds"] += time.monotonic() - start
+            key = _statement_key(statement)
+            stats["statements"][key] = stats["statements"].get(key, 0) + 1
+
+
+def note_memo_hit():
+    """Counts a read answered from the request memo instead of Spanner."""
+    if has_request_context():
+        stats = g.setdefault("query_stats", _new_stats())
+        stats["memo_hits"] = stats.get("memo_hits", 0) + 1
+
+
+def _log_stats(stats, label):
+    db_ms = stats["seconds"] * 1000
+    print(
+        f"[query-budget] {label}: {stats['count']} queries, "
+        f"{len(stats['statements'])} distinct, {db_ms:.1f} ms in Spanner, "
+        f"{stats.get('memo_hits', 0)} memo hits"
+    )
+    for statement, times in stats["statements"].items():
+        if times >= N_PLUS_ONE_THRESHOLD:
+            print(f"[query-budget] Possible N+1 in {label}: executed {times}x: {statement[:120]}")
+
+
+def _over_budget_message(stats, budget, label):
+    if budget is not None and stats["count"] > budget:
+        return f"{label} ran {stats['count']} queries, over its budget of {budget}."
+    return None
+
+
+def _report(response):
+    label = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+    budget = g.get("query_budget")
+
+    if response.is_streamed:
+        # Streamed templates run their queries while the body is sent, after
+        # this hook; report once the response is closed instead. Too late to
+        # fail the request, which is why strict mode doesn't stream.
+        stats = g.setdefault("query_stats", _new_stats())
+
+        def _report_streamed():
+            if stats["count"] or stats.get("memo_hits"):
+                _log_stats(stats, label)
+            message = _over_budget_message(stats, budget, label)
+            if message:
+                print(f"[query-budget] WARNING: {message}")
+
+        response.call_on_close(_report_streamed)
+        return response
+
+    stats = g.get("query_stats")
+    if not stats:
+        return response
+    _log_stats(stats, label)
+    response.headers.add("Server-Timing", f'db;dur={stats["seconds"] * 1000:.1f};desc="{stats["count"]} queries"')
+
+    message = _over_budget_message(stats, budget, label)
+    if message:
+        if budget_is_strict():
+            raise QueryBudgetExceeded(message)
+        print(f"[query-budget] WARNING: {message}")
+    return response
+
+
+def init_query_budget(app):
+    """Installs the per-request query report on the Flask app."""
+    app.after_request(_report)
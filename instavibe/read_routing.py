@@ -0,0 +1,114 @@
+import os
+from datetime import timedelta
+
+from google.cloud.spanner_v1 import DirectedReadOptions
+
+
+# --- Read Routing Configuration ---
+# Per query class, e.g.:
+#   SPANNER_DIRECTED_READS_FEED="us-east4:READ_ONLY,us-central1"
+#   SPANNER_READ_STALENESS_FEED="10"   (seconds; omit for strong reads)
+# SPANNER_DIRECTED_READS / SPANNER_READ_STALENESS apply to every read class
+# that has no setting of its own. Writes always go to the leader.
+READ_CLASSES = ("feed", "profile")
+
+_REPLICA_TYPES = {
+    "READ_ONLY": DirectedReadOptions.ReplicaSelection.Type.READ_ONLY,
+    "READ_WRITE": DirectedReadOptions.ReplicaSelection.Type.READ_WRITE,
+}
+
+
+def parse_directed_reads(spec):
+    """
+    Parses "location[:TYPE],..." into DirectedReadOptions.
+
+    Replicas are tried in the order given; Spanner falls back to other
+    replicas if none of them is available.
+
+    Returns:
+        DirectedReadOptions or None: None for an empty spec.
+    """
+    selections = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        location, _, replica_type = item.partition(":")
+        selection = {}
+        if location:
+            selection["location"] = location.strip()
+        if replica_type:
+            try:
+                selection["type_"] = _REPLICA_TYPES[replica_type.strip().upper()]
+            except KeyError:
+                raise ValueError(f"Unknown replica type '{replica_type}' in directed reads '{spec}'") from None
+        selections.append(selection)
+    if not selections:
+        return None
+    return DirectedReadOptions(include_replicas={"replica_selections": selections})
+
+
+class ReadRoute:
+    """Where one class of read-only queries is served from."""
+
+    def __init__(self, name, directed_read_options=None, staleness=None):
+        self.name = name
+        self.directed_read_options = directed_read_options
+        self.staleness = staleness  # timedelta, or None for strong reads
+
+    @classmethod
+    def from_env(cls, name):
+        suffix = name.upper()
+        spec = os.environ.get(f"SPANNER_DIRECTED_READS_{suffix}", os.environ.get("SPANNER_DIRECTED_READS", ""))
+        seconds = os.environ.get(f"SPANNER_READ_STALENESS_{suffix}", os.environ.get("SPANNER_READ_STALENESS", ""))
+        staleness = timedelta(seconds=float(seconds)) if seconds.strip() else None
+        return cls(name, parse_directed_reads(spec), staleness)
+
+    def snapshot_kwargs(self, multi_use=False):
+        """Arguments for Database.snapshot()."""
+        if self.staleness is None:
+            return {"multi_use": True} if multi_use else {}
+        if multi_use:
+            # Multi-use snapshots need a fixed read timestamp
+            return {"multi_use": True, "exact_staleness": self.staleness}
+        return {"max_staleness": self.staleness}
+
+    def execute_kwargs(self):
+        """Arguments for Snapshot.execute_sql()."""
+        if self.directed_read_options is None:
+            return {}
+        return {"directed_read_options": self.directed_read_options}
+
+    def status(self):
+        replicas = []
+        if self.directed_read_options is not None:
+            for selection in self.directed_read_options.include_replicas.replica_selections:
+                replica = selection.location or "*"
+                if selection.type_:
+                    replica += ":" + DirectedReadOptions.ReplicaSelection.Type(selection.type_).name
+                replicas.append(replica)
+        return {
+            "directed_reads": replicas or None,
+            "staleness_seconds": self.staleness.total_seconds() if self.staleness is not None else None,
+        }
+
+
+# Strong reads with default replica selection: used for writes' read-your-writes flows
+LEADER_ROUTE = ReadRoute("leader")
+
+READ_ROUTES = {name: ReadRoute.from_env(name) for name in READ_CLASSES}
+
+
+def read_route(query_class, read_your_writes=False):
+    """
+    Picks the route for a read.
+
+    Args:
+        query_class (str): "feed", "profile" or "write".
+        read_your_writes (bool): True once the current request has written;
+                                 such reads must see that write, so they are
+                                 strong and not directed.
+    """
+    if read_your_writes:
+        return LEADER_ROUTE
+    return READ_ROUTES.get(query_class, LEADER_ROUTE)
@@ -2,18 +2,39 @@ DROP INDEX IF EXISTS PersonByName;
 DROP INDEX IF EXISTS EventByDate;
 DROP INDEX IF EXISTS PostByTimestamp;
 DROP INDEX IF EXISTS PostByAuthor;
+DROP INDEX IF EXISTS PostArchiveByTimestamp;
+DROP INDEX IF EXISTS PostArchiveByAuthor;
+DROP INDEX IF EXISTS PostByShardCreateTime;
+DROP INDEX IF EXISTS EventByShardCreateTime;
+DROP INDEX IF EXISTS AttendanceByShardTime;
 DROP INDEX IF EXISTS FriendshipByPersonB;
+DROP INDEX IF EXISTS FriendshipByShardTime;
 DROP INDEX IF EXISTS AttendanceByEvent;
 DROP INDEX IF EXISTS MentionByPerson;
+DROP INDEX IF EXISTS MentionArchiveByPerson;
 DROP INDEX IF EXISTS EventLocationByLocationId;
+DROP INDEX IF EXISTS OutboxByShardCreateTime;
+-- Unsharded predecessors, left behind by an unfinished migrate_schema_v2.py
+DROP INDEX IF EXISTS PostByCreateTime;
+DROP INDEX IF EXISTS EventByCreateTime;
+DROP INDEX IF EXISTS AttendanceByTime;
+DROP INDEX IF EXISTS FriendshipByTime;
+DROP INDEX IF EXISTS OutboxByCreateTime;
 
 DROP PROPERTY GRAPH IF EXISTS SocialGraph;
 
 
+DROP TABLE IF EXISTS Outbox;
+DROP TABLE IF EXISTS JobState;
+DROP TABLE IF EXISTS FriendSuggestion;
+DROP TABLE IF EXISTS SentimentDaily;
+DROP TABLE IF EXISTS PersonSentimentDaily;
 DROP TABLE IF EXISTS EventLocation;
 DROP TABLE IF EXISTS Mention;
 DROP TABLE IF EXISTS Attendance;
 DROP TABLE IF EXISTS Friendship;
+DROP TABLE IF EXISTS MentionArchive;
+DROP TABLE IF EXISTS PostArchive;
 DROP TABLE IF EXISTS Post;
 DROP TABLE IF EXISTS Event;
 DROP TABLE IF EXISTS Location;
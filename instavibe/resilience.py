@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from rows import copy_rows
+
+
+# --- Resilience Configuration ---
+BULKHEAD_WAIT_SECONDS = float(os.environ.get("SPANNER_BULKHEAD_WAIT_SECONDS", "0.5"))
+BREAKER_WINDOW = int(os.environ.get("SPANNER_BREAKER_WINDOW", "20"))            # Recent calls considered
+BREAKER_MIN_CALLS = int(os.environ.get("SPANNER_BREAKER_MIN_CALLS", "10"))      # Before the breaker may trip
+BREAKER_FAILURE_RATE = float(os.environ.get("SPANNER_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.environ.get("SPANNER_BREAKER_SLOW_CALL_SECONDS", "2.0"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("SPANNER_BREAKER_OPEN_SECONDS", "15"))
+STALE_RESULTS_MAX = int(os.environ.get("SPANNER_STALE_RESULTS_MAX", "256"))
+# Larger results aren't kept as a fallback; one would outweigh all the others
+STALE_RESULT_ROWS_MAX = int(os.environ.get("SPANNER_STALE_RESULT_ROWS_MAX", "1000"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class SpannerUnavailableError(ConnectionError):
+    """Raised instead of calling Spanner when a bulkhead is full or a breaker is open."""
+
+
+class Bulkhead:
+    """Caps the number of concurrent calls of one class."""
+
+    def __init__(self, name, max_concurrent, wait_seconds=BULKHEAD_WAIT_SECONDS):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            with self._lock:
+                self.rejected += 1
+            raise SpannerUnavailableError(f"Spanner bulkhead '{self.name}' is full ({self.max_concurrent} calls in flight).")
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+
+class CircuitBreaker:
+    """
+    Trips when too many recent calls failed or were slower than
+    BREAKER_SLOW_CALL_SECONDS. While open, calls fail fast; after
+    BREAKER_OPEN_SECONDS a single trial call is let through (half-open) and
+    its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=BREAKER_WINDOW)  # True = failed or slow
+        self.state = CLOSED
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < BREAKER_OPEN_SECONDS:
+                    raise SpannerUnavailableError(f"Spanner circuit '{self.name}' is open.")
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    raise SpannerUnavailableError(f"Spanner circuit '{self.name}' is half-open; trial call in progress.")
+                self._trial_in_flight = True
+
+    def after_call(self, failed, elapsed):
+        bad = failed or elapsed >= BREAKER_SLOW_CALL_SECONDS
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+                if bad:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    print(f"Spanner circuit '{self.name}' closed.")
+                return
+            self._outcomes.append(bad)
+            if len(self._outcomes) >= BREAKER_MIN_CALLS and sum(self._outcomes) / len(self._outcomes) >= BREAKER_FAILURE_RATE:
+                self._open()
+
+    def cancel_call(self):
+        """Forgets a call that was admitted but never reached Spanner."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+        print(f"Spanner circuit '{self.name}' opened; failing fast for {BREAKER_OPEN_SECONDS:.0f}s.")
+
+
+class SpannerGuard:
+    """
+    Bulkhead + circuit breaker for one class of Spanner calls, plus the last
+    good result of each read so callers can serve it while Spanner is
+    unavailable.
+    """
+
+    def __init__(self, name, max_concurrent):
+        self.name = name
+        self.bulkhead = Bulkhead(name, max_concurrent)
+        self.breaker = CircuitBreaker(name)
+        self._stale_lock = threading.Lock()
+        self._last_good = OrderedDict()
+
+    @contextmanager
+    def slot(self, expected_errors=()):
+        """
+        Runs the enclosed Spanner call under the breaker and bulkhead.
+        Exceptions in expected_errors (e.g. "not found" outcomes) propagate
+        but do not count as failures.
+
+        Raises:
+            SpannerUnavailableError: If the breaker is open or no slot frees up
+                                     within BULKHEAD_WAIT_SECONDS.
+        """
+        self.breaker.before_call()
+        try:
+            self.bulkhead.acquire()
+        except SpannerUnavailableError:
+            self.breaker.cancel_call()
+            raise
+        start = time.monotonic()
+        failed = True
+        try:
+            yield
+            failed = False
+        except expected_errors:
+            failed = False
+            raise
+        finally:
+            self.bulkhead.release()
+            self.breaker.after_call(failed, time.monotonic() - start)
+
+    def remember(self, key, rows):
+        if len(rows) > STALE_RESULT_ROWS_MAX:
+            with self._stale_lock:
+                self._last_good.pop(key, None) # Don't serve an older copy of it either
+            return
+        with self._stale_lock:
+            self._last_good[key] = copy_rows(rows)
+            self._last_good.move_to_end(key)
+            while len(self._last_good) > STALE_RESULTS_MAX:
+                self._last_good.popitem(last=False)
+
+    def stale(self, key):
+        """Returns a copy of the last good result for this read, or None."""
+        with self._stale_lock:
+            rows = self._last_good.get(key)
+            return copy_rows(rows) if rows is not None else None
+
+    def status(self):
+        return {
+            "state": self.breaker.state,
+            "in_flight": self.bulkhead.in_flight,
+            "max_concurrent": self.bulkhead.max_concurrent,
+            "rejected": self.bulkhead.rejected,
+        }
+
+
+def freeze_params(params):
+    """Makes query params hashable so they can key a result cache."""
+    if not params:
+        return ()
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value) for name, value in params.items()
+    ))
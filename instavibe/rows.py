@@ -0,0 +1,147 @@
+import keyword
+import threading
+from collections.abc import Mapping, MutableMapping
+
+
+class Row(MutableMapping):
+    """
+    Base class for query result rows.
+
+    Each query shape (tuple of column names) gets its own subclass whose
+    columns are __slots__, so a row stores only its values instead of a
+    per-row dict of keys. Rows are mutable mappings: row["name"], row.get(),
+    "name" in row, dict(row) and templates' row.name all work as with the
+    dicts they replace. Keys that are not columns (e.g. values computed in
+    Python after the query) go to a small per-row overflow dict.
+    """
+
+    __slots__ = ("_extra",)
+    _fields = ()
+    _field_set = frozenset()
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._field_set:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for field in self._fields:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        """Shallow copy, like dict.copy()."""
+        clone = self.__class__.__new__(self.__class__)
+        for field in self._fields:
+            if hasattr(self, field):
+                setattr(clone, field, getattr(self, field))
+        clone._extra = dict(self._extra) if self._extra is not None else None
+        return clone
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def __repr__(self):
+        return f"Row({dict(self)!r})"
+
+
+_row_classes = {}
+_row_classes_lock = threading.Lock()
+_RESERVED = frozenset(dir(Row))
+
+
+def _can_slot(fields):
+    return (
+        len(set(fields)) == len(fields)
+        and all(f.isidentifier() and not keyword.iskeyword(f) and not f.startswith("_") and f not in _RESERVED for f in fields)
+    )
+
+
+def row_factory(fields):
+    """
+    Returns a callable building one row from a sequence of column values.
+
+    Rows are instances of a Row subclass generated once per column tuple.
+    Column names that cannot be slots (duplicates, non-identifiers, names
+    of mapping methods such as "keys") fall back to plain dicts.
+
+    Args:
+        fields (list[str]): Column names in SELECT order.
+
+    Returns:
+        callable: values -> Row (or dict).
+    """
+    fields = tuple(fields)
+    with _row_classes_lock:
+        make = _row_classes.get(fields)
+        if make is not None:
+            return make
+        if not _can_slot(fields):
+            make = lambda values: dict(zip(fields, values))
+        else:
+            args = ", ".join(fields)
+            body = "".join(f"    self.{f} = {f}\n" for f in fields)
+            namespace = {}
+            exec(f"def __init__(self, {args}):\n{body}    self._extra = None\n", namespace)
+            cls = type("Row", (Row,), {
+                "__slots__": fields,
+                "_fields": fields,
+                "_field_set": frozenset(fields),
+                "__init__": namespace["__init__"],
+            })
+            make = lambda values: cls(*values)
+        _row_classes[fields] = make
+        return make
+
+
+def copy_rows(rows):
+    """Shallow-copies each row (Row or dict) so callers can mutate their copy."""
+    return [row.copy() for row in rows]
+
+
+def json_default(obj):
+    """json.dumps default= hook that serializes Rows as objects."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,343 @@
+import os
+import re
+import math
+import gzip
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+# --- Search Configuration ---
+SEARCH_INDEX_PATH = os.environ.get("SEARCH_INDEX_PATH", "/tmp/instavibe_search_index.json.gz")
+SEARCH_REFRESH_SECONDS = float(os.environ.get("SEARCH_REFRESH_SECONDS", "30"))
+SEARCH_SNAPSHOT_EVERY = int(os.environ.get("SEARCH_SNAPSHOT_EVERY", "50"))
+# How often the indexed post ids are checked against Spanner, which bounds
+# how long a deleted post stays searchable
+SEARCH_RECONCILE_SECONDS = float(os.environ.get("SEARCH_RECONCILE_SECONDS", "600"))
+
+SNAPSHOT_VERSION = 1
+
+# BM25 tuning parameters (standard Okapi defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)?", re.UNICODE)
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have i if in is it its me my of on or
+    our so that the their them they this to was we were what when with you your
+""".split())
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase search terms.
+
+    Punctuation is dropped, simple possessives are folded ("alice's" -> "alice")
+    and common English stopwords are removed.
+    """
+    if not text:
+        return []
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        if token.endswith("'s"):
+            token = token[:-2]
+        token = token.replace("'", "")
+        if token and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def _to_iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class PostSearchIndex:
+    """
+    In-memory inverted index over Post.text with BM25 ranking.
+
+    Each post is stored once as a small document (author, text, sentiment,
+    timestamp) so search results can be rendered without going back to
+    Spanner. Posting lists map term -> {doc_idx: term frequency}.
+
+    The index is loaded from a gzip JSON snapshot when one exists and then
+    caught up from Spanner using the Post.create_time commit timestamp of the
+    newest row it has seen (the watermark). The watermark only finds new
+    posts, so every SEARCH_RECONCILE_SECONDS the indexed ids are also
+    checked against the ids in Spanner and deleted posts are removed. Posts
+    are never edited in place; a change to a post's text must go through
+    add_post (e.g. from the outbox "post" topic), which replaces it.
+    """
+
+    def __init__(self, snapshot_path=SEARCH_INDEX_PATH):
+        self.snapshot_path = snapshot_path
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock() # One Spanner catch-up at a time
+        self._reset()
+
+    def _reset(self):
+        self.docs = []            # doc_idx -> stored document dict (None once removed)
+        self.doc_lengths = []     # doc_idx -> number of terms
+        self.doc_index = {}       # post_id -> doc_idx
+        self.postings = {}        # term -> {doc_idx: tf}
+        self.total_length = 0
+        self.watermark = None     # newest Post.create_time loaded from Spanner (ISO string)
+        self.loaded = False
+        self.last_refresh = 0.0
+        self.last_reconcile = None
+        self._dirty = 0
+
+    def __len__(self):
+        return len(self.doc_index)
+
+    # --- Index maintenance ---
+
+    def add_post(self, post):
+        """
+        Adds or replaces a post in the index.
+
+        Args:
+            post (dict): Must contain 'post_id' and 'text'. 'author_id',
+                         'author_name', 'sentiment' and 'post_timestamp' are
+                         stored for display if present.
+        """
+        post_id = post.get("post_id")
+        if not post_id:
+            return
+        terms = Counter(tokenize(post.get("text")))
+        with self._lock:
+            self._remove(post_id)
+            doc_idx = len(self.docs)
+            self.docs.append({
+                "post_id": post_id,
+                "author_id": post.get("author_id"),
+                "author_name": post.get("author_name"),
+                "text": post.get("text"),
+                "sentiment": post.get("sentiment"),
+                "post_timestamp": _to_iso(post.get("post_timestamp")),
+            })
+            length = sum(terms.values())
+            self.doc_lengths.append(length)
+            self.doc_index[post_id] = doc_idx
+            self.total_length += length
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[doc_idx] = tf
+            self._dirty += 1
+
+    def remove_post(self, post_id):
+        """Removes a post from the index. Unknown ids are ignored."""
+        with self._lock:
+            if self._remove(post_id):
+                self._dirty += 1
+
+    def _remove(self, post_id):
+        doc_idx = self.doc_index.pop(post_id, None)
+        if doc_idx is None:
+            return False
+        for term in set(tokenize(self.docs[doc_idx]["text"])):
+            plist = self.postings.get(term)
+            if plist is not None:
+                plist.pop(doc_idx, None)
+                if not plist:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths[doc_idx]
+        self.docs[doc_idx] = None
+        self.doc_lengths[doc_idx] = 0
+        return True
+
+    def load_rows(self, rows):
+        """Indexes rows from the Post table and advances the watermark."""
+        count = 0
+        for row in rows:
+            self.add_post(row)
+            create_time = _to_iso(row.get("create_time"))
+            if create_time and (self.watermark is None or create_time > self.watermark):
+                self.watermark = create_time
+            count += 1
+        return count
+
+    # --- Query ---
+
+    def search(self, query, limit=20, offset=0):
+        """
+        Ranks posts against a free-text query using BM25.
+
+        Returns:
+            tuple[list[dict], int]: The requested page of matching documents
+                                    (each with a 'score'), and the total
+                                    number of matching posts.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            n_docs = len(self.doc_index)
+            if n_docs == 0:
+                return [], 0
+            avgdl = self.total_length / n_docs if n_docs else 0.0
+            scores = {}
+            for term in terms:
+                plist = self.postings.get(term)
+                if not plist:
+                    continue
+                df = len(plist)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_idx, tf in plist.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_idx] / (avgdl or 1.0))
+                    scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            # Ties fall back to recency, newest first
+            ranked = sorted(
+                scores.items(),
+                key=lambda item: (-item[1], _neg_ts(self.docs[item[0]]["post_timestamp"])),
+            )
+            page = ranked[offset:offset + limit]
+            results = []
+            for doc_idx, score in page:
+                doc = dict(self.docs[doc_idx])
+                doc["score"] = round(score, 4)
+                results.append(doc)
+            return results, len(ranked)
+
+    # --- Snapshots ---
+
+    def save_snapshot(self, path=None):
+        """Writes the stored documents and watermark to a gzip JSON snapshot."""
+        path = path or self.snapshot_path
+        if not path:
+            return False
+        with self._lock:
+            payload = {
+                "version": SNAPSHOT_VERSION,
+                "watermark": self.watermark,
+                "docs": [doc for doc in self.docs if doc is not None],
+            }
+            self._dirty = 0
+        tmp_path = f"{path}.tmp"
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, path)
+            print(f"Search index snapshot written: {len(payload['docs'])} posts -> {path}")
+            return True
+        except OSError as e:
+            print(f"Warning: Could not write search index snapshot to '{path}': {e}")
+            return False
+
+    def load_snapshot(self, path=None):
+        """
+        Rebuilds the index from a snapshot file.
+
+        Posting lists are not stored in the snapshot; re-tokenizing the stored
+        text is fast and keeps the file format independent of the tokenizer.
+        """
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable search index snapshot '{path}': {e}")
+            return False
+        if payload.get("version") != SNAPSHOT_VERSION:
+            print(f"Warning: Ignoring search index snapshot with version {payload.get('version')}.")
+            return False
+        with self._lock:
+            self._reset()
+            for doc in payload.get("docs", []):
+                self.add_post(doc)
+            self.watermark = payload.get("watermark")
+            self._dirty = 0
+        print(f"Search index loaded from snapshot: {len(self)} posts (watermark {self.watermark}).")
+        return True
+
+    def maybe_snapshot(self):
+        """Saves a snapshot once enough write-path updates have accumulated."""
+        if self._dirty >= SEARCH_SNAPSHOT_EVERY:
+            self.save_snapshot()
+
+    # --- Loading from Spanner ---
+
+    def reconcile(self, fetch_post_ids):
+        """
+        Removes indexed posts that no longer exist in Spanner.
+
+        Args:
+            fetch_post_ids (callable): Returns the ids of every post, from a
+                strong read.
+
+        Returns:
+            int: How many posts were removed.
+        """
+        # Only posts indexed before the read can be judged by it: the write
+        # path indexes a post after it commits, so a strong read that starts
+        # later sees it unless it was deleted
+        with self._lock:
+            indexed = set(self.doc_index)
+        live = set(fetch_post_ids())
+        removed = 0
+        with self._lock:
+            for post_id in indexed - live:
+                if self._remove(post_id):
+                    removed += 1
+            self._dirty += removed
+        return removed
+
+    def ensure_current(self, fetch_posts_since, fetch_post_ids=None):
+        """
+        Loads the index on first use and periodically catches up with new posts.
+
+        Args:
+            fetch_posts_since (callable): fetch_posts_since(watermark) returns the
+                Post rows (with 'create_time') committed after the watermark,
+                or all posts when the watermark is None.
+            fetch_post_ids (callable, optional): For reconcile(), run every
+                SEARCH_RECONCILE_SECONDS.
+        """
+        now = time.monotonic()
+        if self.loaded and now - self.last_refresh < SEARCH_REFRESH_SECONDS:
+            return
+        # Callers wait for the first load; after that, whoever gets here
+        # while a refresh is running searches the index as it is.
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if self.loaded and now - self.last_refresh < SEARCH_REFRESH_SECONDS:
+                return
+            first_load = not self.loaded
+            if first_load:
+                self.load_snapshot()
+            # Query Spanner without the index lock, so searches aren't held up
+            rows = fetch_posts_since(self.watermark) or []
+            with self._lock:
+                added = self.load_rows(rows)
+                self.loaded = True
+                self.last_refresh = now
+            removed = 0
+            # A snapshot file may hold posts deleted while the process was down
+            if fetch_post_ids and (self.last_reconcile is None or now - self.last_reconcile >= SEARCH_RECONCILE_SECONDS):
+                removed = self.reconcile(fetch_post_ids)
+                self.last_reconcile = now
+                if removed:
+                    print(f"Search index: removed {removed} deleted posts.")
+        finally:
+            self._refresh_lock.release()
+        if first_load:
+            print(f"Search index ready: {len(self)} posts ({added} loaded from Spanner).")
+            self.save_snapshot()
+        elif added or removed:
+            self.maybe_snapshot()
+
+
+def _neg_ts(iso_ts):
+    """Sort key that orders ISO timestamps newest first."""
+    if not iso_ts:
+        return 0.0
+    try:
+        return -datetime.fromisoformat(str(iso_ts).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
@@ -0,0 +1,256 @@
+import zlib
+from datetime import datetime, timedelta, timezone, time as dt_time
+
+from google.cloud import spanner
+from google.cloud.spanner_v1 import param_types
+
+
+# --- Sentiment Rollup Configuration ---
+SENTIMENTS = ("positive", "neutral", "negative")
+# The global rollup is split over a few rows per day so concurrent posts
+# don't all contend on a single counter row.
+GLOBAL_ROLLUP_SHARDS = 8
+
+PERSON_ROLLUP_TABLE = "PersonSentimentDaily"
+GLOBAL_ROLLUP_TABLE = "SentimentDaily"
+ROLLUP_COLUMNS = ["positive_count", "neutral_count", "negative_count"]
+
+
+def normalize_sentiment(sentiment):
+    """Maps a free-form Post.sentiment value onto positive/neutral/negative."""
+    value = (sentiment or "").strip().lower()
+    return value if value in SENTIMENTS else "neutral"
+
+
+def _shard_for(post_id):
+    return zlib.crc32(post_id.encode("utf-8")) % GLOBAL_ROLLUP_SHARDS
+
+
+def _day_of(post_timestamp):
+    if post_timestamp is None:
+        post_timestamp = datetime.now(timezone.utc)
+    if post_timestamp.tzinfo is not None:
+        post_timestamp = post_timestamp.astimezone(timezone.utc)
+    return post_timestamp.date()
+
+
+def _increment_row(transaction, table, key_columns, key, sentiment):
+    existing = list(transaction.read(
+        table=table,
+        columns=ROLLUP_COLUMNS,
+        keyset=spanner.KeySet(keys=[list(key)]),
+    ))
+    counts = list(existing[0]) if existing else [0, 0, 0]
+    counts[SENTIMENTS.index(sentiment)] += 1
+    transaction.insert_or_update(
+        table=table,
+        columns=key_columns + ROLLUP_COLUMNS + ["update_time"],
+        values=[tuple(key) + tuple(counts) + (spanner.COMMIT_TIMESTAMP,)],
+    )
+
+
+def increment_sentiment_rollups(transaction, post_id, author_id, sentiment, post_timestamp):
+    """
+    Counts a new post in the per-person and global daily rollups.
+    Must be called inside the read-write transaction that inserts the post.
+    """
+    day = _day_of(post_timestamp)
+    bucket = normalize_sentiment(sentiment)
+    _increment_row(transaction, PERSON_ROLLUP_TABLE, ["person_id", "day"], (author_id, day), bucket)
+    _increment_row(transaction, GLOBAL_ROLLUP_TABLE, ["day", "shard"], (day, _shard_for(post_id)), bucket)
+
+
+# --- Rebuild ---
+# The rebuild rewrites the rollups a batch at a time, each batch in its own
+# short read-write transaction, so no commit gets near Spanner's mutation
+# limit and posts are only locked out of the rows being rewritten.
+REBUILD_BATCH_ROWS = 500      # Person rollup rows written per transaction
+REBUILD_BATCH_PERSONS = 200   # Persons per transaction
+REBUILD_BATCH_DAYS = 31       # Days of posts read per global rollup transaction
+
+# Bucket counts per group; neutral is everything that isn't positive or
+# negative, matching normalize_sentiment()
+_COUNT_COLUMNS = """
+    COUNTIF(LOWER(TRIM(sentiment)) = 'positive') AS positive_count,
+    COUNTIF(LOWER(TRIM(sentiment)) = 'negative') AS negative_count,
+    COUNT(*) AS total_count
+"""
+
+_PERSON_DAYS_SQL = f"""
+    SELECT author_id, DATE(COALESCE(post_timestamp, create_time), "UTC") AS day, {_COUNT_COLUMNS}
+    FROM (
+        SELECT author_id, post_timestamp, create_time, sentiment FROM Post WHERE author_id IN UNNEST(@person_ids)
+        UNION ALL
+        SELECT author_id, post_timestamp, create_time, sentiment FROM PostArchive WHERE author_id IN UNNEST(@person_ids)
+    )
+    GROUP BY author_id, day
+"""
+
+# Ranges on post_timestamp, so each batch reads (and locks) only its days
+_DAYS_SQL = f"""
+    SELECT day, {_COUNT_COLUMNS}
+    FROM (
+        SELECT DATE(post_timestamp, "UTC") AS day, sentiment FROM Post
+        WHERE post_timestamp >= @start AND post_timestamp < @end
+        UNION ALL
+        SELECT DATE(create_time, "UTC"), sentiment FROM Post
+        WHERE post_timestamp IS NULL AND create_time >= @start AND create_time < @end
+        UNION ALL
+        SELECT DATE(post_timestamp, "UTC"), sentiment FROM PostArchive
+        WHERE post_timestamp >= @start AND post_timestamp < @end
+        UNION ALL
+        SELECT DATE(create_time, "UTC"), sentiment FROM PostArchive
+        WHERE post_timestamp IS NULL AND create_time >= @start AND create_time < @end
+    )
+    GROUP BY day
+"""
+
+_POST_DAY = 'DATE(COALESCE(post_timestamp, create_time), "UTC")'
+
+# Sizes the batches: rollup rows each person and day will have, plus the
+# ones that already exist (which may have no posts left)
+_PLAN_PERSONS_SQL = f"""
+    SELECT author_id, COUNT(DISTINCT day) FROM (
+        SELECT author_id, {_POST_DAY} AS day FROM Post
+        UNION ALL
+        SELECT author_id, {_POST_DAY} AS day FROM PostArchive
+    )
+    GROUP BY author_id
+"""
+_PLAN_EXISTING_PERSONS_SQL = f"SELECT DISTINCT person_id FROM {PERSON_ROLLUP_TABLE}"
+_PLAN_DAYS_SQL = f"""
+    SELECT DISTINCT day FROM (
+        SELECT {_POST_DAY} AS day FROM Post
+        UNION ALL
+        SELECT {_POST_DAY} AS day FROM PostArchive
+        UNION ALL
+        SELECT day FROM {GLOBAL_ROLLUP_TABLE}
+    )
+"""
+
+
+def _bucket_counts(positive, negative, total):
+    return (positive, total - positive - negative, negative)
+
+
+def _batches(sized_keys, max_rows, max_keys):
+    """Groups (key, rows) pairs, in order, into lists of keys of bounded size."""
+    batch, rows = [], 0
+    for key, key_rows in sized_keys:
+        if batch and (rows + key_rows > max_rows or len(batch) >= max_keys):
+            yield batch
+            batch, rows = [], 0
+        batch.append(key)
+        rows += key_rows
+    if batch:
+        yield batch
+
+
+def _rebuild_person_batch(transaction, person_ids):
+    results = transaction.execute_sql(
+        _PERSON_DAYS_SQL,
+        params={"person_ids": person_ids},
+        param_types={"person_ids": param_types.Array(param_types.STRING)},
+    )
+    values = [
+        (author_id, day) + _bucket_counts(positive, negative, total) + (spanner.COMMIT_TIMESTAMP,)
+        for author_id, day, positive, negative, total in results
+    ]
+    # Interleaved under Person, so each person's rows are one key range
+    transaction.delete(PERSON_ROLLUP_TABLE, spanner.KeySet(ranges=[
+        spanner.KeyRange(start_closed=[person_id], end_closed=[person_id]) for person_id in person_ids
+    ]))
+    if values:
+        transaction.insert(
+            table=PERSON_ROLLUP_TABLE,
+            columns=["person_id", "day"] + ROLLUP_COLUMNS + ["update_time"],
+            values=values,
+        )
+    return len(values)
+
+
+def _rebuild_day_batch(transaction, days):
+    start = datetime.combine(days[0], dt_time.min, timezone.utc)
+    end = datetime.combine(days[-1] + timedelta(days=1), dt_time.min, timezone.utc)
+    results = transaction.execute_sql(
+        _DAYS_SQL,
+        params={"start": start, "end": end},
+        param_types={"start": param_types.TIMESTAMP, "end": param_types.TIMESTAMP},
+    )
+    totals = {day: _bucket_counts(positive, negative, total) for day, positive, negative, total in results}
+    # A rebuilt day's count goes in shard 0; new posts spread over the shards again
+    transaction.delete(GLOBAL_ROLLUP_TABLE, spanner.KeySet(keys=[
+        [day, shard] for day in set(days) | set(totals) for shard in range(GLOBAL_ROLLUP_SHARDS)
+    ]))
+    if totals:
+        transaction.insert(
+            table=GLOBAL_ROLLUP_TABLE,
+            columns=["day", "shard"] + ROLLUP_COLUMNS + ["update_time"],
+            values=[(day, 0) + counts + (spanner.COMMIT_TIMESTAMP,) for day, counts in totals.items()],
+        )
+    return len(totals)
+
+
+def rebuild_sentiment_rollups(db_instance):
+    """
+    Recomputes both rollup tables from the Post and PostArchive tables.
+
+    A snapshot read counts the rollup rows per person and per day to size
+    the batches. Each batch then aggregates its own persons (or range of
+    days) with GROUP BY and rewrites their rollup rows in one short
+    read-write transaction. A post committed concurrently for a person or
+    day in that batch either lands in the batch or aborts and retries it,
+    so no increment is lost.
+
+    Returns:
+        bool: True if the rollups were rebuilt, False otherwise.
+    """
+    if not db_instance:
+        print("Skipping sentiment rollup rebuild - database connection not available.")
+        return False
+
+    print("\n--- Rebuilding sentiment rollups from Post ---")
+    try:
+        with db_instance.snapshot(multi_use=True) as snapshot:
+            person_rows = {author_id: int(rows) for author_id, rows in snapshot.execute_sql(_PLAN_PERSONS_SQL)}
+            for (person_id,) in snapshot.execute_sql(_PLAN_EXISTING_PERSONS_SQL):
+                person_rows.setdefault(person_id, 0)
+            days = sorted(day for (day,) in snapshot.execute_sql(_PLAN_DAYS_SQL))
+
+        person_total = day_total = batch_count = 0
+        for person_ids in _batches(sorted(person_rows.items()), REBUILD_BATCH_ROWS, REBUILD_BATCH_PERSONS):
+            person_total += db_instance.run_in_transaction(_rebuild_person_batch, person_ids)
+            batch_count += 1
+        for day_batch in _batches([(day, 1) for day in days], REBUILD_BATCH_DAYS, REBUILD_BATCH_DAYS):
+            day_total += db_instance.run_in_transaction(_rebuild_day_batch, day_batch)
+            batch_count += 1
+        print(f"Sentiment rollups rebuilt: {person_total} person-day rows, {day_total} global day rows in {batch_count} transactions.")
+        return True
+    except Exception as e:
+        print(f"ERROR during sentiment rollup rebuild: {type(e).__name__} - {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+# --- Read Helpers ---
+
+def summarize_rollup_rows(rows):
+    """
+    Converts daily rollup rows into a JSON-friendly summary.
+
+    Returns:
+        dict: {"totals": {positive, neutral, negative, total}, "days": [...]}
+    """
+    totals = {sentiment: 0 for sentiment in SENTIMENTS}
+    days = []
+    for row in rows:
+        day = dict(row)
+        if hasattr(day["day"], "isoformat"):
+            day["day"] = day["day"].isoformat()
+        for sentiment in SENTIMENTS:
+            day[sentiment] = int(day[sentiment] or 0)
+            totals[sentiment] += day[sentiment]
+        days.append(day)
+    totals["total"] = sum(totals[sentiment] for sentiment in SENTIMENTS)
+    return {"totals": totals, "days": days}
@@ -5,6 +5,10 @@ from dateutil import parser as dateutil_parser
 import time
 
 from google.cloud import spanner
+from sentiment_rollups import rebuild_sentiment_rollups
+from friend_suggestions import refresh_friend_suggestions
+from graph_schema import social_graph_ddl
+from time_shards import time_shard_column_ddl, time_sharded_index_ddl
 from google.api_core import exceptions
 
 # --- Configuration ---
@@ -67,7 +71,14 @@ def run_ddl_statements(db_instance, ddl_list, operation_description):
         return False
 
 def setup_base_schema_and_indexes(db_instance):
-    """Creates the base relational tables and associated indexes."""
+    """
+    Creates the base relational tables and associated indexes (schema v2).
+
+    Per-person and per-event child rows are interleaved with their parent
+    row, and the feed/profile/event indexes store the columns those pages
+    read. These statements are IF NOT EXISTS, so they leave an existing v1
+    database as it is; upgrade one with migrate_schema_v2.py.
+    """
     ddl_statements = [
         # --- 1. Base Tables (No Graph Definition Here) ---
         """
@@ -75,41 +86,50 @@ def setup_base_schema_and_indexes(db_instance):
             person_id STRING(36) NOT NULL,
             name STRING(MAX),
             age INT64,
+            post_count INT64 NOT NULL DEFAULT (0),   -- Post + PostArchive rows; `jobs.py reconcile-counters`
+            friend_count INT64 NOT NULL DEFAULT (0), -- Friendship rows under either person
             create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
         ) PRIMARY KEY (person_id)
         """,
-        """
+        f"""
         CREATE TABLE IF NOT EXISTS Event (
             event_id STRING(36) NOT NULL,
             name STRING(MAX),
             description STRING(MAX), -- New field
             event_date TIMESTAMP,
-            create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+            attendee_count INT64 NOT NULL DEFAULT (0), -- Attendance rows; `jobs.py reconcile-counters`
+            create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true),
+            {time_shard_column_ddl("Event")}
         ) PRIMARY KEY (event_id)
         """,
-        """
+        f"""
         CREATE TABLE IF NOT EXISTS Post (
             post_id STRING(36) NOT NULL,
             author_id STRING(36) NOT NULL, -- References Person.person_id
+            author_name STRING(MAX),       -- Copy of Person.name; `jobs.py repair-author-names` after renames
             text STRING(MAX),
             sentiment STRING(50),
             post_timestamp TIMESTAMP,
-            create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+            create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true),
+            {time_shard_column_ddl("Post")}
         ) PRIMARY KEY (post_id)
         """,
-        """
+        f"""
         CREATE TABLE IF NOT EXISTS Friendship (
             person_id_a STRING(36) NOT NULL, -- References Person.person_id
             person_id_b STRING(36) NOT NULL, -- References Person.person_id
-            friendship_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+            friendship_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true),
+            {time_shard_column_ddl("Friendship")}
         ) PRIMARY KEY (person_id_a, person_id_b)
-        """,
-         """
+        """, # Top-level: interleaving needs the key to start with person_id; FriendshipByPersonB serves the other side
+         f"""
         CREATE TABLE IF NOT EXISTS Attendance (
             person_id STRING(36) NOT NULL, -- References Person.person_id
             event_id STRING(36) NOT NULL,  -- References Event.event_id
-            attendance_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
-        ) PRIMARY KEY (person_id, event_id)
+            attendance_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true),
+            {time_shard_column_ddl("Attendance")}
+        ) PRIMARY KEY (person_id, event_id),
+          INTERLEAVE IN PARENT Person ON DELETE CASCADE
         """,
         """
         CREATE TABLE IF NOT EXISTS Mention (
@@ -136,17 +156,98 @@ def setup_base_schema_and_indexes(db_instance):
             create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true),
             CONSTRAINT FK_Event FOREIGN KEY (event_id) REFERENCES Event (event_id),
             CONSTRAINT FK_Location FOREIGN KEY (location_id) REFERENCES Location (location_id)
-        ) PRIMARY KEY (event_id, location_id)
+        ) PRIMARY KEY (event_id, location_id),
+          INTERLEAVE IN PARENT Event ON DELETE CASCADE
         """,
-        # --- 2. Indexes ---
+        """
+        CREATE TABLE IF NOT EXISTS PostArchive (
+            post_id STRING(36) NOT NULL,
+            author_id STRING(36) NOT NULL, -- References Person.person_id
+            author_name STRING(MAX),       -- Copy of Person.name
+            text STRING(MAX),
+            sentiment STRING(50),
+            post_timestamp TIMESTAMP,
+            create_time TIMESTAMP NOT NULL,  -- Copied from Post
+            archive_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+        ) PRIMARY KEY (post_id)
+        """, # Cold tier: posts moved out of Post by `jobs.py archive-posts`
+        """
+        CREATE TABLE IF NOT EXISTS MentionArchive (
+            post_id STRING(36) NOT NULL,            -- References PostArchive.post_id
+            mentioned_person_id STRING(36) NOT NULL,-- References Person.person_id
+            mention_time TIMESTAMP NOT NULL         -- Copied from Mention
+        ) PRIMARY KEY (post_id, mentioned_person_id),
+          INTERLEAVE IN PARENT PostArchive ON DELETE CASCADE
+        """, # Mention rows of archived posts, moved with them
+        # --- 2. Rollup Tables (maintained by the app, rebuildable from Post) ---
+        """
+        CREATE TABLE IF NOT EXISTS PersonSentimentDaily (
+            person_id STRING(36) NOT NULL, -- References Person.person_id
+            day DATE NOT NULL,             -- UTC day of Post.post_timestamp
+            positive_count INT64 NOT NULL,
+            neutral_count INT64 NOT NULL,
+            negative_count INT64 NOT NULL,
+            update_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+        ) PRIMARY KEY (person_id, day DESC),
+          INTERLEAVE IN PARENT Person ON DELETE CASCADE
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS SentimentDaily (
+            day DATE NOT NULL,
+            shard INT64 NOT NULL,          -- Spreads concurrent posts over several rows per day
+            positive_count INT64 NOT NULL,
+            neutral_count INT64 NOT NULL,
+            negative_count INT64 NOT NULL,
+            update_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+        ) PRIMARY KEY (day DESC, shard)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS FriendSuggestion (
+            person_id STRING(36) NOT NULL,           -- References Person.person_id
+            rank INT64 NOT NULL,                     -- 0 = best suggestion
+            suggested_person_id STRING(36) NOT NULL, -- References Person.person_id
+            score FLOAT64 NOT NULL,
+            mutual_friends INT64 NOT NULL,
+            shared_events INT64 NOT NULL,
+            compute_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+        ) PRIMARY KEY (person_id, rank),
+          INTERLEAVE IN PARENT Person ON DELETE CASCADE
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS JobState (
+            job_name STRING(MAX) NOT NULL,
+            watermark TIMESTAMP,                     -- Newest source commit timestamp processed
+            update_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+        ) PRIMARY KEY (job_name)
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS Outbox (
+            outbox_id STRING(36) NOT NULL,
+            topic STRING(64) NOT NULL,     -- "post", "event"
+            payload STRING(MAX) NOT NULL,  -- JSON
+            origin STRING(64),             -- Replica that made the write
+            create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true),
+            {time_shard_column_ddl("Outbox")}
+        ) PRIMARY KEY (outbox_id),
+          ROW DELETION POLICY (OLDER_THAN(create_time, INTERVAL 7 DAY))
+        """, # Written with each post/event; read by every replica's outbox dispatcher
+        # --- 3. Indexes ---
         "CREATE INDEX IF NOT EXISTS PersonByName ON Person(name)",
-        "CREATE INDEX IF NOT EXISTS EventByDate ON Event(event_date DESC)",
-        "CREATE INDEX IF NOT EXISTS PostByTimestamp ON Post(post_timestamp DESC)",
-        "CREATE INDEX IF NOT EXISTS PostByAuthor ON Post(author_id, post_timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS EventByDate ON Event(event_date DESC) STORING (name, attendee_count)", # Events panel
+        "CREATE INDEX IF NOT EXISTS PostByTimestamp ON Post(post_timestamp DESC) STORING (author_id, author_name, text, sentiment)", # Home feed
+        "CREATE INDEX IF NOT EXISTS PostByAuthor ON Post(author_id, post_timestamp DESC) STORING (author_name, text, sentiment)", # Profile posts
+        "CREATE INDEX IF NOT EXISTS PostArchiveByTimestamp ON PostArchive(post_timestamp DESC) STORING (author_id, author_name, text, sentiment)", # Feed pages past the archive boundary
+        "CREATE INDEX IF NOT EXISTS PostArchiveByAuthor ON PostArchive(author_id, post_timestamp DESC) STORING (author_name, text, sentiment)",
+        time_sharded_index_ddl("PostByShardCreateTime"), # Search index catch-up, /api/changes
+        time_sharded_index_ddl("EventByShardCreateTime"), # /api/changes range scans
+        time_sharded_index_ddl("AttendanceByShardTime"), # /api/changes range scans
         "CREATE INDEX IF NOT EXISTS FriendshipByPersonB ON Friendship(person_id_b, person_id_a)",
+        time_sharded_index_ddl("FriendshipByShardTime"), # Social graph refresh by commit timestamp
         "CREATE INDEX IF NOT EXISTS AttendanceByEvent ON Attendance(event_id, person_id)",
         "CREATE INDEX IF NOT EXISTS MentionByPerson ON Mention(mentioned_person_id, post_id)",
+        "CREATE INDEX IF NOT EXISTS MentionArchiveByPerson ON MentionArchive(mentioned_person_id, post_id)",
         "CREATE INDEX IF NOT EXISTS EventLocationByLocationId ON EventLocation(location_id, event_id)", # Index for linking table
+        time_sharded_index_ddl("OutboxByShardCreateTime"), # Outbox dispatch
 
     ]
     return run_ddl_statements(db_instance, ddl_statements, "Create Base Tables and Indexes")
@@ -158,39 +259,7 @@ def setup_graph_definition(db_instance):
     ddl_statements = [
         # --- Create the Property Graph Definition (Using SOURCE/DESTINATION) ---
         # "DROP PROPERTY GRAPH IF EXISTS SocialGraph", # Optional for dev
-        """
-        CREATE PROPERTY GRAPH IF NOT EXISTS SocialGraph
-          NODE TABLES (
-            Person KEY (person_id),
-            Event KEY (event_id),
-            Post KEY (post_id),
-            Location KEY (location_id) -- New Node Table
-          )
-          EDGE TABLES (
-            Friendship 
-              SOURCE KEY (person_id_a) REFERENCES Person (person_id)
-              DESTINATION KEY (person_id_b) REFERENCES Person (person_id),
-
-            
-            Attendance AS Attended 
-              SOURCE KEY (person_id) REFERENCES Person (person_id)
-              DESTINATION KEY (event_id) REFERENCES Event (event_id),
-
-            
-            Mention AS Mentioned
-              SOURCE KEY (post_id) REFERENCES Post (post_id)
-              DESTINATION KEY (mentioned_person_id) REFERENCES Person (person_id),
-
-            
-            Post AS Wrote 
-              SOURCE KEY (author_id) REFERENCES Person (person_id)
-              DESTINATION KEY (post_id) REFERENCES Post (post_id),
-
-            EventLocation AS HasLocation -- New Edge Table
-              SOURCE KEY (event_id) REFERENCES Event (event_id)
-              DESTINATION KEY (location_id) REFERENCES Location (location_id)
-          )
-        """
+        social_graph_ddl(),
     ]
     return run_ddl_statements(db_instance, ddl_statements, "Create Property Graph Definition")
 
@@ -592,6 +661,7 @@ def insert_relational_data(db_instance):
             posts_rows.append({
                 "post_id": post_id,
                 "author_id": author_id,
+                "author_name": person_name,
                 "text": post_info.get("text"),
                 "sentiment": post_info.get("sentiment"), # Use .get for safety
                 "post_timestamp": post_timestamp,
@@ -615,6 +685,14 @@ def insert_relational_data(db_instance):
 
     print(f"Prepared {len(posts_rows)} post rows, {len(mention_rows)} mention rows, {len(locations_rows)} location rows, and {len(event_locations_rows)} event-location link rows.")
 
+    # Maintained counters start out matching the rows inserted with them
+    for person_row in people_rows:
+        person_id = person_row["person_id"]
+        person_row["post_count"] = sum(1 for row in posts_rows if row["author_id"] == person_id)
+        person_row["friend_count"] = sum(1 for row in friendship_rows if person_id in (row["person_id_a"], row["person_id_b"]))
+    for event_row in events_rows:
+        event_row["attendee_count"] = sum(1 for row in attendance_rows if row["event_id"] == event_row["event_id"])
+
 
 
     # --- 6. Insert Data into Spanner using a Transaction ---
@@ -626,10 +704,10 @@ def insert_relational_data(db_instance):
         total_rows_attempted = 0
         # Define structure: Table Name -> (Columns List, Rows Data List of Dicts)
         table_map = {
-            "Person": (["person_id", "name", "age", "create_time"], people_rows),
-            "Event": (["event_id", "name", "description", "event_date", "create_time"], events_rows),
+            "Person": (["person_id", "name", "age", "post_count", "friend_count", "create_time"], people_rows),
+            "Event": (["event_id", "name", "description", "event_date", "attendee_count", "create_time"], events_rows),
             "Location": (["location_id", "name", "description", "latitude", "longitude", "address", "create_time"], locations_rows),
-            "Post": (["post_id", "author_id", "text", "sentiment", "post_timestamp", "create_time"], posts_rows),
+            "Post": (["post_id", "author_id", "author_name", "text", "sentiment", "post_timestamp", "create_time"], posts_rows),
             "Friendship": (["person_id_a", "person_id_b", "friendship_time"], friendship_rows),
             "Attendance": (["person_id", "event_id", "attendance_time"], attendance_rows),
             "Mention": (["post_id", "mentioned_person_id", "mention_time"], mention_rows),
@@ -722,6 +800,14 @@ if __name__ == "__main__":
         print("\nScript finished with errors during data insertion.")
         exit(1)
 
+    # --- Step 4: Build rollups derived from the inserted data ---
+    if not rebuild_sentiment_rollups(database):
+        print("\nScript finished with errors while building sentiment rollups.")
+        exit(1)
+    if not refresh_friend_suggestions(database, full=True):
+        print("\nScript finished with errors while computing friend suggestions.")
+        exit(1)
+
     end_time = time.time()
     print("\n-----------------------------------------")
     print("Script finished successfully!")
@@ -0,0 +1,358 @@
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from search_index import tokenize
+
+
+# --- Similarity Configuration ---
+SIMILARITY_DIM = int(os.environ.get("SIMILARITY_DIM", "4096"))  # Hashed feature buckets
+SIMILARITY_REFRESH_SECONDS = float(os.environ.get("SIMILARITY_REFRESH_SECONDS", "30"))
+# IDF weights are recomputed (and every row reweighted) once the number of
+# posts has grown by this fraction since they were last computed
+SIMILARITY_IDF_GROWTH = float(os.environ.get("SIMILARITY_IDF_GROWTH", "0.1"))
+
+_INITIAL_ROWS = 64
+_INITIAL_NNZ = 1024
+
+
+def _bucket(token, dim):
+    # crc32 is stable across processes, unlike the built-in str hash
+    return zlib.crc32(token.encode("utf-8")) % dim
+
+
+def _grow(array, size):
+    """Returns `array`, or a copy at least twice as large if it is shorter than size."""
+    if size <= array.shape[0]:
+        return array
+    grown = np.zeros(max(size, array.shape[0] * 2), dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+def _weigh(counts, indices, idf):
+    """TF-IDF weights for one row's terms, L2-normalised."""
+    values = counts * idf[indices]
+    norm = np.linalg.norm(values)
+    return values / norm if norm else values
+
+
+class _SparseRows:
+    """
+    Sparse rows in CSR layout whose arrays grow by doubling, so rows can be
+    appended cheaply and queried as a scipy CSR matrix without copying.
+
+    Each row keeps its raw term counts (`tf`) next to its TF-IDF weighted,
+    L2-normalised values (`data`). Rows are never resized in place: a row
+    whose terms change is retired (its values zeroed) and appended again.
+    Retired rows are compacted away once they outnumber the live ones.
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.indptr = np.zeros(_INITIAL_ROWS + 1, dtype=np.int32)
+        self.indices = np.zeros(_INITIAL_NNZ, dtype=np.int32)
+        self.tf = np.zeros(_INITIAL_NNZ, dtype=np.float32)
+        self.data = np.zeros(_INITIAL_NNZ, dtype=np.float32)
+        self.alive = np.zeros(_INITIAL_ROWS, dtype=bool)
+        self.rows = 0
+        self.retired = 0
+
+    def _span(self, row):
+        return int(self.indptr[row]), int(self.indptr[row + 1])
+
+    def append(self, indices, counts, idf):
+        start = int(self.indptr[self.rows])
+        end = start + len(indices)
+        self.indptr = _grow(self.indptr, self.rows + 2)
+        self.alive = _grow(self.alive, self.rows + 1)
+        self.indices = _grow(self.indices, end)
+        self.tf = _grow(self.tf, end)
+        self.data = _grow(self.data, end)
+        self.indices[start:end] = indices
+        self.tf[start:end] = counts
+        self.data[start:end] = _weigh(counts, indices, idf)
+        self.alive[self.rows] = True
+        self.rows += 1
+        self.indptr[self.rows] = end
+        return self.rows - 1
+
+    def retire(self, row):
+        start, end = self._span(row)
+        self.tf[start:end] = 0.0
+        self.data[start:end] = 0.0
+        self.alive[row] = False
+        self.retired += 1
+
+    def terms(self, row):
+        start, end = self._span(row)
+        return self.indices[start:end].copy(), self.tf[start:end].copy()
+
+    def dense_row(self, row):
+        start, end = self._span(row)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        vector[self.indices[start:end]] = self.data[start:end]
+        return vector
+
+    def _row_of_entries(self, nnz):
+        return np.repeat(np.arange(self.rows), np.diff(self.indptr[:self.rows + 1]))[:nnz]
+
+    def reweight(self, idf):
+        """Recomputes every row's weighted values from its counts, O(nnz)."""
+        nnz = int(self.indptr[self.rows])
+        values = self.tf[:nnz] * idf[self.indices[:nnz]]
+        rows_of = self._row_of_entries(nnz)
+        norms = np.sqrt(np.bincount(rows_of, weights=values * values, minlength=self.rows)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        self.data[:nnz] = values / norms[rows_of]
+
+    def compact(self):
+        """
+        Drops retired rows.
+
+        Returns:
+            np.ndarray: The old row number of each remaining row, in order.
+        """
+        nnz = int(self.indptr[self.rows])
+        live = np.flatnonzero(self.alive[:self.rows])
+        keep = self.alive[self._row_of_entries(nnz)]
+        lengths = np.diff(self.indptr[:self.rows + 1])[live]
+        self.indices = self.indices[:nnz][keep].copy()
+        self.tf = self.tf[:nnz][keep].copy()
+        self.data = self.data[:nnz][keep].copy()
+        self.indptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int32)
+        self.rows = len(live)
+        self.alive = np.ones(self.rows, dtype=bool)
+        self.retired = 0
+        return live
+
+    def matrix(self):
+        nnz = int(self.indptr[self.rows])
+        return sparse.csr_matrix(
+            (self.data[:nnz], self.indices[:nnz], self.indptr[:self.rows + 1]),
+            shape=(self.rows, self.dim), copy=False,
+        )
+
+
+class SimilarityEngine:
+    """
+    Hashed TF-IDF vectors for posts and people, kept as sparse CSR rows.
+
+    Every post becomes a row of term counts over SIMILARITY_DIM hashed buckets;
+    every person's row is the sum of their posts. Rows are stored already
+    weighted and L2-normalised, so a "top-k similar" lookup is one sparse
+    matrix-vector product.
+
+    A new post appends its own row and replaces its author's row; nothing
+    else is touched. IDF weights are held fixed between posts and recomputed
+    for all rows, in O(nnz), once the post count has grown by
+    SIMILARITY_IDF_GROWTH, which keeps the cost per post amortized O(1).
+    """
+
+    def __init__(self, dim=SIMILARITY_DIM):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock() # One Spanner catch-up at a time
+        self._reset()
+
+    def _reset(self):
+        self.post_rows = _SparseRows(self.dim)
+        self.post_ids = []
+        self.post_index = {}      # post_id -> row
+        self.posts = []           # row -> {post_id, author_id, author_name, text}
+        self.person_rows = _SparseRows(self.dim)
+        self.person_ids = []      # row -> person_id (None once the row is retired)
+        self.person_index = {}    # person_id -> row
+        self.person_names = {}    # person_id -> name
+        self.df = np.zeros(self.dim, dtype=np.float32)
+        self.idf = np.ones(self.dim, dtype=np.float32)
+        self.idf_posts = 0        # number of posts the IDF weights were computed from
+        self.watermark = None     # newest Post.create_time loaded from Spanner (ISO string)
+        self.loaded = False
+        self.last_refresh = 0.0
+
+    # --- Updates ---
+
+    def _terms(self, text):
+        """Returns (bucket indices, counts) for a piece of text, indices ascending."""
+        counts = Counter(_bucket(token, self.dim) for token in tokenize(text))
+        indices = np.array(sorted(counts), dtype=np.int32)
+        return indices, np.array([counts[i] for i in indices], dtype=np.float32)
+
+    def vectorize(self, text):
+        """Returns the hashed term-count vector for a piece of text."""
+        indices, counts = self._terms(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        vector[indices] = counts
+        return vector
+
+    def _add(self, post):
+        post_id = post.get("post_id")
+        author_id = post.get("author_id")
+        if not post_id or not author_id:
+            return
+        indices, counts = self._terms(post.get("text"))
+        with self._lock:
+            if post_id in self.post_index:
+                return
+            self.post_index[post_id] = self.post_rows.append(indices, counts, self.idf)
+            self.post_ids.append(post_id)
+            self.posts.append({
+                "post_id": post_id,
+                "author_id": author_id,
+                "author_name": post.get("author_name"),
+                "text": post.get("text"),
+            })
+            self.df[indices] += 1.0
+
+            old_row = self.person_index.get(author_id)
+            if old_row is not None:
+                old_indices, old_counts = self.person_rows.terms(old_row)
+                indices, inverse = np.unique(np.concatenate((old_indices, indices)), return_inverse=True)
+                counts = np.bincount(inverse, weights=np.concatenate((old_counts, counts))).astype(np.float32)
+                self.person_rows.retire(old_row)
+                self.person_ids[old_row] = None
+            self.person_index[author_id] = self.person_rows.append(indices, counts, self.idf)
+            self.person_ids.append(author_id)
+            if post.get("author_name"):
+                self.person_names[author_id] = post.get("author_name")
+            if self.person_rows.retired > self.person_rows.rows // 2:
+                self._compact_people()
+
+    def _compact_people(self):
+        old_rows = self.person_rows.compact()
+        self.person_ids = [self.person_ids[row] for row in old_rows]
+        self.person_index = {person_id: row for row, person_id in enumerate(self.person_ids)}
+
+    def _maybe_refresh_idf(self):
+        with self._lock:
+            n_posts = len(self.post_ids)
+            if n_posts <= self.idf_posts * (1.0 + SIMILARITY_IDF_GROWTH):
+                return
+            self.idf = (np.log((1.0 + n_posts) / (1.0 + self.df)) + 1.0).astype(np.float32)
+            self.idf_posts = n_posts
+            self.post_rows.reweight(self.idf)
+            self.person_rows.reweight(self.idf)
+
+    def add_post(self, post):
+        """
+        Adds a post and folds it into its author's vector.
+        Posts already in the engine are ignored.
+        """
+        self._add(post)
+        self._maybe_refresh_idf()
+
+    def load_rows(self, rows):
+        """Adds rows from the Post table and advances the watermark."""
+        count = 0
+        with self._lock:
+            for row in rows:
+                self._add(row)
+                create_time = row.get("create_time")
+                create_time = create_time.isoformat() if hasattr(create_time, "isoformat") else create_time
+                if create_time and (self.watermark is None or create_time > self.watermark):
+                    self.watermark = create_time
+                count += 1
+            self._maybe_refresh_idf()
+        return count
+
+    def ensure_current(self, fetch_posts_since):
+        """
+        Loads the engine on first use and periodically catches up with new posts.
+
+        Args:
+            fetch_posts_since (callable): fetch_posts_since(watermark) returns the
+                Post rows (with 'create_time') committed after the watermark,
+                or all posts when the watermark is None.
+        """
+        now = time.monotonic()
+        if self.loaded and now - self.last_refresh < SIMILARITY_REFRESH_SECONDS:
+            return
+        # Callers wait for the first load; after that, queries use the
+        # engine as it is while one caller catches up
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if self.loaded and now - self.last_refresh < SIMILARITY_REFRESH_SECONDS:
+                return
+            first_load = not self.loaded
+            rows = fetch_posts_since(self.watermark) or []
+            with self._lock:
+                self.load_rows(rows)
+                self.loaded = True
+                self.last_refresh = now
+        finally:
+            self._refresh_lock.release()
+        if first_load:
+            print(f"Similarity engine ready: {len(self.person_index)} people, {len(self.post_ids)} posts.")
+
+    # --- Queries ---
+
+    @staticmethod
+    def _top_k(scores, k, exclude=None):
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def similar_people(self, person_id, k=5):
+        """
+        Finds the people whose posts are most similar to this person's posts.
+
+        Returns:
+            list[dict]: [{person_id, name, score}], best match first. Empty if
+                        the person has not posted anything.
+        """
+        with self._lock:
+            row = self.person_index.get(person_id)
+            if row is None:
+                return []
+            scores = self.person_rows.matrix() @ self.person_rows.dense_row(row)
+            scores[~self.person_rows.alive[:self.person_rows.rows]] = -np.inf
+            return [
+                {
+                    "person_id": self.person_ids[i],
+                    "name": self.person_names.get(self.person_ids[i]),
+                    "score": round(float(scores[i]), 4),
+                }
+                for i in self._top_k(scores, k, exclude=row) if scores[i] > 0
+            ]
+
+    def similar_posts(self, post_id=None, text=None, k=5):
+        """
+        Finds the posts most similar to an existing post or to free text.
+
+        Returns:
+            list[dict]: [{post_id, author_id, author_name, text, score}], best
+                        match first.
+        """
+        with self._lock:
+            exclude = None
+            if post_id is not None:
+                exclude = self.post_index.get(post_id)
+                if exclude is None:
+                    return []
+                query = self.post_rows.dense_row(exclude)
+            else:
+                query = self.vectorize(text) * self.idf
+                norm = np.linalg.norm(query)
+                if norm == 0:
+                    return []
+                query = query / norm
+            scores = self.post_rows.matrix() @ query
+            results = []
+            for i in self._top_k(scores, k, exclude=exclude):
+                if scores[i] <= 0:
+                    continue
+                post = dict(self.posts[i])
+                post["score"] = round(float(scores[i]), 4)
+                results.append(post)
+            return results
@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+# --- Social Graph Configuration ---
+SOCIAL_GRAPH_REFRESH_SECONDS = float(os.environ.get("SOCIAL_GRAPH_REFRESH_SECONDS", "30"))
+# Pending (not yet compacted) edges kept beside the CSR arrays before a rebuild
+SOCIAL_GRAPH_COMPACT_EDGES = int(os.environ.get("SOCIAL_GRAPH_COMPACT_EDGES", "1024"))
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def _to_iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class SocialGraph:
+    """
+    Undirected friendship graph in compressed sparse row (CSR) form.
+
+    Friendship rows are stored once as (person_id_a, person_id_b) but are
+    friendships in both directions, so both arcs are added. Person ids are
+    mapped to dense integer indexes; neighbours of index i are
+    indices[indptr[i]:indptr[i + 1]], sorted, which makes friend lookups a
+    slice and mutual friends a sorted-array intersection.
+
+    New edges found by the Friendship.friendship_time watermark go into a
+    small overlay first and are folded into fresh CSR arrays once the
+    overlay grows past SOCIAL_GRAPH_COMPACT_EDGES.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock() # One Spanner catch-up at a time
+        self.ids = []              # index -> person_id
+        self.index = {}            # person_id -> index
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = _EMPTY
+        self._pending = {}         # index -> set of neighbour indexes not yet in CSR
+        self._pending_edges = 0
+        self.watermark = None      # newest Friendship.friendship_time loaded (ISO string)
+        self.loaded = False
+        self.last_refresh = 0.0
+
+    # --- Building ---
+
+    def _intern(self, person_id):
+        idx = self.index.get(person_id)
+        if idx is None:
+            idx = len(self.ids)
+            self.index[person_id] = idx
+            self.ids.append(person_id)
+        return idx
+
+    def _csr_edges(self):
+        counts = np.diff(self.indptr)
+        return np.repeat(np.arange(len(counts), dtype=np.int32), counts), self.indices
+
+    def _rebuild(self, src, dst):
+        n = len(self.ids)
+        if len(src):
+            # Dedupe arcs and sort by (src, dst) in one pass over a packed key
+            keys = np.unique(src.astype(np.int64) * n + dst.astype(np.int64))
+            src = (keys // n).astype(np.int32)
+            dst = (keys % n).astype(np.int32)
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.indptr[1:])
+        self.indices = dst.astype(np.int32)
+        self._pending = {}
+        self._pending_edges = 0
+
+    def _compact(self):
+        src, dst = self._csr_edges()
+        extra_src = [a for a, neighbours in self._pending.items() for _ in neighbours]
+        extra_dst = [b for neighbours in self._pending.values() for b in neighbours]
+        self._rebuild(
+            np.concatenate([src, np.asarray(extra_src, dtype=np.int32)]),
+            np.concatenate([dst, np.asarray(extra_dst, dtype=np.int32)]),
+        )
+
+    def load_rows(self, rows):
+        """
+        Adds Friendship rows (person_id_a, person_id_b, friendship_time) and
+        advances the watermark.
+        """
+        rows = list(rows)
+        with self._lock:
+            if not self.loaded:
+                pairs = [(self._intern(r["person_id_a"]), self._intern(r["person_id_b"])) for r in rows]
+                a = np.asarray([p[0] for p in pairs], dtype=np.int32)
+                b = np.asarray([p[1] for p in pairs], dtype=np.int32)
+                self._rebuild(np.concatenate([a, b]), np.concatenate([b, a]))
+            else:
+                for r in rows:
+                    a, b = self._intern(r["person_id_a"]), self._intern(r["person_id_b"])
+                    if a == b or b in self._csr_neighbours(a):
+                        continue
+                    if b not in self._pending.setdefault(a, set()):
+                        self._pending[a].add(b)
+                        self._pending.setdefault(b, set()).add(a)
+                        self._pending_edges += 1
+                if self._pending_edges > SOCIAL_GRAPH_COMPACT_EDGES:
+                    self._compact()
+            for r in rows:
+                ts = _to_iso(r.get("friendship_time"))
+                if ts and (self.watermark is None or ts > self.watermark):
+                    self.watermark = ts
+        return len(rows)
+
+    def ensure_current(self, fetch_friendships_since):
+        """
+        Builds the graph on first use and periodically applies new friendships.
+
+        Args:
+            fetch_friendships_since (callable): fetch_friendships_since(watermark)
+                returns Friendship rows committed after the watermark, or all
+                rows when the watermark is None.
+        """
+        now = time.monotonic()
+        if self.loaded and now - self.last_refresh < SOCIAL_GRAPH_REFRESH_SECONDS:
+            return
+        # Callers wait for the first load; after that, whoever gets here
+        # while a refresh is running reads the graph as it is.
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if self.loaded and now - self.last_refresh < SOCIAL_GRAPH_REFRESH_SECONDS:
+                return
+            first_load = not self.loaded
+            # Query Spanner without the graph lock, so friend queries aren't held up
+            rows = fetch_friendships_since(self.watermark) or []
+            with self._lock:
+                self.load_rows(rows)
+                self.loaded = True
+                self.last_refresh = now
+        finally:
+            self._refresh_lock.release()
+        if first_load:
+            print(f"Social graph ready: {len(self.ids)} people, {len(self.indices) // 2} friendships.")
+
+    # --- Queries (indexes) ---
+
+    def _csr_neighbours(self, idx):
+        if idx + 1 >= len(self.indptr):
+            return _EMPTY  # Person first seen after the last compaction
+        return self.indices[self.indptr[idx]:self.indptr[idx + 1]]
+
+    def _neighbours(self, idx):
+        csr = self._csr_neighbours(idx)
+        extra = self._pending.get(idx)
+        if not extra:
+            return csr
+        return np.union1d(csr, np.fromiter(extra, dtype=np.int32, count=len(extra)))
+
+    def _frontier_neighbours(self, frontier):
+        parts = [self._neighbours(i) for i in frontier]
+        return np.concatenate(parts) if parts else _EMPTY
+
+    # --- Queries (person ids) ---
+
+    def friends(self, person_id):
+        """Returns the person_ids of this person's friends."""
+        with self._lock:
+            idx = self.index.get(person_id)
+            if idx is None:
+                return []
+            return [self.ids[i] for i in self._neighbours(idx)]
+
+    def mutual_friends(self, person_id_a, person_id_b):
+        """Returns the person_ids that are friends with both people."""
+        with self._lock:
+            a, b = self.index.get(person_id_a), self.index.get(person_id_b)
+            if a is None or b is None:
+                return []
+            common = np.intersect1d(self._neighbours(a), self._neighbours(b), assume_unique=True)
+            return [self.ids[i] for i in common]
+
+    def neighborhood(self, person_id, k=2):
+        """
+        Breadth-first k-hop neighbourhood.
+
+        Returns:
+            dict[str, int]: person_id -> hop distance (1..k), excluding the person.
+        """
+        with self._lock:
+            start = self.index.get(person_id)
+            if start is None:
+                return {}
+            visited = np.zeros(len(self.ids), dtype=bool)
+            visited[start] = True
+            frontier = np.asarray([start], dtype=np.int32)
+            distances = {}
+            for hop in range(1, k + 1):
+                candidates = np.unique(self._frontier_neighbours(frontier))
+                frontier = candidates[~visited[candidates]]
+                if not len(frontier):
+                    break
+                visited[frontier] = True
+                for i in frontier:
+                    distances[self.ids[i]] = hop
+            return distances
+
+    def shortest_path(self, person_id_a, person_id_b, max_hops=6):
+        """
+        Shortest friendship chain between two people, both included.
+
+        Returns:
+            list[str] or None: The person_ids along the path, or None if the
+                               people are not connected within max_hops.
+        """
+        with self._lock:
+            a, b = self.index.get(person_id_a), self.index.get(person_id_b)
+            if a is None or b is None:
+                return None
+            if a == b:
+                return [person_id_a]
+            parent = np.full(len(self.ids), -1, dtype=np.int64)
+            parent[a] = a
+            frontier = [a]
+            for _ in range(max_hops):
+                next_frontier = []
+                for i in frontier:
+                    neighbours = self._neighbours(i)
+                    fresh = neighbours[parent[neighbours] == -1]
+                    parent[fresh] = i
+                    next_frontier.extend(fresh.tolist())
+                if parent[b] != -1:
+                    path = [b]
+                    while path[-1] != a:
+                        path.append(int(parent[path[-1]]))
+                    return [self.ids[i] for i in reversed(path)]
+                if not next_frontier:
+                    break
+                frontier = next_frontier
+            return None
@@ -0,0 +1,92 @@
+import threading
+import time
+import traceback
+
+
+class StaleWhileRevalidateCache:
+    """
+    Caches one computed value with two TTLs.
+
+    Younger than soft_ttl: served as is. Between soft_ttl and hard_ttl:
+    served immediately while a background thread recomputes it. Older than
+    hard_ttl (or never computed): the caller blocks on a fresh load, and gets
+    the old value if that load fails. Only one load runs at a time; blocked
+    callers share its result.
+    """
+
+    def __init__(self, name, loader, soft_ttl, hard_ttl):
+        self.name = name
+        self.loader = loader
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+        self._refreshing = False
+
+    def _age(self):
+        return None if self._loaded_at is None else time.monotonic() - self._loaded_at
+
+    def _load(self):
+        with self._load_lock:
+            return self._load_locked()
+
+    def _load_locked(self):
+        """Runs the loader and stores its result; the caller holds _load_lock."""
+        started = time.monotonic()
+        value = self.loader()
+        with self._lock:
+            # A concurrent blocking load may have finished first with newer data
+            if self._loaded_at is None or started >= self._loaded_at:
+                self._value = value
+                self._loaded_at = started
+        return value
+
+    def _refresh_in_background(self):
+        try:
+            self._load()
+        except Exception as e:
+            print(f"Background refresh of '{self.name}' failed, keeping stale value: {e}")
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get(self):
+        """Returns the cached value, refreshing or loading it as the TTLs require."""
+        with self._lock:
+            age = self._age()
+            if age is not None and age < self.soft_ttl:
+                return self._value
+            if age is not None and age < self.hard_ttl:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, daemon=True).start()
+                return self._value
+
+        # Missing or past the hard TTL: block, but let only one caller load
+        with self._load_lock:
+            with self._lock:
+                age = self._age()
+                if age is not None and age < self.hard_ttl:
+                    return self._value
+            try:
+                return self._load_locked()
+            except Exception as e:
+                with self._lock:
+                    if self._loaded_at is None:
+                        raise
+                    print(f"Loading '{self.name}' failed, serving the value from {self._age():.0f}s ago: {e}")
+                    return self._value
+
+    def mark_stale(self):
+        """Makes the next get() serve the current value and refresh it in the background."""
+        with self._lock:
+            if self._loaded_at is not None:
+                self._loaded_at = min(self._loaded_at, time.monotonic() - self.soft_ttl)
+
+    def status(self):
+        with self._lock:
+            age = self._age()
+            return {"age_seconds": round(age, 2) if age is not None else None, "refreshing": self._refreshing}
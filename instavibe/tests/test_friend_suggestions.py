@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import friend_suggestions as fs
+from social_graph import SocialGraph
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+WATERMARK = T0 + timedelta(days=10)
+
+
+def _tables(seed=3, n_people=150, n_friendships=220, n_attendance=200):
+    rng = random.Random(seed)
+    people = [f"u{i:03d}" for i in range(n_people)]
+    friendships = {}
+    while len(friendships) < n_friendships:
+        a, b = rng.sample(people, 2)
+        friendships[(min(a, b), max(a, b))] = T0 + timedelta(days=rng.randint(0, 11))
+    attendance = {
+        (rng.choice(people), f"e{rng.randrange(30)}"): T0 + timedelta(days=rng.randint(0, 11))
+        for _ in range(n_attendance)
+    }
+    return people, friendships, attendance
+
+
+class FakeSnapshot:
+    """Answers friend_suggestions' queries from in-memory tables."""
+
+    def __init__(self, friendships, attendance):
+        self.friendships = friendships
+        self.attendance = attendance
+        self.queries = []
+
+    def execute_sql(self, sql, params=None, param_types=None):
+        self.queries.append(sql)
+        if sql is fs._NEW_FRIENDSHIPS_SQL:
+            return [(a, b, ts) for (a, b), ts in self.friendships.items() if ts > params["watermark"]]
+        if sql is fs._NEW_ATTENDANCE_SQL:
+            return [(p, ts) for (p, _), ts in self.attendance.items() if ts > params["watermark"]]
+        if sql is fs._FRIENDSHIPS_OF_SQL:
+            ids = set(params["ids"])
+            return [(a, b) for a, b in self.friendships if a in ids] + [(a, b) for a, b in self.friendships if b in ids]
+        if sql is fs._ATTENDANCE_OF_SQL:
+            ids = set(params["ids"])
+            return [(p, e) for p, e in self.attendance if p in ids]
+        raise AssertionError(f"Unexpected query: {sql}")
+
+
+def _full(friendships, attendance):
+    graph = SocialGraph()
+    graph.load_rows({"person_id_a": a, "person_id_b": b} for a, b in friendships)
+    attended = {}
+    for person_id, event_id in attendance:
+        attended.setdefault(person_id, set()).add(event_id)
+    return graph, attended
+
+
+def test_score_candidates_counts_mutual_friends_and_shared_events():
+    graph = SocialGraph()
+    graph.load_rows({"person_id_a": a, "person_id_b": b} for a, b in [("me", "f1"), ("me", "f2"), ("f1", "c1"), ("f2", "c1"), ("f1", "c2")])
+    attended = {"me": {"e1", "e2"}, "c2": {"e1", "e2"}}
+    assert fs.score_candidates(graph, attended, "me") == [
+        ("c1", 2 * fs.MUTUAL_FRIEND_WEIGHT, 2, 0),
+        ("c2", fs.MUTUAL_FRIEND_WEIGHT + 2 * fs.SHARED_EVENT_WEIGHT, 1, 2),
+    ]
+
+
+def test_incremental_read_matches_a_full_computation():
+    _, friendships, attendance = _tables()
+    snapshot = FakeSnapshot(friendships, attendance)
+    graph, attended, affected, new_watermark, _ = fs._read_incremental(snapshot, WATERMARK)
+
+    full_graph, full_attended = _full(friendships, attendance)
+    new_friendships = [edge for edge, ts in friendships.items() if ts > WATERMARK]
+    new_attendance = {p for (p, _), ts in attendance.items() if ts > WATERMARK}
+    expected = set(new_attendance) | {p for edge in new_friendships for p in edge}
+    for a, b in new_friendships:
+        expected |= set(full_graph.friends(a)) | set(full_graph.friends(b))
+    for person_id in new_attendance:
+        expected |= set(full_graph.neighborhood(person_id, k=2))
+
+    assert affected == expected
+    assert new_watermark == max(list(friendships.values()) + list(attendance.values()))
+    for person_id in affected:
+        assert fs.score_candidates(graph, attended, person_id) == fs.score_candidates(full_graph, full_attended, person_id)
+
+
+def test_incremental_read_skips_the_full_tables_when_little_changed():
+    people, friendships, attendance = _tables(n_people=400, n_friendships=400, n_attendance=50)
+    latest = max(list(friendships.values()) + list(attendance.values()))
+    friendships[("u000", "u001")] = latest + timedelta(days=1)
+    snapshot = FakeSnapshot(friendships, attendance)
+    graph, _, affected, new_watermark, queries = fs._read_incremental(snapshot, latest)
+    assert new_watermark == latest + timedelta(days=1)
+    assert {"u000", "u001"} <= affected
+    assert len(graph.ids) < len(people) // 2
+    assert queries == len(snapshot.queries) - 2
+
+
+def test_nothing_new_reads_nothing_else():
+    _, friendships, attendance = _tables()
+    latest = max(list(friendships.values()) + list(attendance.values()))
+    snapshot = FakeSnapshot(friendships, attendance)
+    graph, attended, affected, new_watermark, queries = fs._read_incremental(snapshot, latest)
+    assert affected == set() and attended == {} and queries == 0
+    assert new_watermark == latest
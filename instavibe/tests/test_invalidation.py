@@ -0,0 +1,186 @@
+import json
+import threading
+
+from invalidation import (
+    LocalHubInvalidationBus, LocalInvalidationHub, RedisInvalidationBus, UdpInvalidationBus, _parse_versions,
+)
+
+
+def _recorder(bus, key, remote_only=False):
+    fired = []
+    bus.subscribe(key, fired.append, remote_only=remote_only)
+    return fired
+
+
+def test_invalidations_reach_the_other_replicas():
+    hub = LocalInvalidationHub()
+    a, b, c = (LocalHubInvalidationBus(hub) for _ in range(3))
+    fired = {bus: _recorder(bus, "feed") for bus in (a, b, c)}
+    a.invalidate("feed")
+    assert [len(fired[bus]) for bus in (a, b, c)] == [1, 1, 1]
+    assert b.versions == c.versions == a.versions == {"feed": {a.replica_id: 1}}
+
+
+def test_remote_only_handlers_skip_local_invalidations():
+    hub = LocalInvalidationHub()
+    a, b = LocalHubInvalidationBus(hub), LocalHubInvalidationBus(hub)
+    local_a, local_b = _recorder(a, "feed", remote_only=True), _recorder(b, "feed", remote_only=True)
+    a.invalidate("feed")
+    assert (local_a, local_b) == ([], ["feed"])
+
+
+def test_each_origin_is_compared_only_with_itself():
+    hub = LocalInvalidationHub()
+    a, b = LocalHubInvalidationBus(hub), LocalHubInvalidationBus(hub)
+    receiver = LocalHubInvalidationBus(LocalInvalidationHub()) # Not on the hub: messages are handed over by hand
+    fired = _recorder(receiver, "feed")
+    for _ in range(5):
+        a.invalidate("feed")
+    b.invalidate("feed")
+    # b's single invalidation has a lower counter than a's, and still counts
+    receiver._receive({"feed": {a.replica_id: 5}})
+    receiver._receive({"feed": {b.replica_id: 1}})
+    assert len(fired) == 2
+    assert receiver.versions == {"feed": {a.replica_id: 5, b.replica_id: 1}}
+
+
+def test_resync_fires_only_for_missed_invalidations():
+    hub = LocalInvalidationHub()
+    a = LocalHubInvalidationBus(hub)
+    receiver = LocalHubInvalidationBus(LocalInvalidationHub())
+    fired = _recorder(receiver, "feed")
+    other = _recorder(receiver, "trending")
+    a.invalidate("feed")
+    a.invalidate("trending")
+    receiver._receive({"feed": {a.replica_id: 1}}) # The "trending" message was lost
+    assert (len(fired), len(other)) == (1, 0)
+    full_map = a.status()["versions"]
+    receiver._receive(full_map)
+    assert (len(fired), len(other)) == (1, 1)
+    receiver._receive(full_map)
+    assert (len(fired), len(other)) == (1, 1)
+    # An old message arriving late changes nothing
+    receiver._receive({"feed": {a.replica_id: 1}})
+    assert len(fired) == 1
+
+
+def test_restarted_replica_counts_under_a_new_origin():
+    hub = LocalInvalidationHub()
+    a, b = LocalHubInvalidationBus(hub), LocalHubInvalidationBus(hub)
+    fired = _recorder(b, "feed")
+    for _ in range(3):
+        a.invalidate("feed")
+    restarted = LocalHubInvalidationBus(hub)
+    restarted.invalidate("feed")
+    assert len(fired) == 4
+
+
+def test_failing_handler_does_not_stop_the_others():
+    bus = LocalHubInvalidationBus(LocalInvalidationHub())
+    bus.subscribe("feed", lambda key: 1 / 0)
+    fired = _recorder(bus, "feed")
+    bus.invalidate("feed")
+    assert fired == ["feed"]
+
+
+def test_parse_versions():
+    assert _parse_versions(json.loads('{"feed": {"r1": 3, "r2": "4"}}')) == {"feed": {"r1": 3, "r2": 4}}
+
+
+def test_udp_buses_exchange_invalidations():
+    a = UdpInvalidationBus(bind="127.0.0.1:0", peers="", resync_seconds=60).start()
+    b = UdpInvalidationBus(bind="127.0.0.1:0", peers="", resync_seconds=60).start()
+    try:
+        a.peers, b.peers = [b.bind], [a.bind]
+        heard = threading.Event()
+        b.subscribe("feed", lambda key: heard.set())
+        a.invalidate("feed")
+        assert heard.wait(5)
+        assert b.versions == {"feed": {a.replica_id: 1}}
+    finally:
+        a.close()
+        b.close()
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels = []
+
+    def subscribe(self, channel):
+        self.channels.append(channel)
+
+    def listen(self):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.keys = []
+
+    def hincrby(self, name, key, amount):
+        self.keys.append((name, key, amount))
+
+    def execute(self):
+        results = []
+        for name, key, amount in self.keys:
+            table = self.client.hashes.setdefault(name, {})
+            table[key] = table.get(key, 0) + amount
+            results.append(table[key])
+        return results
+
+
+class FakeRedis:
+    """The hash, pipeline and pub/sub calls RedisInvalidationBus makes."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.published = []
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def hgetall(self, name):
+        return {key.encode("utf-8"): str(value).encode("utf-8") for key, value in self.hashes.get(name, {}).items()}
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub()
+
+
+def test_redis_versions_come_from_the_shared_hash():
+    client = FakeRedis()
+    a = RedisInvalidationBus(client=client, prefix="t", resync_seconds=60)
+    b = RedisInvalidationBus(client=client, prefix="t", resync_seconds=60)
+    fired = _recorder(b, "feed")
+    a.invalidate("feed")
+    a.invalidate("feed")
+    channel, message = client.published[-1]
+    assert channel == "t:events"
+    assert json.loads(message) == {"origin": a.replica_id, "versions": {"feed": {"redis": 2}}}
+    # The first message was lost; the second carries the newest version
+    b._receive(_parse_versions(json.loads(message)["versions"]))
+    assert len(fired) == 1
+    # Resync reads the hash back and finds nothing newer
+    b._receive(b._read_versions())
+    assert len(fired) == 1
+    assert b.versions == {"feed": {"redis": 2}}
+
+
+def test_redis_bus_starts_from_the_current_versions():
+    client = FakeRedis()
+    RedisInvalidationBus(client=client, prefix="t", resync_seconds=60).invalidate("feed")
+    late = RedisInvalidationBus(client=client, prefix="t", resync_seconds=60)
+    fired = _recorder(late, "feed")
+    late.start()
+    try:
+        late._receive(late._read_versions())
+        assert fired == []
+        assert late.versions == {"feed": {"redis": 1}}
+    finally:
+        late.close()
@@ -0,0 +1,172 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+from outbox import OutboxDispatcher
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeOutbox:
+    """The Outbox table, read the way get_outbox_messages_after_db reads it."""
+
+    def __init__(self):
+        self.messages = []
+        self.reads = []
+
+    def add(self, topic, seconds, outbox_id=None):
+        message = {
+            "outbox_id": outbox_id or f"m{len(self.messages):03d}", "topic": topic, "payload": {},
+            "origin": None, "create_time": T0 + timedelta(seconds=seconds),
+        }
+        self.messages.append(message)
+        return message
+
+    def fetch_messages_after(self, offset, limit):
+        self.reads.append(offset)
+        newer = sorted((m for m in self.messages if (m["create_time"], m["outbox_id"]) > offset),
+                       key=lambda m: (m["create_time"], m["outbox_id"]))
+        return newer[:limit]
+
+    def fetch_start_offset(self):
+        if not self.messages:
+            return (T0, "")
+        newest = max(self.messages, key=lambda m: (m["create_time"], m["outbox_id"]))
+        return (newest["create_time"], newest["outbox_id"])
+
+
+def _dispatcher(outbox, **kwargs):
+    kwargs.setdefault("poll_seconds", 0.01)
+    return OutboxDispatcher(outbox.fetch_messages_after, outbox.fetch_start_offset, **kwargs)
+
+
+def _ids(batches):
+    return [m["outbox_id"] for batch in batches for m in batch]
+
+
+def test_nothing_is_read_before_the_start_offset_is_known():
+    outbox = FakeOutbox()
+    outbox.add("post", 1)
+    dispatcher = _dispatcher(outbox)
+    dispatcher.subscribe("search", lambda messages: None)
+    assert dispatcher.dispatch_once() == 0
+    assert outbox.reads == []
+    assert dispatcher.status()["subscribers"]["search"]["offset"] is None
+
+
+def test_start_offset_skips_messages_committed_before_it():
+    outbox = FakeOutbox()
+    outbox.add("post", 1)
+    outbox.add("post", 2)
+    dispatcher = _dispatcher(outbox)
+    got = []
+    dispatcher.subscribe("search", got.append)
+    dispatcher._begin()
+    assert dispatcher.start_offset == (T0 + timedelta(seconds=2), "m001")
+    assert dispatcher.dispatch_once() == 0
+    outbox.add("post", 3)
+    assert dispatcher.dispatch_once() == 1
+    assert _ids(got) == ["m002"]
+    # Subscribers added later start where the dispatcher started
+    dispatcher.subscribe("late", lambda messages: None)
+    assert dispatcher.status()["subscribers"]["late"]["offset"] == (T0 + timedelta(seconds=2)).isoformat()
+
+
+def test_messages_sharing_a_commit_timestamp_are_ordered_by_id():
+    outbox = FakeOutbox()
+    dispatcher = _dispatcher(outbox, batch_size=2)
+    got = []
+    dispatcher.subscribe("search", got.append)
+    dispatcher._begin()
+    for outbox_id in ["c", "a", "b"]:
+        outbox.add("post", 1, outbox_id=outbox_id)
+    assert dispatcher.dispatch_once() == 2
+    assert dispatcher.dispatch_once() == 1
+    assert _ids(got) == ["a", "b", "c"]
+    assert dispatcher.dispatch_once() == 0
+
+
+def test_topic_filters():
+    outbox = FakeOutbox()
+    dispatcher = _dispatcher(outbox)
+    posts, everything = [], []
+    dispatcher.subscribe("posts", posts.append, topics=["post"])
+    dispatcher.subscribe("everything", everything.append)
+    dispatcher._begin()
+    outbox.add("event", 1)
+    outbox.add("post", 2)
+    assert dispatcher.dispatch_once() == 2
+    assert _ids(posts) == ["m001"]
+    assert _ids(everything) == ["m000", "m001"]
+    # Skipped topics still move the offset
+    assert dispatcher.status()["subscribers"]["posts"]["offset"] == (T0 + timedelta(seconds=2)).isoformat()
+
+
+def test_failing_subscriber_retries_while_others_advance():
+    outbox = FakeOutbox()
+    dispatcher = _dispatcher(outbox, max_attempts=3)
+    healthy, flaky = [], []
+
+    def flaky_handler(messages):
+        flaky.append(messages)
+        if len(flaky) < 3:
+            raise RuntimeError("unavailable")
+
+    dispatcher.subscribe("healthy", healthy.append)
+    dispatcher.subscribe("flaky", flaky_handler)
+    dispatcher._begin()
+    outbox.add("post", 1)
+    assert dispatcher.dispatch_once() == 0
+    assert dispatcher.status()["subscribers"]["flaky"]["failures"] == 1
+    outbox.add("post", 2)
+    assert dispatcher.dispatch_once() == 0
+    # The retry re-reads from the flaky subscriber's offset; the healthy one
+    # only gets what is past its own
+    assert _ids(healthy) == ["m000", "m001"]
+    assert _ids(flaky) == ["m000", "m000", "m001"]
+    assert dispatcher.dispatch_once() == 2
+    assert _ids(flaky[-1:]) == ["m000", "m001"]
+    status = dispatcher.status()["subscribers"]
+    assert status["flaky"] == {"offset": (T0 + timedelta(seconds=2)).isoformat(), "delivered": 2, "failures": 0}
+    assert status["healthy"]["delivered"] == 2
+
+
+def test_subscriber_skips_a_batch_after_max_attempts():
+    outbox = FakeOutbox()
+    dispatcher = _dispatcher(outbox, max_attempts=2)
+    attempts = []
+
+    def broken(messages):
+        attempts.append(messages)
+        raise RuntimeError("bug")
+
+    dispatcher.subscribe("broken", broken)
+    dispatcher._begin()
+    outbox.add("post", 1)
+    assert dispatcher.dispatch_once() == 0
+    assert dispatcher.dispatch_once() == 1
+    assert len(attempts) == 2
+    assert dispatcher.status()["subscribers"]["broken"] == {
+        "offset": (T0 + timedelta(seconds=1)).isoformat(), "delivered": 0, "failures": 0,
+    }
+    assert dispatcher.dispatch_once() == 0
+
+
+def test_dispatch_thread_begins_and_delivers():
+    outbox = FakeOutbox()
+    outbox.add("post", 1)
+    dispatcher = _dispatcher(outbox, poll_seconds=5)
+    delivered = threading.Event()
+    got = []
+    dispatcher.subscribe("search", lambda messages: got.extend(messages) or delivered.set())
+    dispatcher.start()
+    try:
+        for _ in range(200):
+            if dispatcher.start_offset is not None:
+                break
+            threading.Event().wait(0.01)
+        outbox.add("post", 2)
+        dispatcher.wake()
+        assert delivered.wait(5)
+        assert [m["outbox_id"] for m in got] == ["m001"]
+    finally:
+        dispatcher.close()
@@ -0,0 +1,122 @@
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("vertexai") # app imports the agent client at module load
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test-project")
+import app
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _post(post_id, author_id, minutes):
+    return {
+        "post_id": post_id, "author_id": author_id, "text": f"text {post_id}", "sentiment": None,
+        "post_timestamp": T0 + timedelta(minutes=minutes), "author_name": author_id,
+    }
+
+
+class FakeSnapshot:
+    """Answers POST_PAGE_SQL the way the Post and PostArchive indexes would."""
+
+    def __init__(self, tables, queries):
+        self.tables = tables
+        self.queries = queries
+
+    def execute_sql(self, sql, params=None, param_types=None, **kwargs):
+        table = re.search(r"FROM (\w+) AS p", sql).group(1)
+        self.queries.append((table, dict(params)))
+        rows = self.tables[table]
+        if "author_id" in params:
+            rows = [r for r in rows if r["author_id"] == params["author_id"]]
+        if "after_timestamp" in params:
+            after = (params["after_timestamp"], params["after_post_id"])
+            rows = [r for r in rows if r["post_timestamp"] < after[0]
+                    or (r["post_timestamp"] == after[0] and r["post_id"] > after[1])]
+        rows = sorted(rows, key=lambda r: r["post_id"])
+        rows = sorted(rows, key=lambda r: r["post_timestamp"], reverse=True)
+        return [[r[f] for f in app.POST_PAGE_FIELDS] for r in rows[:params["limit"]]]
+
+
+class FakeDatabase:
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+
+    @contextmanager
+    def snapshot(self, **kwargs):
+        yield FakeSnapshot(self.tables, self.queries)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    # Archived posts are all older than the hot ones; p3..p5 share a timestamp
+    hot = [_post("p1", "alice", 50), _post("p2", "bob", 40), _post("p5", "alice", 30),
+           _post("p3", "bob", 30), _post("p4", "alice", 30)]
+    archived = [_post("a2", "alice", 20), _post("a1", "bob", 20), _post("a3", "alice", 10)]
+    database = FakeDatabase({"Post": hot, app.ARCHIVE_TABLE: archived})
+    monkeypatch.setattr(app, "db", database)
+    return database
+
+
+def _all_pages(limit, author_id=None):
+    pages, cursor = [], None
+    while True:
+        posts, cursor = app.get_posts_page_db(cursor=cursor, limit=limit, author_id=author_id)
+        pages.append([p["post_id"] for p in posts])
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_both_tiers_in_order(database):
+    pages = _all_pages(limit=3)
+    assert pages == [["p1", "p2", "p3"], ["p4", "p5", "a1"], ["a2", "a3"]]
+
+
+def test_every_page_size_sees_each_post_once(database):
+    expected = ["p1", "p2", "p3", "p4", "p5", "a1", "a2", "a3"]
+    for limit in range(1, 10):
+        assert [post_id for page in _all_pages(limit) for post_id in page] == expected
+
+
+def test_cursor_inside_a_timestamp_tie(database):
+    first, cursor = app.get_posts_page_db(limit=3)
+    assert cursor == f"{(T0 + timedelta(minutes=30)).isoformat()}|p3"
+    second, _ = app.get_posts_page_db(cursor=cursor, limit=2)
+    assert [p["post_id"] for p in second] == ["p4", "p5"]
+
+
+def test_archive_continues_from_the_last_hot_post(database):
+    posts, _ = app.get_posts_page_db(cursor=app.encode_post_cursor(_post("p4", "alice", 30)), limit=3)
+    assert [p["post_id"] for p in posts] == ["p5", "a1", "a2"]
+    archive_params = [params for table, params in database.queries if table == app.ARCHIVE_TABLE][-1]
+    assert (archive_params["after_timestamp"], archive_params["after_post_id"]) == (T0 + timedelta(minutes=30), "p5")
+    assert archive_params["limit"] == 2
+
+
+def test_full_page_from_post_skips_the_archive(database):
+    app.get_posts_page_db(limit=2)
+    assert [table for table, _ in database.queries] == ["Post"]
+
+
+def test_author_filter(database):
+    assert _all_pages(limit=2, author_id="alice") == [["p1", "p4"], ["p5", "a2"], ["a3"]]
+
+
+def test_exact_fit_ends_with_an_empty_page(database):
+    # A full last page still hands out a cursor; the page after it is empty
+    assert _all_pages(limit=4) == [["p1", "p2", "p3", "p4"], ["p5", "a1", "a2", "a3"], []]
+
+
+@pytest.mark.parametrize("cursor", ["", "no-separator", "|p1", "2026-01-01T00:00:00+00:00|", "yesterday|p1"])
+def test_malformed_cursor(database, cursor):
+    with pytest.raises(ValueError):
+        app.decode_post_cursor(cursor)
+
+
+def test_cursor_round_trip():
+    post = _post("p1", "alice", 5)
+    assert app.decode_post_cursor(app.encode_post_cursor(post)) == (post["post_timestamp"], "p1")
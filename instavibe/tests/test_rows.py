@@ -0,0 +1,55 @@
+import json
+import pickle
+
+from rows import Row, copy_rows, json_default, row_factory
+
+
+def test_rows_behave_like_dicts():
+    row = row_factory(["post_id", "text"])(["p1", "hello"])
+    assert isinstance(row, Row)
+    assert row["post_id"] == "p1" and row.text == "hello"
+    assert dict(row) == {"post_id": "p1", "text": "hello"}
+    assert "text" in row and "missing" not in row
+    assert row.get("missing", 0) == 0
+    assert len(row) == 2 and list(row) == ["post_id", "text"]
+
+
+def test_rows_have_no_per_row_dict():
+    row = row_factory(["a", "b"])([1, 2])
+    assert not hasattr(row, "__dict__")
+
+
+def test_extra_keys_go_to_the_overflow_dict():
+    row = row_factory(["post_id"])(["p1"])
+    row["score"] = 0.5
+    assert dict(row) == {"post_id": "p1", "score": 0.5}
+    del row["score"]
+    del row["post_id"]
+    assert dict(row) == {}
+
+
+def test_copies_are_independent():
+    rows = [row_factory(["post_id"])(["p1"])]
+    rows[0]["extra"] = [1]
+    copies = copy_rows(rows)
+    copies[0]["post_id"] = "p2"
+    copies[0]["extra"] = [2]
+    assert dict(rows[0]) == {"post_id": "p1", "extra": [1]}
+
+
+def test_one_class_per_query_shape():
+    make = row_factory(["x", "y"])
+    assert make is row_factory(["x", "y"])
+    assert type(make([1, 2])) is type(make([3, 4]))
+
+
+def test_unslottable_columns_fall_back_to_dicts():
+    assert row_factory(["keys", "values"])([1, 2]) == {"keys": 1, "values": 2}
+    assert type(row_factory(["a", "a"])([1, 2])) is dict
+    assert type(row_factory(["not an identifier"])([1])) is dict
+
+
+def test_rows_serialize_as_plain_objects():
+    row = row_factory(["post_id", "text"])(["p1", "hi"])
+    assert json.loads(json.dumps({"row": row}, default=json_default)) == {"row": {"post_id": "p1", "text": "hi"}}
+    assert pickle.loads(pickle.dumps(row)) == {"post_id": "p1", "text": "hi"}
@@ -0,0 +1,136 @@
+import threading
+
+from search_index import PostSearchIndex, tokenize
+
+
+def _post(post_id, text, create_time="2026-01-01T00:00:00+00:00", post_timestamp=None):
+    return {"post_id": post_id, "text": text, "author_id": "a1", "author_name": "Alice",
+            "create_time": create_time, "post_timestamp": post_timestamp or create_time}
+
+
+def _index(tmp_path):
+    return PostSearchIndex(snapshot_path=str(tmp_path / "index.json.gz"))
+
+
+def test_tokenize_drops_punctuation_stopwords_and_possessives():
+    assert tokenize("Alice's trip to the Beach!") == ["alice", "trip", "beach"]
+
+
+def test_bm25_ranks_more_specific_matches_first(tmp_path):
+    index = _index(tmp_path)
+    index.load_rows([
+        _post("p1", "hiking trip in the mountains"),
+        _post("p2", "hiking hiking hiking"),
+        _post("p3", "dinner downtown"),
+    ])
+    results, total = index.search("hiking mountains")
+    assert total == 2
+    assert [r["post_id"] for r in results] == ["p1", "p2"]
+
+
+def test_add_post_replaces_and_remove_post_forgets(tmp_path):
+    index = _index(tmp_path)
+    index.add_post(_post("p1", "old words"))
+    index.add_post(_post("p1", "new words"))
+    assert index.search("old") == ([], 0)
+    assert [r["post_id"] for r in index.search("new")[0]] == ["p1"]
+    index.remove_post("p1")
+    assert len(index) == 0
+    assert index.search("words") == ([], 0)
+
+
+def test_snapshot_round_trip_keeps_docs_and_watermark(tmp_path):
+    index = _index(tmp_path)
+    index.load_rows([_post("p1", "sunset photos", create_time="2026-02-01T00:00:00+00:00")])
+    assert index.save_snapshot()
+    restored = _index(tmp_path)
+    assert restored.load_snapshot()
+    assert restored.watermark == "2026-02-01T00:00:00+00:00"
+    assert [r["post_id"] for r in restored.search("sunset")[0]] == ["p1"]
+
+
+def test_catch_up_reads_past_the_watermark(tmp_path):
+    index = _index(tmp_path)
+    seen = []
+
+    def fetch(watermark):
+        seen.append(watermark)
+        if watermark is None:
+            return [_post("p1", "first", create_time="2026-01-01T00:00:00+00:00")]
+        return [_post("p2", "second", create_time="2026-01-02T00:00:00+00:00")]
+
+    index.ensure_current(fetch)
+    index.last_refresh = float("-inf")
+    index.ensure_current(fetch)
+    assert seen == [None, "2026-01-01T00:00:00+00:00"]
+    assert len(index) == 2
+
+
+def test_search_is_not_blocked_by_a_running_refresh(tmp_path):
+    index = _index(tmp_path)
+    index.ensure_current(lambda watermark: [_post("p1", "coffee")])
+    index.last_refresh = float("-inf")
+    fetching, release = threading.Event(), threading.Event()
+
+    def slow_fetch(watermark):
+        fetching.set()
+        release.wait(5)
+        return [_post("p2", "coffee beans", create_time="2026-01-02T00:00:00+00:00")]
+
+    refresher = threading.Thread(target=index.ensure_current, args=(slow_fetch,))
+    refresher.start()
+    try:
+        assert fetching.wait(5)
+        # Another caller skips the refresh in progress and searches right away
+        index.ensure_current(slow_fetch)
+        done = threading.Event()
+        threading.Thread(target=lambda: (index.search("coffee"), done.set())).start()
+        assert done.wait(1), "search waited for the Spanner fetch"
+    finally:
+        release.set()
+        refresher.join(5)
+    assert len(index) == 2
+
+
+def test_first_load_blocks_other_callers_until_loaded(tmp_path):
+    index = _index(tmp_path)
+    fetching, release = threading.Event(), threading.Event()
+
+    def slow_fetch(watermark):
+        fetching.set()
+        release.wait(5)
+        return [_post("p1", "tea")]
+
+    first = threading.Thread(target=index.ensure_current, args=(slow_fetch,))
+    first.start()
+    assert fetching.wait(5)
+    second_done = threading.Event()
+    threading.Thread(target=lambda: (index.ensure_current(slow_fetch), second_done.set())).start()
+    assert not second_done.wait(0.2)
+    release.set()
+    first.join(5)
+    assert second_done.wait(5)
+    assert index.loaded and len(index) == 1
+
+
+def test_reconcile_removes_deleted_posts_but_keeps_ones_added_during_the_read(tmp_path):
+    index = _index(tmp_path)
+    index.load_rows([_post("p1", "kept"), _post("p2", "deleted")])
+
+    def fetch_post_ids():
+        # Indexed by the write path while the id read is running
+        index.add_post(_post("p3", "added meanwhile"))
+        return ["p1"]
+
+    assert index.reconcile(fetch_post_ids) == 1
+    assert sorted(index.doc_index) == ["p1", "p3"]
+
+
+def test_ensure_current_reconciles_after_loading_a_snapshot(tmp_path):
+    stale = _index(tmp_path)
+    stale.load_rows([_post("p1", "alive"), _post("p2", "deleted while down")])
+    stale.save_snapshot()
+
+    index = _index(tmp_path)
+    index.ensure_current(lambda watermark: [], fetch_post_ids=lambda: ["p1"])
+    assert sorted(index.doc_index) == ["p1"]
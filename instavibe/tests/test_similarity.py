@@ -0,0 +1,98 @@
+import random
+import threading
+
+import numpy as np
+
+from similarity import SimilarityEngine
+
+WORDS = "coffee hiking beach jazz pizza yoga chess sunset guitar museum".split()
+
+
+def _posts(n, people=12, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "post_id": f"p{i}", "author_id": f"u{rng.randrange(people)}", "author_name": None,
+            "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))),
+            "create_time": f"2026-01-01T00:00:{i % 60:02d}+00:00",
+        }
+        for i in range(n)
+    ]
+
+
+def _unit(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _brute_force_people(engine, posts, person_id):
+    counts = {}
+    for post in posts:
+        counts[post["author_id"]] = counts.get(post["author_id"], 0) + engine.vectorize(post["text"])
+    vectors = {pid: _unit(c * engine.idf) for pid, c in counts.items()}
+    scores = {pid: float(vectors[person_id] @ v) for pid, v in vectors.items() if pid != person_id}
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def test_similar_posts_match_brute_force_cosine():
+    engine = SimilarityEngine(dim=256)
+    posts = _posts(200)
+    for post in posts:
+        engine.add_post(post)
+    query = _unit(engine.vectorize("coffee jazz") * engine.idf)
+    expected = sorted(
+        ((p["post_id"], float(_unit(engine.vectorize(p["text"]) * engine.idf) @ query)) for p in posts),
+        key=lambda item: -item[1],
+    )
+    results = engine.similar_posts(text="coffee jazz", k=5)
+    assert [r["score"] for r in results] == [round(score, 4) for _, score in expected[:5]]
+
+
+def test_similar_people_match_brute_force_after_compactions():
+    engine = SimilarityEngine(dim=256)
+    posts = _posts(300)
+    # Added one at a time: author rows are retired and compacted many times
+    for post in posts:
+        engine.add_post(post)
+    assert engine.person_rows.rows == len(engine.person_index) + engine.person_rows.retired
+    expected = _brute_force_people(engine, posts, "u0")
+    results = engine.similar_people("u0", k=3)
+    assert [r["score"] for r in results] == [round(score, 4) for _, score in expected[:3]]
+
+
+def test_duplicate_posts_are_ignored():
+    engine = SimilarityEngine(dim=64)
+    post = {"post_id": "p1", "author_id": "u1", "text": "chess"}
+    engine.add_post(post)
+    engine.add_post(post)
+    assert len(engine.post_ids) == 1
+    assert engine.person_rows.terms(engine.person_index["u1"])[1].tolist() == [1.0]
+
+
+def test_queries_are_not_blocked_by_a_running_refresh():
+    engine = SimilarityEngine(dim=64)
+    engine.ensure_current(lambda watermark: _posts(20))
+    engine.last_refresh = float("-inf")
+    fetching, release = threading.Event(), threading.Event()
+
+    def slow_fetch(watermark):
+        fetching.set()
+        release.wait(5)
+        return []
+
+    refresher = threading.Thread(target=engine.ensure_current, args=(slow_fetch,))
+    refresher.start()
+    try:
+        assert fetching.wait(5)
+        done = threading.Event()
+
+        def query():
+            engine.ensure_current(slow_fetch)
+            engine.similar_people("u0")
+            done.set()
+
+        threading.Thread(target=query).start()
+        assert done.wait(1), "query waited for the Spanner fetch"
+    finally:
+        release.set()
+        refresher.join(5)
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, callers):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_for_waiters(flight, key, waiters):
+    for _ in range(500):
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters == waiters:
+                return
+        threading.Event().wait(0.01)
+    raise AssertionError("callers did not join the flight")
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["row"]
+
+    threads, results, errors = _run_concurrently(flight, "k", fn, callers=5)
+    assert started.wait(5)
+    _wait_for_waiters(flight, "k", 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1] and not errors
+    assert all(result is results[0][0] for result, _ in results)
+    assert all(shared for _, shared in results)
+    assert flight.in_flight() == 0
+
+
+def test_errors_are_shared_and_not_kept():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, results, errors = _run_concurrently(flight, "k", fail, callers=3)
+    assert started.wait(5)
+    _wait_for_waiters(flight, "k", 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert not results and len(errors) == 3
+    # The next call runs again instead of replaying the failure
+    assert flight.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_sequential_calls_are_not_shared():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == (1, False)
+    assert flight.do("k", lambda: 2) == (2, False)
+    with pytest.raises(KeyError):
+        flight.do("k", lambda: {}["missing"])
@@ -0,0 +1,149 @@
+import random
+import threading
+from collections import deque
+
+import social_graph
+from social_graph import SocialGraph
+
+
+def _edges(n_people=60, n_edges=150, seed=11):
+    rng = random.Random(seed)
+    people = [f"u{i}" for i in range(n_people)]
+    edges = set()
+    while len(edges) < n_edges:
+        a, b = rng.sample(people, 2)
+        edges.add((min(a, b), max(a, b)))
+    return sorted(edges)
+
+
+def _rows(edges, ts="2026-01-01T00:00:00+00:00"):
+    return [{"person_id_a": a, "person_id_b": b, "friendship_time": ts} for a, b in edges]
+
+
+def _adjacency(edges):
+    adjacency = {}
+    for a, b in edges:
+        adjacency.setdefault(a, set()).add(b)
+        adjacency.setdefault(b, set()).add(a)
+    return adjacency
+
+
+def _bfs(adjacency, start):
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        person = queue.popleft()
+        for friend in adjacency.get(person, ()):
+            if friend not in distances:
+                distances[friend] = distances[person] + 1
+                queue.append(friend)
+    return distances
+
+
+def _check_against_reference(graph, edges):
+    adjacency = _adjacency(edges)
+    for person in adjacency:
+        assert sorted(graph.friends(person)) == sorted(adjacency[person])
+        distances = _bfs(adjacency, person)
+        expected = {p: d for p, d in distances.items() if 1 <= d <= 2}
+        assert graph.neighborhood(person, k=2) == expected
+    people = sorted(adjacency)
+    for a, b in zip(people, reversed(people)):
+        assert sorted(graph.mutual_friends(a, b)) == sorted(adjacency[a] & adjacency[b])
+        distance = _bfs(adjacency, a).get(b)
+        path = graph.shortest_path(a, b, max_hops=10)
+        if distance is None:
+            assert path is None
+        else:
+            assert len(path) == distance + 1 and path[0] == a and path[-1] == b
+            assert all(y in adjacency[x] for x, y in zip(path, path[1:]))
+
+
+def test_bulk_load_matches_reference():
+    edges = _edges()
+    graph = SocialGraph()
+    graph.load_rows(_rows(edges))
+    _check_against_reference(graph, edges)
+
+
+def test_overlay_and_compaction_match_reference(monkeypatch):
+    monkeypatch.setattr(social_graph, "SOCIAL_GRAPH_COMPACT_EDGES", 8)
+    edges = _edges()
+    graph = SocialGraph()
+    graph.load_rows(_rows(edges[:50]))
+    graph.loaded = True
+    # New edges (and new people) arrive in small batches: some stay in the
+    # overlay, some are folded into the CSR arrays
+    extra = edges[50:] + [("u0", "newcomer"), ("newcomer", "u1")]
+    for start in range(0, len(extra), 5):
+        graph.load_rows(_rows(extra[start:start + 5]))
+        graph.load_rows(_rows(extra[start:start + 2])) # Repeats are ignored
+    assert graph._pending_edges <= 8
+    _check_against_reference(graph, edges + [("u0", "newcomer"), ("newcomer", "u1")])
+
+
+def test_unknown_people_have_no_friends_or_path():
+    graph = SocialGraph()
+    graph.load_rows(_rows([("a", "b")]))
+    assert graph.friends("nobody") == []
+    assert graph.mutual_friends("a", "nobody") == []
+    assert graph.neighborhood("nobody") == {}
+    assert graph.shortest_path("a", "nobody") is None
+
+
+def test_watermark_follows_the_newest_friendship():
+    graph = SocialGraph()
+    graph.load_rows(_rows([("a", "b")], ts="2026-01-02T00:00:00+00:00") + _rows([("b", "c")], ts="2026-01-01T00:00:00+00:00"))
+    assert graph.watermark == "2026-01-02T00:00:00+00:00"
+
+
+def test_reads_are_not_blocked_by_a_running_refresh():
+    graph = SocialGraph()
+    graph.ensure_current(lambda watermark: _rows([("a", "b")]))
+    graph.last_refresh = float("-inf")
+    fetching, release = threading.Event(), threading.Event()
+
+    def slow_fetch(watermark):
+        fetching.set()
+        release.wait(5)
+        return _rows([("a", "c")], ts="2026-01-02T00:00:00+00:00")
+
+    refresher = threading.Thread(target=graph.ensure_current, args=(slow_fetch,))
+    refresher.start()
+    try:
+        assert fetching.wait(5)
+        done = threading.Event()
+
+        def read():
+            graph.ensure_current(slow_fetch)
+            assert graph.friends("a") == ["b"]
+            done.set()
+
+        threading.Thread(target=read).start()
+        assert done.wait(1), "friend query waited for the Spanner fetch"
+    finally:
+        release.set()
+        refresher.join(5)
+    assert sorted(graph.friends("a")) == ["b", "c"]
+    assert graph.watermark == "2026-01-02T00:00:00+00:00"
+
+
+def test_first_load_blocks_other_callers_until_loaded():
+    graph = SocialGraph()
+    fetching, release = threading.Event(), threading.Event()
+
+    def slow_fetch(watermark):
+        fetching.set()
+        release.wait(5)
+        return _rows([("a", "b")])
+
+    first = threading.Thread(target=graph.ensure_current, args=(slow_fetch,))
+    first.start()
+    assert fetching.wait(5)
+    second_done = threading.Event()
+    threading.Thread(target=lambda: (graph.ensure_current(slow_fetch), second_done.set())).start()
+    assert not second_done.wait(0.2)
+    release.set()
+    first.join(5)
+    assert second_done.wait(5)
+    assert graph.friends("b") == ["a"]
@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+import swr_cache
+from swr_cache import StaleWhileRevalidateCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(swr_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_fresh_values_are_served_without_loading(clock):
+    loads = []
+    cache = StaleWhileRevalidateCache("t", lambda: loads.append(1) or len(loads), soft_ttl=10, hard_ttl=60)
+    assert cache.get() == 1
+    clock.now += 5
+    assert cache.get() == 1
+    assert loads == [1]
+
+
+def test_soft_expired_values_are_served_while_refreshing(clock):
+    release = threading.Event()
+    values = iter(["old", "new"])
+
+    def loader():
+        value = next(values)
+        if value == "new":
+            release.wait(5)
+        return value
+
+    cache = StaleWhileRevalidateCache("t", loader, soft_ttl=10, hard_ttl=60)
+    assert cache.get() == "old"
+    clock.now += 20
+    assert cache.get() == "old"           # Served at once; refresh runs in the background
+    assert cache.status()["refreshing"]
+    release.set()
+    for _ in range(500):
+        if not cache.status()["refreshing"]:
+            break
+        threading.Event().wait(0.01)
+    assert cache.get() == "new"
+
+
+def test_concurrent_cold_gets_run_one_load(clock):
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    cache = StaleWhileRevalidateCache("t", loader, soft_ttl=10, hard_ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert loads == [1]
+    assert results == ["value"] * 5
+
+
+def test_failed_hard_load_serves_the_old_value(clock):
+    outcomes = iter(["value", RuntimeError("spanner down")])
+
+    def loader():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    cache = StaleWhileRevalidateCache("t", loader, soft_ttl=10, hard_ttl=60)
+    assert cache.get() == "value"
+    clock.now += 120
+    assert cache.get() == "value"
+
+
+def test_failed_first_load_raises(clock):
+    def loader():
+        raise RuntimeError("spanner down")
+
+    cache = StaleWhileRevalidateCache("t", loader, soft_ttl=10, hard_ttl=60)
+    with pytest.raises(RuntimeError):
+        cache.get()
+
+
+def test_mark_stale_triggers_a_background_refresh(clock):
+    values = iter(["first", "second"])
+    cache = StaleWhileRevalidateCache("t", lambda: next(values), soft_ttl=10, hard_ttl=60)
+    assert cache.get() == "first"
+    cache.mark_stale()
+    cache.get()
+    for _ in range(500):
+        if not cache.status()["refreshing"]:
+            break
+        threading.Event().wait(0.01)
+    assert cache.get() == "second"
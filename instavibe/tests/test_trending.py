@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import trending
+from trending import TrendingEngine
+
+HOUR = 3600.0
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.now = T0.timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(trending.time, "time", clock)
+    return clock
+
+
+def _event(event_id, *location_ids):
+    return {
+        "event_id": event_id, "name": f"Event {event_id}", "event_date": None,
+        "locations": [{"location_id": l, "name": f"Place {l}"} for l in location_ids],
+    }
+
+
+def _engine(seed_rows=(), read_timestamp=None):
+    engine = TrendingEngine(half_life_seconds=HOUR, window_seconds=10 * HOUR)
+    engine.ensure_loaded(lambda since, reference, half_life: (list(seed_rows), read_timestamp or T0))
+    return engine
+
+
+def test_seed_is_read_once_with_the_engine_window(clock):
+    calls = []
+
+    def fetch(since, reference, half_life):
+        calls.append((since, reference, half_life))
+        return [dict(_event("e1", "l1"), weight=3.0)], T0 - timedelta(seconds=2)
+
+    engine = TrendingEngine(half_life_seconds=HOUR, window_seconds=10 * HOUR)
+    engine.ensure_loaded(fetch)
+    engine.ensure_loaded(fetch)
+    assert calls == [(T0 - timedelta(hours=10), T0, HOUR)]
+    # The read timestamp, not the local clock, marks what the seed covers
+    assert engine.seeded_at == (T0 - timedelta(seconds=2)).timestamp()
+    assert engine.top_events() == [{"event_id": "e1", "name": "Event e1", "event_date": None, "score": 3.0}]
+    assert [l["location_id"] for l in engine.top_locations()] == ["l1"]
+
+
+def test_attendance_covered_by_the_seed_is_ignored(clock):
+    engine = _engine(read_timestamp=T0 + timedelta(seconds=5))
+    engine.record_attendance(_event("e1"), at=T0 + timedelta(seconds=4))
+    engine.record_attendance(_event("e1"), at=T0 + timedelta(seconds=5))
+    assert engine.top_events() == []
+    engine.record_attendance(_event("e1"), at=T0 + timedelta(seconds=6))
+    assert [e["event_id"] for e in engine.top_events()] == ["e1"]
+
+
+def test_attendance_before_the_seed_is_ignored(clock):
+    engine = TrendingEngine(half_life_seconds=HOUR, window_seconds=10 * HOUR)
+    engine.record_attendance(_event("e1"))
+    engine.ensure_loaded(lambda *args: ([], T0 - timedelta(seconds=1)))
+    assert engine.top_events() == []
+
+
+def test_scores_halve_every_half_life(clock):
+    engine = _engine(read_timestamp=T0 - timedelta(seconds=1))
+    engine.record_attendance(_event("e1"), attendees=4)
+    assert engine.top_events()[0]["score"] == 4.0
+    clock.now += HOUR
+    assert engine.top_events()[0]["score"] == 2.0
+    clock.now += 2 * HOUR
+    assert engine.top_events()[0]["score"] == 0.5
+
+
+def test_recent_attendance_outranks_older_attendance(clock):
+    engine = _engine(read_timestamp=T0 - timedelta(seconds=1))
+    engine.record_attendance(_event("old", "l1"), attendees=3)
+    clock.now += 2 * HOUR
+    engine.record_attendance(_event("new", "l2"), attendees=1)
+    engine.record_attendance(_event("newer", "l1"), attendees=2)
+    assert [(e["event_id"], e["score"]) for e in engine.top_events()] == [("newer", 2.0), ("new", 1.0), ("old", 0.75)]
+    assert [(l["location_id"], l["score"]) for l in engine.top_locations()] == [("l1", 2.75), ("l2", 1.0)]
+    assert [e["event_id"] for e in engine.top_events(k=1)] == ["newer"]
+
+
+def test_counters_older_than_the_window_are_dropped(clock):
+    engine = _engine(read_timestamp=T0 - timedelta(seconds=1))
+    engine.record_attendance(_event("old", "l1"))
+    clock.now += 11 * HOUR
+    engine.record_attendance(_event("new", "l2"))
+    assert [e["event_id"] for e in engine.top_events()] == ["new"]
+    assert [l["location_id"] for l in engine.top_locations()] == ["l2"]
+
+
+def test_rescaling_keeps_scores(clock, monkeypatch):
+    monkeypatch.setattr(trending, "_RESCALE_HALF_LIVES", 4)
+    engine = TrendingEngine(half_life_seconds=HOUR, window_seconds=100 * HOUR)
+    engine.ensure_loaded(lambda *args: ([], T0 - timedelta(seconds=1)))
+    engine.record_attendance(_event("e1"), attendees=8)
+    clock.now += 5 * HOUR
+    engine.record_attendance(_event("e2"), attendees=1)
+    assert engine.reference_time == clock.now
+    assert [(e["event_id"], e["score"]) for e in engine.top_events()] == [("e2", 1.0), ("e1", 0.25)]
@@ -0,0 +1,51 @@
+# --- Commit Timestamp Index Sharding ---
+# An index that leads with a commit timestamp sends every insert to the end
+# of its key space, i.e. to one split. The watermark indexes lead with
+# time_shard instead: a stored generated column that spreads rows over
+# TIME_SHARDS values by a hash of the row's key. A range read on the
+# timestamp then seeks each shard (time_shard_filter) and merges.
+# Changing TIME_SHARDS means recreating the column and these indexes.
+TIME_SHARDS = 16
+TIME_SHARD_COLUMN = "time_shard"
+
+# Table -> key expression hashed into its shard
+TIME_SHARD_KEYS = {
+    "Post": "post_id",
+    "Event": "event_id",
+    "Attendance": "CONCAT(person_id, event_id)",
+    "Friendship": "CONCAT(person_id_a, person_id_b)",
+    "Outbox": "outbox_id",
+}
+
+# Index -> what it indexes, shard first
+TIME_SHARDED_INDEXES = {
+    "PostByShardCreateTime": "Post(time_shard, create_time) STORING (author_id, author_name, text, sentiment, post_timestamp)",
+    "EventByShardCreateTime": "Event(time_shard, create_time) STORING (name, description, event_date)",
+    "AttendanceByShardTime": "Attendance(time_shard, attendance_time)",
+    "FriendshipByShardTime": "Friendship(time_shard, friendship_time)",
+    "OutboxByShardCreateTime": "Outbox(time_shard, create_time) STORING (topic, payload, origin)",
+}
+
+
+def time_shard_column_type(table):
+    """Type and generation expression of a table's time_shard column."""
+    # MOD before ABS: ABS of the smallest INT64 fingerprint would overflow
+    return f"INT64 AS (ABS(MOD(FARM_FINGERPRINT({TIME_SHARD_KEYS[table]}), {TIME_SHARDS}))) STORED"
+
+
+def time_shard_column_ddl(table):
+    """Column definition for a table's time_shard, for CREATE TABLE."""
+    return f"{TIME_SHARD_COLUMN} {time_shard_column_type(table)}"
+
+
+def time_sharded_index_ddl(index_name):
+    return f"CREATE INDEX IF NOT EXISTS {index_name} ON {TIME_SHARDED_INDEXES[index_name]}"
+
+
+def time_shard_filter(alias=None):
+    """
+    SQL condition selecting every shard, so a timestamp range on a
+    time-sharded index is one seek per shard rather than a full scan.
+    """
+    column = f"{alias}.{TIME_SHARD_COLUMN}" if alias else TIME_SHARD_COLUMN
+    return f"{column} IN ({', '.join(str(shard) for shard in range(TIME_SHARDS))})"
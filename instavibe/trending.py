@@ -0,0 +1,205 @@
+import os
+import time
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+
+
+# --- Trending Configuration ---
+# An attendance counts 1.0 when it happens and half as much every half-life.
+# Counters that have decayed below what one attendance is worth after the
+# window are dropped, so the engine only holds what happened recently.
+TRENDING_HALF_LIFE_SECONDS = float(os.environ.get("TRENDING_HALF_LIFE_HOURS", "12")) * 3600
+TRENDING_WINDOW_SECONDS = float(os.environ.get("TRENDING_WINDOW_HOURS", "72")) * 3600
+
+# Stored values grow as 2 ** (age of the reference time / half-life); past
+# this many half-lives they are scaled back down before floats overflow.
+_RESCALE_HALF_LIVES = 512
+
+
+def _to_epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return time.time() if value is None else float(value)
+
+
+class _Leaderboard:
+    """
+    Counters kept in descending order, so the top k is the first k entries.
+
+    `order` holds (-value, key) tuples sorted ascending. Values only ever grow
+    (decay is applied by the owner, to all counters at once), so an update is
+    a bisect out of the list and an insort back in.
+    """
+
+    def __init__(self):
+        self.values = {}          # key -> stored value
+        self.info = {}            # key -> display fields
+        self.order = []           # sorted (-value, key)
+
+    def add(self, key, amount, info=None):
+        old = self.values.get(key)
+        if old is not None:
+            del self.order[bisect_left(self.order, (-old, key))]
+        new = (old or 0.0) + amount
+        self.values[key] = new
+        insort(self.order, (-new, key))
+        if info:
+            self.info[key] = info
+
+    def top(self, k):
+        return self.order[:k]
+
+    def prune(self, floor):
+        """Drops counters whose stored value is below floor; they sit at the end."""
+        dropped = 0
+        while self.order and -self.order[-1][0] < floor:
+            _, key = self.order.pop()
+            del self.values[key]
+            self.info.pop(key, None)
+            dropped += 1
+        return dropped
+
+    def rescale(self, factor):
+        self.values = {key: value * factor for key, value in self.values.items()}
+        self.order = [(value * factor, key) for value, key in self.order]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class TrendingEngine:
+    """
+    Exponentially decayed attendance counters per event and per location.
+
+    Uses forward decay: an attendance at time t adds 2 ** ((t - t0) / h) to
+    its counters, t0 being a fixed reference time and h the half-life. The
+    current score is the stored value times 2 ** (-(now - t0) / h), the same
+    factor for every counter, so decay never rewrites a counter and the
+    sorted order stays valid. A top-k query is a slice of the leaderboard,
+    O(k).
+
+    Seeded once from recent Attendance rows (already weighted by Spanner);
+    after that, new attendance is recorded as the outbox delivers it. Records
+    that arrive before the seed, or that happened before it, are ignored,
+    since the seed already includes them.
+    """
+
+    def __init__(self, half_life_seconds=TRENDING_HALF_LIFE_SECONDS, window_seconds=TRENDING_WINDOW_SECONDS):
+        self.half_life = half_life_seconds
+        self.window = window_seconds
+        self._lock = threading.RLock()
+        self.events = _Leaderboard()
+        self.locations = _Leaderboard()
+        self.reference_time = time.time()  # t0, epoch seconds
+        self.seeded_at = None              # epoch seconds; the seed's read timestamp: it covers attendance up to this
+        self.loaded = False
+
+    # --- Updates ---
+
+    def _weight(self, at):
+        return 2.0 ** ((at - self.reference_time) / self.half_life)
+
+    def _decay(self, now):
+        return 2.0 ** (-(now - self.reference_time) / self.half_life)
+
+    def _maintain(self, now):
+        """Rescales stored values if they are getting large, then evicts stale counters."""
+        if (now - self.reference_time) / self.half_life > _RESCALE_HALF_LIVES:
+            factor = self._decay(now)
+            self.events.rescale(factor)
+            self.locations.rescale(factor)
+            self.reference_time = now
+        floor = self._weight(now - self.window)
+        self.events.prune(floor)
+        self.locations.prune(floor)
+
+    def _add(self, event, weight):
+        self.events.add(event["event_id"], weight, {
+            "event_id": event["event_id"], "name": event.get("name"), "event_date": event.get("event_date"),
+        })
+        for location in event.get("locations") or []:
+            self.locations.add(location["location_id"], weight, {
+                "location_id": location["location_id"], "name": location.get("name"),
+                "latitude": location.get("latitude"), "longitude": location.get("longitude"),
+                "event_id": event["event_id"],
+            })
+
+    def record_attendance(self, event, attendees=1, at=None):
+        """
+        Counts `attendees` new attendances of an event, and of each of its locations.
+
+        Args:
+            event (dict): {event_id, name, event_date, locations: [{location_id, name, latitude, longitude}]}
+            attendees (int): How many people started attending.
+            at (datetime or float, optional): When; defaults to now.
+        """
+        if attendees <= 0:
+            return
+        now = time.time()
+        at = _to_epoch(at) if at is not None else now
+        with self._lock:
+            if not self.loaded or at <= self.seeded_at:
+                return
+            self._add(event, attendees * self._weight(at))
+            self._maintain(now)
+
+    def load_rows(self, rows):
+        """
+        Adds seed rows: {event_id, name, event_date, locations, weight}, where
+        weight is the event's forward-decayed attendance relative to
+        reference_time.
+        """
+        count = 0
+        with self._lock:
+            for row in rows:
+                if row.get("weight"):
+                    self._add(row, row["weight"])
+                    count += 1
+            self._maintain(time.time())
+        return count
+
+    def ensure_loaded(self, fetch_recent_attendance):
+        """
+        Seeds the counters on first use.
+
+        Args:
+            fetch_recent_attendance (callable): fetch_recent_attendance(since,
+                reference_time, half_life_seconds) returns (rows,
+                read_timestamp): one seed row per event with attendance
+                since `since` (datetimes), and the timestamp of the read.
+        """
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            now = time.time()
+            since = datetime.fromtimestamp(now - self.window, timezone.utc)
+            reference = datetime.fromtimestamp(self.reference_time, timezone.utc)
+            rows, read_timestamp = fetch_recent_attendance(since, reference, self.half_life)
+            count = self.load_rows(rows or [])
+            # Attendance timestamps are commit timestamps, as is the read
+            # timestamp, so this splits seed and outbox deliveries exactly;
+            # the local clock could drift either way and count some twice
+            self.seeded_at = _to_epoch(read_timestamp)
+            self.loaded = True
+        print(f"Trending engine ready: {count} events with attendance in the last {self.window / 3600:g} hours.")
+
+    # --- Queries ---
+
+    def _top(self, board, k):
+        with self._lock:
+            decay = self._decay(time.time())
+            return [
+                dict(board.info.get(key) or {}, score=round(-value * decay, 4))
+                for value, key in board.top(k)
+            ]
+
+    def top_events(self, k=10):
+        """Returns [{event_id, name, event_date, score}], hottest first."""
+        return self._top(self.events, k)
+
+    def top_locations(self, k=10):
+        """Returns [{location_id, name, latitude, longitude, event_id, score}], hottest first."""
+        return self._top(self.locations, k)
@@ -428,6 +428,8 @@ gcloud run deploy "${SERVICE_NAME}" \
   --set-env-vars="GOOGLE_CLOUD_PROJECT=${PROJECT_ID}" \
   --set-env-vars="GOOGLE_MAPS_API_KEY=${GOOGLE_MAPS_API_KEY}" \
   --set-env-vars="ORCHESTRATE_AGENT_ID=${ORCHESTRATE_AGENT_ID}" \
+  --startup-probe="httpGet.path=/readyz,initialDelaySeconds=0,periodSeconds=5,failureThreshold=24,timeoutSeconds=5" \
+  --liveness-probe="httpGet.path=/healthz,periodSeconds=30" \
   --project="${PROJECT_ID}" \
   --min-instances=1 \
   --cpu=2 \
@@ -445,6 +447,12 @@ gcloud run services update ${MCP_SERVICE_NAME} \
     --update-env-vars="INSTAVIBE_BASE_URL=${INSTAVIBE_BASE_URL}" \
     --project=${PROJECT_ID}
 log "MCP Tool Server successfully updated with the InstaVibe API endpoint."
+gcloud run services update social-agent \
+    --platform=managed \
+    --region=${REGION} \
+    --update-env-vars="INSTAVIBE_BASE_URL=${INSTAVIBE_BASE_URL}" \
+    --project=${PROJECT_ID}
+log "Social agent successfully updated with the InstaVibe API endpoint."
 
 
 # --- Unset the trap if we reach the end successfully ---